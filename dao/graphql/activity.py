@@ -0,0 +1,113 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import strawberry
+from bson import ObjectId
+from bson.errors import InvalidId
+from strawberry.scalars import JSON
+from strawberry.types import Info
+
+from . import storage
+from .common import DateRange, HexValue, serialize_hex
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Fields of the events documents that aren't part of the event payload
+EVENT_FIELDS = {
+    "_id",
+    "_chain",
+    "name",
+    "emittedAt",
+    "addresses",
+    "dao",
+    "blockNumber",
+    "transactionHash",
+    "logIndex",
+}
+
+
+def encode_cursor(event: dict) -> str:
+    # MongoDB dates have a millisecond precision
+    emitted_at = event["emittedAt"]
+    if emitted_at.tzinfo is None:
+        emitted_at = emitted_at.replace(tzinfo=timezone.utc)
+    milliseconds = (emitted_at - EPOCH) // timedelta(milliseconds=1)
+    return base64.urlsafe_b64encode(f"{milliseconds}:{event['_id']}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        milliseconds, id_ = base64.urlsafe_b64decode(cursor).decode().split(":")
+        return EPOCH + timedelta(milliseconds=int(milliseconds)), ObjectId(id_)
+    except (ValueError, InvalidId) as error:
+        raise ValueError(f"Invalid cursor {cursor!r}") from error
+
+
+def _to_json(value):
+    if isinstance(value, bytes):
+        return serialize_hex(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    return value
+
+
+@strawberry.type
+class Activity:
+    name: str
+    emittedAt: datetime
+    # The addresses appearing in the payload
+    addresses: list[HexValue]
+    # The fields of the event, the addresses are hex strings
+    payload: JSON
+    # Lists the following events when passed as after
+    cursor: str
+    # The contract address of the DAO, None if the indexer isn't given any DAO
+    dao: Optional[HexValue] = None
+
+    @classmethod
+    def from_mongo(cls, data: dict):
+        return cls(
+            name=data["name"],
+            emittedAt=data["emittedAt"],
+            addresses=data.get("addresses", []),
+            payload={
+                name: _to_json(value)
+                for name, value in data.items()
+                if name not in EVENT_FIELDS
+            },
+            cursor=encode_cursor(data),
+            dao=data.get("dao"),
+        )
+
+
+# pylint: disable=too-many-arguments
+def get_activity(
+    info: Info,
+    limit: int = 20,
+    after: Optional[str] = None,
+    names: Optional[list[str]] = None,
+    address: Optional[HexValue] = None,
+    emittedAt: Optional[DateRange] = None,
+    dao: Optional[HexValue] = None,
+) -> list[Activity]:
+    """The events, the latest first, the next page follows the cursor of the last
+    event"""
+    filter_: dict = {}
+    if names is not None:
+        filter_["name"] = {"$in": names}
+    if address is not None:
+        filter_["addresses"] = address
+    if emittedAt is not None and (query := emittedAt.to_mongo()):
+        filter_["emittedAt"] = query
+
+    events = storage.list_events(
+        info=info,
+        filter=filter_,
+        after=None if after is None else decode_cursor(after),
+        limit=limit,
+        dao=dao,
+    )
+    return [Activity.from_mongo(event) for event in events]
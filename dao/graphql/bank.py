@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Iterable, Optional
 
 import strawberry
 from strawberry.types import Info
@@ -30,30 +31,46 @@ class Bank(FromMongoMixin):
     transactions: list[Transaction]
     totalShares: int = 0
     totalLoot: int = 0
+    # The contract address of the DAO, None if the indexer isn't given any DAO
+    dao: Optional[HexValue] = None
 
     @classmethod
-    def from_mongo(cls, data: dict):
+    def from_mongo(cls, data: dict, tokens: Iterable[dict] = ()):
+        """The whitelisted and unwhitelisted tokens are the current state of the
+        tokens registry, the bank document only keeps their history"""
         data["balances"] = [Balance(**balance) for balance in data.get("balances", [])]
         data["transactions"] = [
             Transaction(**transaction) for transaction in data.get("transactions", [])
         ]
 
-        unwhitelisted_addresses = [
-            token["tokenAddress"] for token in data["unWhitelistedTokens"]
-        ]
-        data["whitelistedTokens"] = [
-            WhitelistedToken(**token)
-            for token in data["whitelistedTokens"]
-            if token["tokenAddress"] not in unwhitelisted_addresses
-        ]
+        data["whitelistedTokens"] = []
+        data["unWhitelistedTokens"] = []
 
-        data["unWhitelistedTokens"] = [
-            UnWhitelistedToken(**token) for token in data["unWhitelistedTokens"]
-        ]
+        for token in tokens:
+            if token["active"]:
+                data["whitelistedTokens"].append(
+                    WhitelistedToken(
+                        tokenName=token["tokenName"],
+                        tokenAddress=token["tokenAddress"],
+                        whitelistedAt=token["whitelistedAt"],
+                    )
+                )
+            else:
+                data["unWhitelistedTokens"].append(
+                    UnWhitelistedToken(
+                        tokenName=token["tokenName"],
+                        tokenAddress=token["tokenAddress"],
+                        unWhitelistedAt=token["unWhitelistedAt"],
+                    )
+                )
 
         return super().from_mongo(data)
 
 
-def get_bank(info: Info) -> Bank:
-    bank = storage.get_bank(info=info)
-    return Bank.from_mongo(bank)
+def get_bank(
+    info: Info, asOfBlock: Optional[int] = None, dao: Optional[HexValue] = None
+) -> Bank:
+    bank = storage.get_bank(info=info, as_of_block=asOfBlock, dao=dao)
+    return Bank.from_mongo(
+        bank, tokens=storage.list_tokens(info=info, as_of_block=asOfBlock, dao=dao)
+    )
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import NewType
+from typing import NewType, Optional
 
 import strawberry
 
@@ -48,6 +48,38 @@ class FromMongoMixin:
         return instance
 
 
+@strawberry.input
+class DateRange:
+    """[start, end[, unbounded on the missing side"""
+
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+    def to_mongo(self) -> dict:
+        query = {}
+        if self.start is not None:
+            query["$gte"] = self.start
+        if self.end is not None:
+            query["$lt"] = self.end
+        return query
+
+
+@strawberry.input
+class IntRange:
+    """[min, max], unbounded on the missing side"""
+
+    min: Optional[int] = None
+    max: Optional[int] = None
+
+    def to_mongo(self) -> dict:
+        query = {}
+        if self.min is not None:
+            query["$gte"] = self.min
+        if self.max is not None:
+            query["$lte"] = self.max
+        return query
+
+
 @strawberry.type
 class Balance:
     tokenName: str
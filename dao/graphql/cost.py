@@ -0,0 +1,229 @@
+"""Limits on the cost of the GraphQL queries.
+
+The cost of a query is estimated from its document before it is executed: each
+field has a weight, high for the fields reading MongoDB, and the cost of the
+fields selected on the items of a list is multiplied by the expected size of the
+list. Queries over config.graphql_max_cost are rejected without being executed,
+the cost is reported in the "cost" extension of every response.
+"""
+from contextlib import ExitStack
+from typing import Any, Optional
+
+import pymongo
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLField,
+    GraphQLSchema,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+    is_list_type,
+    value_from_ast,
+)
+from graphql.execution import ExecutionResult as GraphQLExecutionResult
+from strawberry.extensions import Extension
+
+from dao import config
+
+# Weight of the fields reading MongoDB, the other fields weigh 1 if they return
+# objects and 0 if they return scalars
+FIELD_COSTS: dict[tuple[str, str], int] = {
+    ("Query", "proposals"): 10,
+    ("Query", "members"): 5,
+    ("Query", "bank"): 10,
+    ("Query", "treasuryHistory"): 5,
+    ("Query", "membershipHistory"): 5,
+    ("Query", "activity"): 5,
+    ("Query", "health"): 1,
+    # The status of a submitted proposal depends on its quorum
+    ("Proposal", "status"): 10,
+    ("Proposal", "active"): 10,
+    ("Proposal", "timeRemaining"): 10,
+    ("Proposal", "approvedToProcessAt"): 10,
+    ("Proposal", "rejectedToProcessAt"): 10,
+    ("Proposal", "approvedAt"): 10,
+    ("Proposal", "rejectedAt"): 10,
+    ("Proposal", "processedAt"): 10,
+    ("Proposal", "totalVotableShares"): 10,
+    ("Proposal", "currentQuorum"): 10,
+    ("Proposal", "votes"): 5,
+    ("Proposal", "memberDidVote"): 2,
+    ("Member", "votes"): 5,
+    ("Member", "yesVotes"): 5,
+    ("Member", "noVotes"): 5,
+    ("Member", "percentageOfTreasury"): 10,
+    ("Member", "votingWeight"): 10,
+}
+
+# The lists whose size is bounded by their limit argument, the size of the others
+# is estimated as config.graphql_default_list_size
+PAGINATED_FIELDS = {("Query", "proposals"), ("Query", "activity")}
+
+
+def get_operation(
+    document, operation_name: Optional[str] = None
+) -> Optional[OperationDefinitionNode]:
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+    ]
+    if operation_name is None:
+        return operations[0] if len(operations) == 1 else None
+
+    for operation in operations:
+        if operation.name is not None and operation.name.value == operation_name:
+            return operation
+
+
+def get_list_size(
+    parent_name: str,
+    field: GraphQLField,
+    node: FieldNode,
+    variables: Optional[dict[str, Any]],
+) -> int:
+    if (parent_name, node.name.value) not in PAGINATED_FIELDS:
+        return config.graphql_default_list_size
+
+    for argument in node.arguments:
+        if argument.name.value == "limit":
+            limit = value_from_ast(argument.value, field.args["limit"].type, variables)
+            if limit is not None:
+                return limit
+
+    return field.args["limit"].default_value
+
+
+class QueryCost:
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        fragments: dict[str, FragmentDefinitionNode],
+        variables: Optional[dict[str, Any]] = None,
+    ):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+
+    def selection_set_cost(self, selection_set: SelectionSetNode, parent_type) -> int:
+        cost = 0
+
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self.field_cost(selection, parent_type)
+
+            # The fragments on the types implementing an interface are all counted
+            elif isinstance(selection, InlineFragmentNode):
+                type_ = parent_type
+                if selection.type_condition is not None:
+                    type_ = self.schema.get_type(selection.type_condition.name.value)
+                cost += self.selection_set_cost(selection.selection_set, type_)
+
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments[selection.name.value]
+                type_ = self.schema.get_type(fragment.type_condition.name.value)
+                cost += self.selection_set_cost(fragment.selection_set, type_)
+
+        return cost
+
+    def field_cost(self, node: FieldNode, parent_type) -> int:
+        name = node.name.value
+        # Introspection is served from the schema
+        if name.startswith("__"):
+            return 0
+
+        field = parent_type.fields[name]
+        field_type = get_named_type(field.type)
+
+        weight = FIELD_COSTS.get(
+            (parent_type.name, name), 0 if is_leaf_type(field_type) else 1
+        )
+        if node.selection_set is None:
+            return weight
+
+        children_cost = self.selection_set_cost(node.selection_set, field_type)
+        if is_list_type(get_nullable_type(field.type)):
+            size = get_list_size(parent_type.name, field, node, self.variables)
+            children_cost *= size
+
+        return weight + children_cost
+
+
+def get_query_cost(
+    schema: GraphQLSchema,
+    document,
+    operation_name: Optional[str] = None,
+    variables: Optional[dict[str, Any]] = None,
+) -> int:
+    operation = get_operation(document, operation_name)
+    if operation is None:
+        return 0
+
+    root_type = schema.get_root_type(operation.operation)
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+    cost = QueryCost(schema, fragments, variables)
+    return cost.selection_set_cost(operation.selection_set, root_type)
+
+
+class QueryCostLimiter(Extension):
+    """Rejects the queries whose cost is over max_cost before executing them"""
+
+    max_cost: int = config.graphql_max_cost
+
+    cost: Optional[int] = None
+
+    def on_executing_start(self):
+        execution_context = self.execution_context
+
+        self.cost = get_query_cost(
+            # pylint: disable=protected-access
+            execution_context.schema._schema,
+            execution_context.graphql_document,
+            operation_name=execution_context.operation_name,
+            variables=execution_context.variables,
+        )
+
+        if self.cost > self.max_cost:
+            # Setting the result skips the execution
+            execution_context.result = GraphQLExecutionResult(
+                data=None,
+                errors=[
+                    GraphQLError(
+                        f"The query cost {self.cost} exceeds the maximum cost"
+                        f" {self.max_cost}"
+                    )
+                ],
+            )
+
+    def get_results(self):
+        if self.cost is None:
+            return {}
+        return {"cost": {"requested": self.cost, "maximum": self.max_cost}}
+
+
+class MongoTimeout(Extension):
+    """Applies a deadline of config.graphql_max_time_ms to all the MongoDB
+    operations of a query, pymongo sends it as the maxTimeMS of each operation"""
+
+    max_time_ms: int = config.graphql_max_time_ms
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self._stack = ExitStack()
+
+    def on_executing_start(self):
+        self._stack.enter_context(pymongo.timeout(self.max_time_ms / 1000))
+
+    def on_executing_end(self):
+        self._stack.close()
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+
+import strawberry
+from strawberry.types import Info
+
+from dao import health
+
+
+@strawberry.type
+class IndexerHealth:
+    indexedBlock: Optional[int]
+    indexedBlockTimestamp: Optional[datetime]
+    # Latest block known by the gateway of the indexer
+    chainHeadBlock: Optional[int]
+    chainHeadTimestamp: Optional[datetime]
+    lagBlocks: Optional[int]
+    # Between the timestamps of the indexed block and of the chain head
+    lagSeconds: Optional[float]
+    # Moving average over config.health_rate_window seconds
+    eventsPerSecond: float
+    lastCommitAt: Optional[datetime]
+    secondsSinceCommit: Optional[float]
+    # The data is fresh, see dao/health.py
+    healthy: bool
+
+
+def get_health(info: Info) -> IndexerHealth:
+    return IndexerHealth(**health.read_health(info.context["db"]))
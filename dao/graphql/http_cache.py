@@ -0,0 +1,227 @@
+"""HTTP caching of the GraphQL queries.
+
+The indexed data only changes when the indexer commits a block, a query gives the
+same response until then. The ETag of a response is a hash of the query, its
+variables and operation, and of the last block committed by the indexer, it is weak
+as the compressed responses share it. A request whose If-None-Match holds the ETag
+is answered 304 without executing the query. The block is the one of the read
+model when it is enabled, otherwise it is polled by an IndexedBlockWatcher, the
+responses have no ETag while it isn't known.
+
+The statuses of the proposals are computed from the current time, the ETags also
+change every graphql_cache_max_age seconds so they are at most that late. The
+queries can be sent with GET for a CDN to cache them for as long. The queries
+selecting a field of UNCACHED_FIELDS, whose value changes between the blocks,
+aren't cached.
+
+The responses over graphql_compression_min_size bytes are compressed with brotli,
+when the brotli package is installed, gzip or deflate, as accepted by the client.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+import zlib
+from typing import Any, Callable, Optional
+
+from aiohttp import web
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    SelectionSetNode,
+    parse,
+)
+from pymongo.database import Database
+from strawberry.aiohttp.handlers import HTTPHandler
+from strawberry.http import GraphQLRequestData
+
+from dao import config
+
+from . import logger
+from .cost import get_operation
+from .read_model import get_indexed_block
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compressions by order of preference
+COMPRESSIONS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip": gzip.compress,
+    "deflate": zlib.compress,
+}
+if brotli is not None:
+    COMPRESSIONS = {"br": brotli.compress, **COMPRESSIONS}
+
+# Set on the aiohttp request when the query has errors, they aren't cached
+ERRORS_KEY = "graphql_errors"
+
+# The root fields not read from the indexed data: the health of the indexer changes
+# with the chain head and the time
+UNCACHED_FIELDS = {"health"}
+
+
+def get_etag(
+    request_data: GraphQLRequestData,
+    block: Optional[int],
+    now: Optional[float] = None,
+    max_age: int = config.graphql_cache_max_age,
+) -> str:
+    now = time.time() if now is None else now
+    key = json.dumps(
+        [
+            request_data.query,
+            request_data.variables,
+            request_data.operation_name,
+            block,
+            int(now // max_age) if max_age > 0 else None,
+        ],
+        sort_keys=True,
+    )
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def selects_uncached_fields(request_data: GraphQLRequestData) -> bool:
+    try:
+        document = parse(request_data.query)
+    except GraphQLError:
+        # Answered with the errors, which aren't cached
+        return False
+
+    operation = get_operation(document, request_data.operation_name)
+    if operation is None:
+        return False
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+    def selects(selection_set: SelectionSetNode) -> bool:
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if selection.name.value in UNCACHED_FIELDS:
+                    return True
+            elif isinstance(selection, InlineFragmentNode):
+                if selects(selection.selection_set):
+                    return True
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None and selects(fragment.selection_set):
+                    return True
+        return False
+
+    return selects(operation.selection_set)
+
+
+class IndexedBlockWatcher:
+    """Follows the last block committed by the indexer, as the read model does"""
+
+    def __init__(self, db: Database, poll_interval: float = 1):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.block: Optional[int] = None
+        # The responses are only cached while the block is known
+        self.loaded = False
+        self._failing = False
+
+    def sync(self):
+        """Reads the last block committed by the indexer"""
+        block = get_indexed_block(self.db)
+        if not self.loaded:
+            logger.info("Caching the responses, indexed block: %s", block)
+        self.block = block
+        self.loaded = True
+        self._failing = False
+
+    async def poll(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.sync)
+        # pylint: disable=broad-except
+        except Exception as error:
+            # The ETags of a block that may be outdated aren't sent anymore
+            self.loaded = False
+            if not self._failing:
+                logger.error(
+                    "Cannot read the indexed block, the responses aren't cached until"
+                    " it is: %s",
+                    error,
+                )
+            self._failing = True
+
+    async def run(self):
+        logger.info("Polling the indexed block every %ss", self.poll_interval)
+        while True:
+            await self.poll()
+            await asyncio.sleep(self.poll_interval)
+
+
+def get_cache_control(method: str, max_age: int = config.graphql_cache_max_age):
+    # The POST requests are only revalidated with their ETag
+    if method == "GET" and max_age > 0:
+        return f"public, max-age={max_age}"
+    return "no-cache"
+
+
+def get_encoding(request: web.Request) -> Optional[str]:
+    accepted = {
+        coding.split(";")[0].strip().lower()
+        for coding in request.headers.get("Accept-Encoding", "").split(",")
+    }
+    return next((coding for coding in COMPRESSIONS if coding in accepted), None)
+
+
+def compress(
+    request: web.Request,
+    response: web.Response,
+    min_size: int = config.graphql_compression_min_size,
+):
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = get_encoding(request)
+    if encoding is None or response.body is None or len(response.body) < min_size:
+        return
+
+    response.body = COMPRESSIONS[encoding](response.body)
+    response.headers["Content-Encoding"] = encoding
+
+
+class CachingHTTPHandler(HTTPHandler):
+    """Answers the queries already known by the client with a 304, and compresses
+    the responses"""
+
+    async def execute_request(
+        self, request: web.Request, request_data: GraphQLRequestData, method: Any
+    ) -> web.StreamResponse:
+        # The ReadModel or IndexedBlockWatcher of the app
+        indexed_block = request.app.get("indexed_block")
+        if (
+            indexed_block is None
+            or not indexed_block.loaded
+            or selects_uncached_fields(request_data)
+        ):
+            response = await super().execute_request(request, request_data, method)
+            compress(request, response)
+            return response
+
+        etag = get_etag(request_data, indexed_block.block)
+        headers = {
+            # Weak, the compressed and identity responses are equivalent but not
+            # byte for byte the same
+            "ETag": f'W/"{etag}"',
+            "Cache-Control": get_cache_control(method),
+            "Vary": "Accept-Encoding",
+        }
+        if etag in request.headers.get("If-None-Match", ""):
+            return web.Response(status=304, headers=headers)
+
+        response = await super().execute_request(request, request_data, method)
+        if not request.get(ERRORS_KEY):
+            response.headers.update(headers)
+        compress(request, response)
+        return response
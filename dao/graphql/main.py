@@ -1,35 +1,119 @@
 import asyncio
+from typing import Optional
 
 from aiohttp import web
 from pymongo import MongoClient
 from strawberry.aiohttp.views import GraphQLView
+from strawberry.http import GraphQLHTTPResponse
+from strawberry.types import ExecutionResult
+
+from dao import config, health
 
 from . import logger
+from .http_cache import ERRORS_KEY, CachingHTTPHandler, IndexedBlockWatcher
+from .read_model import ReadModel
 from .schema import schema
+from .subscriptions import EventWatcher
 
 
 class IndexerGraphQLView(GraphQLView):
-    def __init__(self, db, **kwargs):
+    http_handler_class = CachingHTTPHandler
+
+    def __init__(
+        self,
+        db,
+        event_watcher: EventWatcher,
+        read_model: Optional[ReadModel] = None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self._db = db
+        self._event_watcher = event_watcher
+        self._read_model = read_model
+
+    # The websocket handlers pass the request and response as keyword arguments
+    # pylint: disable=unused-argument
+    async def get_context(self, request, response):
+        return {
+            "db": self._db,
+            "event_watcher": self._event_watcher,
+            "read_model": self._read_model,
+        }
+
+    async def process_result(
+        self, request: web.Request, result: ExecutionResult
+    ) -> GraphQLHTTPResponse:
+        request[ERRORS_KEY] = bool(result.errors)
+        return await super().process_result(request, result)
+
+
+async def health_view(request: web.Request) -> web.Response:
+    """503 while the indexed data is stale, for the load balancers"""
+    loop = asyncio.get_running_loop()
+    report = await loop.run_in_executor(None, health.read_health, request.app["db"])
+    return web.json_response(
+        health.to_json(report), status=200 if report["healthy"] else 503
+    )
 
-    async def get_context(self, _request, _response):
-        return {"db": self._db}
+
+def create_app(
+    db,
+    event_watcher: EventWatcher,
+    read_model: Optional[ReadModel] = None,
+    indexed_block: Optional[IndexedBlockWatcher] = None,
+) -> web.Application:
+    app = web.Application()
+    app["db"] = db
+    # The block the responses are computed at, see dao/graphql/http_cache.py
+    app["indexed_block"] = read_model or indexed_block
+    app.router.add_get("/health", health_view)
+    app.router.add_route(
+        "*",
+        "/graphql",
+        IndexerGraphQLView(db, event_watcher, read_model=read_model, schema=schema),
+    )
+    return app
 
 
 async def run_graphql(
-    mongo_url: str, db_name: str, host: str = "localhost", port: int = 8080
+    mongo_url: str,
+    db_name: str,
+    host: str = "localhost",
+    port: int = 8080,
+    read_model: bool = False,
 ):
     mongo = MongoClient(mongo_url, tz_aware=True)
     db = mongo[db_name]
 
-    view = IndexerGraphQLView(db, schema=schema)
+    # The current state is served from memory, kept in sync with the indexer
+    model = None
+    if read_model:
+        model = ReadModel(
+            db,
+            poll_interval=config.read_model_poll_interval,
+            reload_interval=config.read_model_reload_interval,
+        )
 
-    logger.info(schema.as_str())
+    # A single watcher feeds all the subscriptions
+    event_watcher = EventWatcher(
+        db, poll_interval=config.subscription_poll_interval, read_model=model
+    )
+    # Keep a reference to the tasks, otherwise they may be garbage collected
+    tasks = [asyncio.create_task(event_watcher.run())]
+    if model is not None:
+        tasks.append(asyncio.create_task(model.run()))
 
-    app = web.Application()
-    app.router.add_route("*", "/graphql", view)
+    # The read model knows the block it serves, otherwise it is polled
+    indexed_block = None
+    if model is None:
+        indexed_block = IndexedBlockWatcher(
+            db, poll_interval=config.read_model_poll_interval
+        )
+        tasks.append(asyncio.create_task(indexed_block.run()))
+
+    logger.info(schema.as_str())
 
+    app = create_app(db, event_watcher, read_model=model, indexed_block=indexed_block)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, host, port)
@@ -37,5 +121,9 @@ async def run_graphql(
 
     print(f"GraphQL server started at http://{host}:{port}/graphql")
 
-    while True:
-        await asyncio.sleep(5_000)
+    try:
+        while True:
+            await asyncio.sleep(5_000)
+    finally:
+        for task in tasks:
+            task.cancel()
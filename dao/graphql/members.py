@@ -4,8 +4,17 @@ from typing import Optional
 import strawberry
 from strawberry.types import Info
 
+from dao import utils
+
 from . import storage
 from .common import Balance, FromMongoMixin, HexValue, Transaction
+from .votes import Vote
+
+
+def get_proposal_hex_id(proposal_id: int) -> bytes:
+    """yesVotes and noVotes are typed as HexValue since they were stored in the
+    members documents"""
+    return utils.int_to_bytes(proposal_id) or b"\x00"
 
 
 @strawberry.type
@@ -15,23 +24,61 @@ class Member(FromMongoMixin):
     shares: int
     loot: int
     onboardedAt: datetime
-    yesVotes: list[HexValue] = strawberry.field(default_factory=list)
-    noVotes: list[HexValue] = strawberry.field(default_factory=list)
     balances: list[Balance] = strawberry.field(default_factory=list)
     transactions: list[Transaction] = strawberry.field(default_factory=list)
     roles: list[str] = strawberry.field(default_factory=list)
     jailedAt: Optional[datetime] = None
     exitedAt: Optional[datetime] = None
+    # The contract address of the DAO, None if the indexer isn't given any DAO
+    dao: Optional[HexValue] = None
+
+    # The block the member was read at, None for the current state
+    asOfBlock: strawberry.Private[Optional[int]] = None
+    # The votes of the member, the last ones first. Looked up with the members
+    # list, otherwise read once by the first resolver needing them
+    memberVotes: strawberry.Private[Optional[list[dict]]] = None
+
+    def _get_votes(self, info: Info) -> list[dict]:
+        if self.memberVotes is None:
+            self.memberVotes = list(
+                storage.list_votes(
+                    info,
+                    filter={"voterAddress": self.memberAddress},
+                    as_of_block=self.asOfBlock,
+                    dao=self.dao,
+                )
+            )
+        return self.memberVotes
+
+    @strawberry.field
+    def votes(self, info: Info) -> list[Vote]:
+        return [Vote.from_mongo(dict(vote)) for vote in self._get_votes(info)]
+
+    @strawberry.field
+    def yesVotes(self, info: Info) -> list[HexValue]:
+        return [
+            get_proposal_hex_id(vote["proposalId"])
+            for vote in self._get_votes(info)
+            if vote["vote"]
+        ]
+
+    @strawberry.field
+    def noVotes(self, info: Info) -> list[HexValue]:
+        return [
+            get_proposal_hex_id(vote["proposalId"])
+            for vote in self._get_votes(info)
+            if not vote["vote"]
+        ]
 
     @strawberry.field
     def percentageOfTreasury(self, info) -> float:
-        bank = storage.get_bank(info)
+        bank = storage.get_bank(info, as_of_block=self.asOfBlock, dao=self.dao)
         total = bank.get("totalShares", 0) + bank.get("totalLoot", 0)
         return (self.shares + self.loot) / total
 
     @strawberry.field
     def votingWeight(self, info) -> float:
-        bank = storage.get_bank(info)
+        bank = storage.get_bank(info, as_of_block=self.asOfBlock, dao=self.dao)
         totalShares = bank.get("totalShares", 0)
         return self.shares / totalShares
 
@@ -45,6 +92,14 @@ class Member(FromMongoMixin):
 
 
 # pylint: disable=unused-argument
-def get_members(info: Info, limit: int = 10, skip: int = 0) -> list[Member]:
-    members = storage.list_members(info=info)
-    return [Member.from_mongo(doc) for doc in members]
+def get_members(
+    info: Info,
+    limit: int = 10,
+    skip: int = 0,
+    asOfBlock: Optional[int] = None,
+    dao: Optional[HexValue] = None,
+) -> list[Member]:
+    members = storage.list_members(
+        info=info, as_of_block=asOfBlock, dao=dao, with_votes=True
+    )
+    return [Member.from_mongo({**doc, "asOfBlock": asOfBlock}) for doc in members]
@@ -5,9 +5,20 @@ import strawberry
 from strawberry.types import Info
 
 from .. import utils
-from ..models import ProposalRawStatus, ProposalStatus
+from ..models import (
+    OrderDirection,
+    ProposalOrderField,
+    ProposalRawStatus,
+    ProposalStatus,
+    get_submitted_status,
+)
 from . import storage
-from .common import FromMongoMixin, HexValue
+from .common import DateRange, FromMongoMixin, HexValue, IntRange
+from .votes import Vote
+
+strawberry.enum(ProposalStatus)
+strawberry.enum(ProposalOrderField)
+strawberry.enum(OrderDirection)
 
 
 @strawberry.interface
@@ -25,6 +36,8 @@ class Proposal(FromMongoMixin):
     quorum: int
     votingDuration: int
     graceDuration: int
+    # The contract address of the DAO, None if the indexer isn't given any DAO
+    dao: Optional[HexValue] = None
 
     yesVoters: list[HexValue] = strawberry.field(default_factory=list)
     noVoters: list[HexValue] = strawberry.field(default_factory=list)
@@ -34,6 +47,19 @@ class Proposal(FromMongoMixin):
     noVotersMembers: strawberry.Private[list[dict]]
     rawStatus: strawberry.Private[str]
     rawStatusHistory: strawberry.Private[list[tuple[str, datetime]]]
+    # The block the proposal was read at, None for the current state
+    asOfBlock: strawberry.Private[Optional[int]] = None
+    # The time of asOfBlock, read once by get_now
+    asOfTime: strawberry.Private[Optional[datetime]] = None
+
+    def get_now(self, info: Info) -> datetime:
+        """The time the status is computed at, the time of the block the proposal
+        was read at for the historical queries"""
+        if self.asOfBlock is None:
+            return utils.utcnow()
+        if self.asOfTime is None:
+            self.asOfTime = storage.get_now(info, self.asOfBlock)
+        return self.asOfTime
 
     @strawberry.field
     def votingPeriodEndingAt(self) -> datetime:
@@ -90,6 +116,8 @@ class Proposal(FromMongoMixin):
             info=info,
             voting_period_ending_at=self.votingPeriodEndingAt(),
             submitted_at=self.submittedAt,
+            as_of_block=self.asOfBlock,
+            dao=self.dao,
         )
         return sum(member["shares"] for member in members)
 
@@ -119,7 +147,7 @@ class Proposal(FromMongoMixin):
 
     @strawberry.field
     def timeRemaining(self, info: Info) -> Optional[int]:
-        now = utils.utcnow()
+        now = self.get_now(info)
 
         if self.status(info) == ProposalStatus.VOTING_PERIOD:
             return int((now - self.votingPeriodEndingAt()).total_seconds())
@@ -128,21 +156,15 @@ class Proposal(FromMongoMixin):
             return int((now - self.gracePeriodEndingAt()).total_seconds())
 
     def _handle_submitted_status(self, info: Info) -> ProposalStatus:
-        now = utils.utcnow()
-
-        if now < self.votingPeriodEndingAt():
-            return ProposalStatus.VOTING_PERIOD
-
-        if (
-            self.currentMajority() >= self.majority
-            and self.currentQuorum(info) >= self.quorum
-        ):
-            if now < self.gracePeriodEndingAt():
-                return ProposalStatus.GRACE_PERIOD
-
-            return ProposalStatus.APPROVED_READY
-
-        return ProposalStatus.REJECTED_READY
+        return get_submitted_status(
+            now=self.get_now(info),
+            voting_period_ending_at=self.votingPeriodEndingAt(),
+            grace_period_ending_at=self.gracePeriodEndingAt(),
+            is_approved=lambda: (
+                self.currentMajority() >= self.majority
+                and self.currentQuorum(info) >= self.quorum
+            ),
+        )
 
     @strawberry.field
     def status(self, info: Info) -> ProposalStatus:
@@ -160,8 +182,24 @@ class Proposal(FromMongoMixin):
         return ProposalStatus.UNKNOWN
 
     @strawberry.field
-    def memberDidVote(self, memberAddress: HexValue) -> bool:
-        return memberAddress in self.yesVoters + self.noVoters
+    def votes(self, info: Info) -> list[Vote]:
+        votes = storage.list_votes(
+            info,
+            filter={"proposalId": self.id},
+            as_of_block=self.asOfBlock,
+            dao=self.dao,
+        )
+        return [Vote.from_mongo(vote) for vote in votes]
+
+    @strawberry.field
+    def memberDidVote(self, info: Info, memberAddress: HexValue) -> bool:
+        return storage.member_did_vote(
+            info,
+            proposal_id=self.id,
+            member_address=memberAddress,
+            as_of_block=self.asOfBlock,
+            dao=self.dao,
+        )
 
     # pylint: disable=unused-argument
     @strawberry.field
@@ -218,6 +256,59 @@ PROPOSAL_TYPE_TO_CLASS: dict[str, Type[Proposal]] = {
 }
 
 
-def get_proposals(info: Info, limit: int = 10, skip: int = 0) -> list[Proposal]:
-    proposals = storage.list_proposals(info=info, skip=skip, limit=limit)
-    return [PROPOSAL_TYPE_TO_CLASS[doc["type"]].from_mongo(doc) for doc in proposals]
+@strawberry.input
+class ProposalOrderBy:
+    field: ProposalOrderField
+    direction: OrderDirection = OrderDirection.DESC
+
+
+@strawberry.input
+class ProposalWhere:
+    """Filters on the computed fields of the proposals, timeRemaining is only set
+    during the voting and grace periods"""
+
+    votingPeriodEndingAt: Optional[DateRange] = None
+    gracePeriodEndingAt: Optional[DateRange] = None
+    processedAt: Optional[DateRange] = None
+    timeRemaining: Optional[IntRange] = None
+    yesVotesTotal: Optional[IntRange] = None
+    noVotesTotal: Optional[IntRange] = None
+
+    def to_mongo(self) -> dict:
+        where = {}
+        for name, range_ in vars(self).items():
+            if range_ is not None and (query := range_.to_mongo()):
+                where[name] = query
+        return where
+
+
+# pylint: disable=too-many-arguments
+def get_proposals(
+    info: Info,
+    limit: int = 10,
+    skip: int = 0,
+    asOfBlock: Optional[int] = None,
+    dao: Optional[HexValue] = None,
+    status: Optional[ProposalStatus] = None,
+    orderBy: Optional[ProposalOrderBy] = None,
+    where: Optional[ProposalWhere] = None,
+) -> list[Proposal]:
+    # The status materialized by the indexer
+    query = {} if status is None else {"derivedStatus": status.value}
+    sort = None
+    if orderBy is not None:
+        sort = [(orderBy.field.value, orderBy.direction.value)]
+    proposals = storage.list_proposals(
+        info=info,
+        skip=skip,
+        limit=limit,
+        filter=query,
+        as_of_block=asOfBlock,
+        dao=dao,
+        sort=sort,
+        where=None if where is None else where.to_mongo(),
+    )
+    return [
+        PROPOSAL_TYPE_TO_CLASS[doc["type"]].from_mongo({**doc, "asOfBlock": asOfBlock})
+        for doc in proposals
+    ]
@@ -0,0 +1,440 @@
+# pylint: disable=redefined-builtin
+"""Current state of the indexed DAOs held in memory by the GraphQL server.
+
+The current members, proposals, bank, tokens and votes are only a few MB, the
+ReadModel loads them at startup and serves the queries of the current state,
+asOfBlock queries and the rollups are still read from MongoDB.
+
+The read model follows the block cursor apibara commits in the "_apibara"
+collection once a block is indexed: the versions created or closed since the
+previous block read are fetched, and the current version of each of their
+documents replaces the one in memory. Like the subscriptions, it polls rather than
+using a change stream, which requires a replica set. A chain reorganization moves
+the cursor back, the read model is then loaded again, as it is every
+reload_interval to pick up a reorganization shorter than the poll interval.
+
+Only the versions valid at the cursor block are read, the block being indexed is
+ignored until it is committed.
+"""
+import asyncio
+import dataclasses
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+
+from pymongo.database import Database
+
+from dao import utils
+from dao.models import ProposalRawStatus, ProposalStatus
+from dao.query import matches
+
+from . import logger
+from .storage import HISTORY_INDEXES, PROPOSAL_COMPUTED_FIELDS, get_chain_filter
+
+READ_MODEL_COLLECTIONS = ("members", "proposals", "bank", "tokens", "votes")
+
+Document = dict[str, Any]
+Key = tuple
+
+
+def get_indexed_block(db: Database) -> Optional[int]:
+    """The last block committed by the indexer writing to db"""
+    state = db["_apibara"].find_one({}, projection=["indexed_to"])
+    if state is None:
+        return None
+    return state.get("indexed_to")
+
+
+def get_changed_filter(from_block: int, to_block: int) -> dict:
+    """Filters the versions created or closed in ]from_block, to_block]"""
+    block_range = {"$gt": from_block, "$lte": to_block}
+    return {
+        "$or": [
+            {"_chain.valid_from": block_range},
+            {"_chain.valid_to": block_range},
+        ]
+    }
+
+
+def _is_valid_at(doc: Document, block_number: int) -> bool:
+    chain = doc.get("_chain", {})
+    valid_from, valid_to = chain.get("valid_from"), chain.get("valid_to")
+    return (valid_from is None or valid_from <= block_number) and (
+        valid_to is None or valid_to > block_number
+    )
+
+
+def _sort(docs: list[Document], sort: list[tuple[str, int]]) -> list[Document]:
+    # As MongoDB, the missing and null values come first in ascending order
+    for field, direction in reversed(sort):
+        docs.sort(
+            key=lambda doc, field=field: (
+                doc.get(field) is not None,
+                doc.get(field) if doc.get(field) is not None else 0,
+            ),
+            reverse=direction == -1,
+        )
+    return docs
+
+
+@dataclasses.dataclass(frozen=True)
+class Snapshot:
+    """The documents valid at a block and their indexes, replaced as a whole so
+    that a query only reads one block"""
+
+    block: Optional[int] = None
+    documents: dict[str, dict[Key, Document]] = dataclasses.field(
+        default_factory=lambda: {name: {} for name in READ_MODEL_COLLECTIONS}
+    )
+    members_by_address: dict[bytes, list[Document]] = dataclasses.field(
+        default_factory=dict
+    )
+    votes_by_proposal: dict[int, list[Document]] = dataclasses.field(
+        default_factory=dict
+    )
+    votes_by_voter: dict[bytes, list[Document]] = dataclasses.field(
+        default_factory=dict
+    )
+    # submittedAt descending then id ascending, the default order of the
+    # proposals
+    proposals: list[Document] = dataclasses.field(default_factory=list)
+
+    def replace(
+        self,
+        block: int,
+        documents: dict[str, dict[Key, Document]],
+        changed: Iterable[str],
+    ) -> "Snapshot":
+        """A snapshot of documents at block, the indexes of the changed
+        collections are rebuilt"""
+        changed = set(changed)
+        indexes: dict[str, Any] = {}
+
+        if "members" in changed:
+            members_by_address = defaultdict(list)
+            for member in documents["members"].values():
+                members_by_address[member["memberAddress"]].append(member)
+            indexes["members_by_address"] = dict(members_by_address)
+
+        if "votes" in changed:
+            votes_by_proposal = defaultdict(list)
+            votes_by_voter = defaultdict(list)
+            votes = sorted(
+                documents["votes"].values(),
+                key=lambda vote: vote["votedAt"],
+                reverse=True,
+            )
+            for vote in votes:
+                votes_by_proposal[vote["proposalId"]].append(vote)
+                votes_by_voter[vote["voterAddress"]].append(vote)
+            indexes["votes_by_proposal"] = dict(votes_by_proposal)
+            indexes["votes_by_voter"] = dict(votes_by_voter)
+
+        if "proposals" in changed:
+            indexes["proposals"] = _sort(
+                list(documents["proposals"].values()),
+                [("submittedAt", -1), ("id", 1)],
+            )
+
+        return dataclasses.replace(self, block=block, documents=documents, **indexes)
+
+
+class ReadModel:
+    """Serves the queries of the current state from indexed in-memory documents
+
+    The queries run in the event loop while the read model syncs in an executor,
+    each of them reads the snapshot published by the last sync.
+    """
+
+    def __init__(
+        self, db: Database, poll_interval: float = 1, reload_interval: float = 300
+    ):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.snapshot = Snapshot()
+        self._loaded_at = 0.0
+
+    @property
+    def block(self) -> Optional[int]:
+        """Block the documents are read at, None until they are loaded"""
+        return self.snapshot.block
+
+    @property
+    def loaded(self) -> bool:
+        return self.block is not None
+
+    @staticmethod
+    def get_key(collection: str, doc: Document) -> Key:
+        return (
+            doc.get("dao"),
+            *(doc.get(field) for field in HISTORY_INDEXES[collection]),
+        )
+
+    def load(self):
+        """Reads the documents valid at the last block committed by the indexer"""
+        block_number = get_indexed_block(self.db)
+        if block_number is None:
+            return
+
+        documents = {}
+        for collection in READ_MODEL_COLLECTIONS:
+            docs = self.db[collection].find(get_chain_filter(block_number))
+            documents[collection] = {self.get_key(collection, doc): doc for doc in docs}
+
+        self.snapshot = Snapshot().replace(
+            block_number, documents, READ_MODEL_COLLECTIONS
+        )
+        self._loaded_at = time.monotonic()
+        logger.info(
+            "Loaded the read model at block %s: %s",
+            block_number,
+            {name: len(docs) for name, docs in documents.items()},
+        )
+
+    def sync(self):
+        """Applies the changes committed by the indexer since the last sync"""
+        block_number = get_indexed_block(self.db)
+        if block_number is None:
+            return
+
+        snapshot = self.snapshot
+        if (
+            snapshot.block is None
+            or block_number < snapshot.block
+            or time.monotonic() - self._loaded_at >= self.reload_interval
+        ):
+            self.load()
+            return
+
+        if block_number == snapshot.block:
+            return
+
+        documents = dict(snapshot.documents)
+        changed = set()
+        for collection in READ_MODEL_COLLECTIONS:
+            versions = self.db[collection].find(
+                get_changed_filter(snapshot.block, block_number)
+            )
+            current: dict[Key, Optional[Document]] = {}
+            for version in versions:
+                key = self.get_key(collection, version)
+                if _is_valid_at(version, block_number):
+                    current[key] = version
+                else:
+                    current.setdefault(key, None)
+
+            if not current:
+                continue
+
+            # The documents of the published snapshot aren't updated in place
+            collection_documents = dict(documents[collection])
+            for key, doc in current.items():
+                if doc is None:
+                    # Deleted
+                    collection_documents.pop(key, None)
+                else:
+                    collection_documents[key] = doc
+            documents[collection] = collection_documents
+            changed.add(collection)
+
+        self.snapshot = snapshot.replace(block_number, documents, changed)
+        logger.debug("Synced the read model to block %s: %s", block_number, changed)
+
+    async def run(self):
+        logger.info("Syncing the read model every %ss", self.poll_interval)
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sync)
+            # pylint: disable=broad-except
+            except Exception as error:
+                logger.warning("Cannot sync the read model: %s", error)
+
+            await asyncio.sleep(self.poll_interval)
+
+    def _in_scope(self, docs: Iterable[Document], dao: Optional[bytes]):
+        return (doc for doc in docs if dao is None or doc.get("dao") == dao)
+
+    def list_members(
+        self, filter: dict, dao: Optional[bytes] = None, with_votes: bool = False
+    ) -> list[Document]:
+        snapshot = self.snapshot
+        members = [
+            dict(member)
+            for member in self._in_scope(snapshot.documents["members"].values(), dao)
+            if matches(member, filter)
+        ]
+        if with_votes:
+            for member in members:
+                member["memberVotes"] = [
+                    dict(vote)
+                    for vote in snapshot.votes_by_voter.get(member["memberAddress"], [])
+                    if vote.get("dao") == member.get("dao")
+                ]
+        return members
+
+    def get_member(
+        self, member_address: bytes, dao: Optional[bytes] = None
+    ) -> Optional[Document]:
+        members = self._in_scope(
+            self.snapshot.members_by_address.get(member_address, []), dao
+        )
+        member = next(members, None)
+        return None if member is None else dict(member)
+
+    def list_votes(self, filter: dict, dao: Optional[bytes] = None) -> list[Document]:
+        """The votes matching filter, the last ones first"""
+        snapshot = self.snapshot
+        if "proposalId" in filter:
+            votes = snapshot.votes_by_proposal.get(filter["proposalId"], [])
+        elif "voterAddress" in filter:
+            votes = snapshot.votes_by_voter.get(filter["voterAddress"], [])
+        else:
+            votes = _sort(list(snapshot.documents["votes"].values()), [("votedAt", -1)])
+        return [
+            dict(vote) for vote in self._in_scope(votes, dao) if matches(vote, filter)
+        ]
+
+    def list_tokens(self, filter: dict, dao: Optional[bytes] = None) -> list[Document]:
+        return [
+            dict(token)
+            for token in self._in_scope(self.snapshot.documents["tokens"].values(), dao)
+            if matches(token, filter)
+        ]
+
+    def get_bank(self, filter: dict, dao: Optional[bytes] = None) -> Optional[Document]:
+        documents = self.snapshot.documents
+        banks = self._in_scope(documents["bank"].values(), dao)
+        bank = next((bank for bank in banks if matches(bank, filter)), None)
+        if bank is None:
+            return None
+
+        members = list(self._in_scope(documents["members"].values(), dao))
+        bank = dict(bank)
+        if members:
+            bank["totalShares"] = sum(member["shares"] for member in members)
+            bank["totalLoot"] = sum(member["loot"] for member in members)
+        return bank
+
+    def _with_votes(
+        self, snapshot: Snapshot, proposal: Document, dao: Optional[bytes]
+    ) -> Document:
+        yes_voters, yes_voters_members = self._get_voters(snapshot, proposal, True, dao)
+        no_voters, no_voters_members = self._get_voters(snapshot, proposal, False, dao)
+        return {
+            **proposal,
+            "yesVoters": yes_voters,
+            "noVoters": no_voters,
+            "yesVotersMembers": yes_voters_members,
+            "noVotersMembers": no_voters_members,
+        }
+
+    def _get_voters(
+        self, snapshot: Snapshot, proposal: Document, vote: bool, dao: Optional[bytes]
+    ) -> tuple[list[bytes], list[Document]]:
+        voters = [
+            item["voterAddress"]
+            for item in self._in_scope(
+                snapshot.votes_by_proposal.get(proposal["id"], []), dao
+            )
+            if item["vote"] is vote
+        ]
+        members = [
+            member
+            for address in dict.fromkeys(voters)
+            for member in self._in_scope(
+                snapshot.members_by_address.get(address, []), dao
+            )
+        ]
+        return voters, members
+
+    @staticmethod
+    def _add_computed_fields(proposal: Document, now: datetime) -> Document:
+        # Same as get_proposals_computed_fields
+        voting_period_ending_at = proposal["submittedAt"] + timedelta(
+            minutes=proposal["votingDuration"]
+        )
+        grace_period_ending_at = voting_period_ending_at + timedelta(
+            minutes=proposal["graceDuration"]
+        )
+        processed_at = None
+        if proposal["rawStatus"] in (
+            ProposalRawStatus.APPROVED.value,
+            ProposalRawStatus.REJECTED.value,
+        ):
+            processed_at = proposal["rawStatusHistory"][-1][1]
+
+        time_remaining = None
+        if proposal["rawStatus"] == ProposalRawStatus.SUBMITTED.value:
+            if now < voting_period_ending_at:
+                time_remaining = int((now - voting_period_ending_at).total_seconds())
+            elif (
+                now < grace_period_ending_at
+                and proposal.get("derivedStatus") != ProposalStatus.REJECTED_READY.value
+            ):
+                time_remaining = int((now - grace_period_ending_at).total_seconds())
+
+        return {
+            **proposal,
+            "votingPeriodEndingAt": voting_period_ending_at,
+            "gracePeriodEndingAt": grace_period_ending_at,
+            "processedAt": processed_at,
+            "timeRemaining": time_remaining,
+            "yesVotesTotal": sum(
+                member["shares"] for member in proposal["yesVotersMembers"]
+            ),
+            "noVotesTotal": sum(
+                member["shares"] for member in proposal["noVotersMembers"]
+            ),
+        }
+
+    # pylint: disable=too-many-arguments
+    def list_proposals(
+        self,
+        skip: Optional[int] = None,
+        limit: Optional[int] = None,
+        filter: Optional[dict] = None,
+        dao: Optional[bytes] = None,
+        sort: Optional[list[tuple[str, int]]] = None,
+        where: Optional[dict] = None,
+        now: Optional[datetime] = None,
+    ) -> list[Document]:
+        """Same as the pipeline of get_list_proposals_query"""
+        filter = filter or {}
+        where = where or {}
+        now = utils.utcnow() if now is None else now
+        snapshot = self.snapshot
+
+        proposals = [
+            proposal
+            for proposal in self._in_scope(snapshot.proposals, dao)
+            if matches(proposal, filter)
+        ]
+        # The votes and computed fields are only needed before the pagination
+        # to sort or filter the proposals
+        if sort is not None or where:
+            proposals = [
+                proposal
+                for proposal in (
+                    self._add_computed_fields(
+                        self._with_votes(snapshot, proposal, dao), now
+                    )
+                    for proposal in proposals
+                )
+                if matches(proposal, where)
+            ]
+        if sort is not None:
+            proposals = _sort(proposals, [*sort, ("id", dict(sort).get("id", 1))])
+
+        start = skip or 0
+        page = proposals[start : None if limit is None else start + limit]
+        return [
+            {
+                key: value
+                for key, value in self._with_votes(snapshot, proposal, dao).items()
+                if key not in PROPOSAL_COMPUTED_FIELDS
+            }
+            for proposal in page
+        ]
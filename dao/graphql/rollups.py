@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import Optional
+
+import strawberry
+from strawberry.types import Info
+
+from ..models import RollupPeriod
+from . import storage
+from .common import FromMongoMixin, HexValue
+
+strawberry.enum(RollupPeriod)
+
+
+@strawberry.type
+class TreasuryRollup(FromMongoMixin):
+    tokenAddress: HexValue
+    period: RollupPeriod
+    periodStart: datetime
+    inflow: int
+    outflow: int
+    closingBalance: int
+
+    @classmethod
+    def from_mongo(cls, data: dict):
+        data["period"] = RollupPeriod(data["period"])
+        return super().from_mongo(data)
+
+
+@strawberry.type
+class MembershipRollup(FromMongoMixin):
+    period: RollupPeriod
+    periodStart: datetime
+    totalShares: int
+    totalLoot: int
+    activeCount: int
+    jailedCount: int
+    exitedCount: int
+
+    @classmethod
+    def from_mongo(cls, data: dict):
+        data["period"] = RollupPeriod(data["period"])
+        return super().from_mongo(data)
+
+
+# pylint: disable=too-many-arguments
+def get_treasury_history(
+    info: Info,
+    period: RollupPeriod = RollupPeriod.HOUR,
+    tokenAddress: Optional[HexValue] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    dao: Optional[HexValue] = None,
+) -> list[TreasuryRollup]:
+    filter_ = {} if tokenAddress is None else {"tokenAddress": tokenAddress}
+    rollups = storage.list_rollups(
+        info=info,
+        collection="treasury_rollups",
+        period=period.value,
+        filter=filter_,
+        start=start,
+        end=end,
+        dao=dao,
+    )
+    return [TreasuryRollup.from_mongo(doc) for doc in rollups]
+
+
+def get_membership_history(
+    info: Info,
+    period: RollupPeriod = RollupPeriod.HOUR,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    dao: Optional[HexValue] = None,
+) -> list[MembershipRollup]:
+    rollups = storage.list_rollups(
+        info=info,
+        collection="membership_rollups",
+        period=period.value,
+        start=start,
+        end=end,
+        dao=dao,
+    )
+    return [MembershipRollup.from_mongo(doc) for doc in rollups]
@@ -1,8 +1,21 @@
 import strawberry
+from strawberry.extensions import QueryDepthLimiter
 
+from dao import config
+
+from .activity import Activity, get_activity
 from .bank import Bank, get_bank
+from .cost import MongoTimeout, QueryCostLimiter
+from .health import IndexerHealth, get_health
 from .members import Member, get_members
 from .proposals import PROPOSAL_TYPE_TO_CLASS, Proposal, get_proposals
+from .rollups import (
+    MembershipRollup,
+    TreasuryRollup,
+    get_membership_history,
+    get_treasury_history,
+)
+from .subscriptions import Subscription
 
 
 @strawberry.type
@@ -10,6 +23,23 @@ class Query:
     proposals: list[Proposal] = strawberry.field(resolver=get_proposals)
     members: list[Member] = strawberry.field(resolver=get_members)
     bank: Bank = strawberry.field(resolver=get_bank)
+    treasuryHistory: list[TreasuryRollup] = strawberry.field(
+        resolver=get_treasury_history
+    )
+    membershipHistory: list[MembershipRollup] = strawberry.field(
+        resolver=get_membership_history
+    )
+    activity: list[Activity] = strawberry.field(resolver=get_activity)
+    health: IndexerHealth = strawberry.field(resolver=get_health)
 
 
-schema = strawberry.Schema(query=Query, types=list(PROPOSAL_TYPE_TO_CLASS.values()))
+schema = strawberry.Schema(
+    query=Query,
+    subscription=Subscription,
+    types=list(PROPOSAL_TYPE_TO_CLASS.values()),
+    extensions=[
+        QueryDepthLimiter(max_depth=config.graphql_max_depth),
+        QueryCostLimiter,
+        MongoTimeout,
+    ],
+)
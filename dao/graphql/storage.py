@@ -1,66 +1,345 @@
 # pylint: disable=redefined-builtin
 import json
 import os
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 from pymongo.database import Database
-from strawberry.types import Info
 
 from dao import config, utils
+from dao.models import ProposalRawStatus, ProposalStatus
 
 from . import logger
 
+# The indexer sets up the database with init_db, it doesn't need strawberry
+if TYPE_CHECKING:
+    from strawberry.types import Info
 
-def create_collection_with_validators(db: Database, collection: str):
-    here = Path(__file__)
-    validators_dir = here.parent.parent / "indexer" / "validators"
+    from .read_model import ReadModel
 
-    collections = db.list_collection_names()
 
+# Collections whose documents are validated by the $jsonSchema of
+# dao/indexer/validators
+VALIDATED_COLLECTIONS = [
+    "proposals",
+    "proposal_params",
+    "members",
+    "bank",
+    "votes",
+    "tokens",
+    "treasury_rollups",
+    "membership_rollups",
+]
+
+
+def load_validator(collection: str) -> dict:
+    validators_dir = Path(__file__).parent.parent / "indexer" / "validators"
     with open(
         validators_dir / f"{collection}_validator.json",
         encoding="utf-8",
     ) as f:
-        collection_validator = json.load(f)
+        return json.load(f)
+
+
+def create_collection_with_validators(db: Database, collection: str):
+    collections = db.list_collection_names()
+    collection_validator = load_validator(collection)
 
     if collection not in collections:
         db.create_collection(collection, validator=collection_validator)
     else:
-        db.command("collMod", collection, validator=collection_validator)
+        # Also restores the validation turned off by the backfill mode
+        db.command(
+            "collMod",
+            collection,
+            validator=collection_validator,
+            validationLevel="strict",
+        )
 
 
-def create_indexes(db: Database):
-    db["proposals"].create_index("id", unique=True)
-    db["proposal_params"].create_index("type", unique=True)
-    db["members"].create_index("memberAddress", unique=True)
-    db["bank"].create_index("bankAddress", unique=True)
+def set_validation(db: Database, enabled: bool):
+    """Turns the validation of the validated collections on or off"""
+    # mongomock doesn't support validators
+    if os.getenv("USING_MONGOMOCK", "").lower() == "true":
+        return
+
+    collections = db.list_collection_names()
+    for collection in VALIDATED_COLLECTIONS:
+        if collection in collections:
+            db.command(
+                "collMod",
+                collection,
+                validationLevel="strict" if enabled else "off",
+            )
+
+
+# Entity keys of the versioned collections, the versions of an entity are indexed
+# by validity range to read its current or historical state at the same cost
+HISTORY_INDEXES = {
+    "proposals": ["id"],
+    "proposal_params": ["type"],
+    "members": ["memberAddress"],
+    "bank": ["bankAddress"],
+    "tokens": ["tokenAddress"],
+    "votes": ["proposalId", "voterAddress"],
+    "treasury_rollups": ["period", "tokenAddress", "periodStart"],
+    "membership_rollups": ["period", "periodStart"],
+}
+
+# Indexes of the previous versions, the unique ones prevent keeping the superseded
+# versions of an entity
+LEGACY_INDEXES = {
+    "proposals": ["id_1"],
+    "proposal_params": ["type_1"],
+    "members": ["memberAddress_1"],
+    "bank": ["bankAddress_1"],
+    "tokens": ["tokenAddress_1"],
+    "votes": ["proposalId_1_voterAddress_1"],
+}
+
+
+# Indexes only used by the GraphQL queries, the indexer can write without them
+QUERY_INDEXES: dict[str, list[list[tuple[str, int]]]] = {
+    # Documents of a DAO, when several DAOs are indexed in the same database
+    collection: [[("dao", 1), ("_chain.valid_to", 1)]]
+    for collection in HISTORY_INDEXES
+}
+# Votes history of a member
+QUERY_INDEXES["votes"].append([("voterAddress", 1), ("votedAt", -1)])
+# Activity feed, the latest events first, by event name, address or DAO
+QUERY_INDEXES["events"] = [
+    [(key, 1) for key in prefix] + [("emittedAt", -1), ("_id", -1)]
+    for prefix in ([], ["name"], ["addresses"], ["dao"])
+]
+
+
+def create_query_indexes(db: Database):
+    for collection, indexes in QUERY_INDEXES.items():
+        for keys in indexes:
+            db[collection].create_index(keys)
+
+
+def drop_query_indexes(db: Database):
+    """Drops the indexes only used by the GraphQL queries, create_indexes builds
+    them again"""
+    for collection, indexes in QUERY_INDEXES.items():
+        existing = db[collection].index_information()
+        for keys in indexes:
+            name = "_".join(f"{key}_{direction}" for key, direction in keys)
+            if name in existing:
+                logger.info("Dropping index %s of %s", name, collection)
+                db[collection].drop_index(name)
+
+
+def create_indexes(db: Database, query_indexes: bool = True):
+    for collection, names in LEGACY_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                logger.info("Dropping index %s of %s", name, collection)
+                db[collection].drop_index(name)
+
+    for collection, keys in HISTORY_INDEXES.items():
+        db[collection].create_index(
+            [(key, 1) for key in keys]
+            + [("_chain.valid_from", 1), ("_chain.valid_to", 1)]
+        )
+
+    # Key of the applied events, sparse as the events indexed before it lack it
+    db["events"].create_index(
+        [("blockNumber", 1), ("logIndex", 1), ("transactionHash", 1)],
+        unique=True,
+        sparse=True,
+    )
+
+    # Streamed in block order by dao export
+    for collection in ("events", "members", "proposals"):
+        db[collection].create_index("_chain.valid_from")
+
+    # Proposals filtered by status, and the due status transitions of the indexer
+    db["proposals"].create_index([("derivedStatus", 1), ("_chain.valid_to", 1)])
+    db["proposals"].create_index("derivedStatusUntil")
+
+    if query_indexes:
+        create_query_indexes(db)
+    set_events_retention(db, config.events_retention_days)
+
+    # Used by the compaction to find the superseded versions
+    for collection in (
+        "proposals",
+        "proposal_params",
+        "members",
+        "bank",
+        "tokens",
+        "treasury_rollups",
+        "membership_rollups",
+    ):
+        db[collection].create_index("_chain.valid_to")
+
+
+EVENTS_RETENTION_INDEX = "emittedAt_ttl"
+
+
+def set_events_retention(db: Database, days: int):
+    """Expires the events older than days, or keeps them forever if days is 0.
+
+    The expired events are only missing from the activity feed, the indexed
+    state doesn't depend on them. The events collection can't be capped, apibara
+    deletes the events of the invalidated blocks.
+    """
+    indexes = db["events"].index_information()
+    expire_after = days * 24 * 3600
+
+    if EVENTS_RETENTION_INDEX in indexes:
+        if indexes[EVENTS_RETENTION_INDEX].get("expireAfterSeconds") == expire_after:
+            return
+        db["events"].drop_index(EVENTS_RETENTION_INDEX)
+
+    if days:
+        logger.info("Expiring the events after %s days", days)
+        db["events"].create_index(
+            "emittedAt", name=EVENTS_RETENTION_INDEX, expireAfterSeconds=expire_after
+        )
+
+
+def add_events_addresses(db: Database):
+    """Adds the addresses field to the events written before it was"""
+    # The binary fields of the payload, the dao is added to every event
+    db["events"].update_many(
+        {"addresses": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "addresses": {
+                        "$setUnion": {
+                            "$map": {
+                                "input": {
+                                    "$filter": {
+                                        "input": {"$objectToArray": "$$ROOT"},
+                                        "cond": {
+                                            "$and": [
+                                                {
+                                                    "$eq": [
+                                                        {"$type": "$$this.v"},
+                                                        "binData",
+                                                    ]
+                                                },
+                                                {"$ne": ["$$this.k", "dao"]},
+                                            ]
+                                        },
+                                    }
+                                },
+                                "in": "$$this.v",
+                            }
+                        }
+                    }
+                }
+            }
+        ],
+    )
 
 
-def init_db(db: Database):
+def init_db(db: Database, query_indexes: bool = True):
+    """Sets the validators and creates the indexes, the indexes of the queries are
+    deferred to the end of the backfill if query_indexes is False"""
     logger.info("Init db=%s, collections=%s", db.name, db.list_collection_names())
 
     # mongomock doesn't support validators
     if os.getenv("USING_MONGOMOCK", "").lower() != "true":
-        create_collection_with_validators(db, "proposals")
-        create_collection_with_validators(db, "proposal_params")
-        create_collection_with_validators(db, "members")
-        create_collection_with_validators(db, "bank")
+        for collection in VALIDATED_COLLECTIONS:
+            create_collection_with_validators(db, collection)
+
+        # mongomock doesn't support the update pipelines
+        add_events_addresses(db)
+
+    create_indexes(db, query_indexes=query_indexes)
 
-    create_indexes(db)
+
+def get_chain_filter(as_of_block: Optional[int] = None) -> dict:
+    """Filters the versions valid at as_of_block, or the current versions.
+
+    A version is valid from _chain.valid_from included to _chain.valid_to excluded,
+    the versions compacted by the indexer can't be read anymore.
+    """
+    if as_of_block is None:
+        return {"_chain.valid_to": None}
+
+    return {
+        "_chain.valid_from": {"$lte": as_of_block},
+        # Matches the current versions too, their valid_to is null
+        "_chain.valid_to": {"$not": {"$lte": as_of_block}},
+    }
 
 
-def list_members(info: Info, filter=None):
+def get_scope_filter(
+    as_of_block: Optional[int] = None, dao: Optional[bytes] = None
+) -> dict:
+    """Filters the versions of get_chain_filter, restricted to the documents of dao
+    if given, otherwise the documents of all the DAOs indexed in the database"""
+    if dao is None:
+        return get_chain_filter(as_of_block)
+
+    return {**get_chain_filter(as_of_block), "dao": dao}
+
+
+def get_read_model(
+    info: "Info", as_of_block: Optional[int] = None
+) -> Optional["ReadModel"]:
+    """The read model of the GraphQL server if it serves the query, the current
+    state once loaded, None to read MongoDB"""
+    read_model = info.context.get("read_model")
+    if as_of_block is not None or read_model is None or not read_model.loaded:
+        return None
+    return read_model
+
+
+def list_members(
+    info: "Info",
+    filter=None,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
+    with_votes: bool = False,
+):
+    """The members matching filter, with their votes in memberVotes, the last ones
+    first, if with_votes"""
     if filter is None:
         filter = {}
 
+    if read_model := get_read_model(info, as_of_block):
+        return read_model.list_members(filter, dao=dao, with_votes=with_votes)
+
     db: Database = info.context["db"]
-    # TODO: Use dataloaders or any other mechanism for caching
-    members = db["members"].find({"_chain.valid_to": None, **filter})
+    scope_filter = get_scope_filter(as_of_block, dao)
+    if not with_votes:
+        return db["members"].find({**scope_filter, **filter})
+
+    members = list(db["members"].find({**scope_filter, **filter}))
+    # The votes of all the members are read by a single query
+    votes = defaultdict(list)
+    addresses = [member["memberAddress"] for member in members]
+    for vote in db["votes"].find(
+        {**scope_filter, "voterAddress": {"$in": addresses}}, sort=[("votedAt", -1)]
+    ):
+        votes[vote.get("dao"), vote["voterAddress"]].append(vote)
+    for member in members:
+        member["memberVotes"] = votes[member.get("dao"), member["memberAddress"]]
     return members
 
 
+def get_member(
+    info: "Info", member_address: bytes, dao: Optional[bytes] = None
+) -> Optional[dict]:
+    if read_model := get_read_model(info):
+        return read_model.get_member(member_address, dao=dao)
+
+    db: Database = info.context["db"]
+    return db["members"].find_one(
+        {**get_scope_filter(dao=dao), "memberAddress": member_address}
+    )
+
+
 def get_votable_members_query(
     voting_period_ending_at: datetime, submitted_at: datetime
 ):
@@ -91,33 +370,78 @@ def get_votable_members_query(
 
 
 def list_votable_members(
-    info: Info, voting_period_ending_at: datetime, submitted_at: datetime
+    info: "Info",
+    voting_period_ending_at: datetime,
+    submitted_at: datetime,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
 ):
-    db: Database = info.context["db"]
-
     query = get_votable_members_query(
         voting_period_ending_at=voting_period_ending_at, submitted_at=submitted_at
     )
 
+    if read_model := get_read_model(info, as_of_block):
+        return read_model.list_members(query, dao=dao)
+
+    db: Database = info.context["db"]
+
     # TODO: Use dataloaders or any other mechanism for caching
-    members = db["members"].find({"_chain.valid_to": None, **query})
+    members = db["members"].find({**get_scope_filter(as_of_block, dao), **query})
     return members
 
 
-def get_list_proposals_query(
-    skip: Optional[int] = None,
-    limit: Optional[int] = None,
-):
-    current_block_filter = {"_chain.valid_to": None}
+# Fields computed by get_list_proposals_query to sort and filter the proposals, they
+# are dropped from the results, the Proposal resolvers of the same name return them
+PROPOSAL_COMPUTED_FIELDS = (
+    "votingPeriodEndingAt",
+    "gracePeriodEndingAt",
+    "processedAt",
+    "timeRemaining",
+    "yesVotesTotal",
+    "noVotesTotal",
+)
+# The computed fields needing the votes and voters lookups
+PROPOSAL_VOTES_FIELDS = {"yesVotesTotal", "noVotesTotal"}
 
-    # TODO: use $set with MongoDB Expressions[1] to add fields we need for sorting
-    # like timeRemaining and processedAt
-    # [1]: https://www.mongodb.com/docs/manual/meta/aggregation-quick-reference
-    # /#std-label-aggregation-expressions
-    pipeline: list[dict[str, Any]] = [
-        {"$match": current_block_filter},
-        {"$skip": skip},
-        {"$limit": limit},
+
+def get_proposals_votes_lookups(current_block_filter: dict) -> list[dict[str, Any]]:
+    return [
+        {
+            "$lookup": {
+                "from": "votes",
+                "pipeline": [{"$match": current_block_filter}],
+                "localField": "id",
+                "foreignField": "proposalId",
+                "as": "votes",
+            }
+        },
+        {
+            "$addFields": {
+                "yesVoters": {
+                    "$map": {
+                        "input": {
+                            "$filter": {
+                                "input": "$votes",
+                                "cond": {"$eq": ["$$this.vote", True]},
+                            }
+                        },
+                        "in": "$$this.voterAddress",
+                    }
+                },
+                "noVoters": {
+                    "$map": {
+                        "input": {
+                            "$filter": {
+                                "input": "$votes",
+                                "cond": {"$eq": ["$$this.vote", False]},
+                            }
+                        },
+                        "in": "$$this.voterAddress",
+                    }
+                },
+            }
+        },
+        {"$project": {"votes": False}},
         {
             "$lookup": {
                 "from": "members",
@@ -136,9 +460,165 @@ def get_list_proposals_query(
                 "as": "noVotersMembers",
             }
         },
-        {"$sort": {"submittedAt": -1}},
     ]
 
+
+def get_time_remaining_expression(now: datetime) -> dict[str, Any]:
+    """timeRemaining at now, negative like the resolver, set during the voting and
+    grace periods. Whether the proposal is approved, and has a grace period, is
+    read from the status derived by the indexer: a rejected proposal is known as
+    such from the first block after its voting period."""
+    # In milliseconds, mongomock doesn't support the date arithmetic
+    elapsed = {"$subtract": [now, "$submittedAt"]}
+    voting = {"$multiply": ["$votingDuration", 60_000]}
+    voting_and_grace = {
+        "$multiply": [{"$add": ["$votingDuration", "$graceDuration"]}, 60_000]
+    }
+
+    def seconds_to(end: dict) -> dict:
+        return {"$trunc": {"$divide": [{"$subtract": [elapsed, end]}, 1000]}}
+
+    return {
+        "$cond": [
+            {"$ne": ["$rawStatus", ProposalRawStatus.SUBMITTED.value]},
+            None,
+            {
+                "$cond": [
+                    {"$lt": [elapsed, voting]},
+                    seconds_to(voting),
+                    {
+                        "$cond": [
+                            {
+                                "$and": [
+                                    {"$lt": [elapsed, voting_and_grace]},
+                                    {
+                                        "$ne": [
+                                            "$derivedStatus",
+                                            ProposalStatus.REJECTED_READY.value,
+                                        ]
+                                    },
+                                ]
+                            },
+                            seconds_to(voting_and_grace),
+                            None,
+                        ]
+                    },
+                ]
+            },
+        ]
+    }
+
+
+def get_proposals_computed_fields(now: datetime) -> list[dict[str, Any]]:
+    stages: list[dict[str, Any]] = [
+        {
+            "$addFields": {
+                "votingPeriodEndingAt": {
+                    "$dateAdd": {
+                        "startDate": "$submittedAt",
+                        "unit": "minute",
+                        "amount": "$votingDuration",
+                    }
+                },
+                "processedAt": {
+                    "$cond": [
+                        {
+                            "$in": [
+                                "$rawStatus",
+                                [
+                                    ProposalRawStatus.APPROVED.value,
+                                    ProposalRawStatus.REJECTED.value,
+                                ],
+                            ]
+                        },
+                        {"$arrayElemAt": [{"$last": "$rawStatusHistory"}, 1]},
+                        None,
+                    ]
+                },
+                "timeRemaining": get_time_remaining_expression(now),
+            }
+        },
+        {
+            "$addFields": {
+                "gracePeriodEndingAt": {
+                    "$dateAdd": {
+                        "startDate": "$votingPeriodEndingAt",
+                        "unit": "minute",
+                        "amount": "$graceDuration",
+                    }
+                },
+            }
+        },
+    ]
+
+    # mongomock doesn't support the date arithmetic
+    if os.getenv("USING_MONGOMOCK", "").lower() == "true":
+        stages[0]["$addFields"].pop("votingPeriodEndingAt")
+        stages.pop()
+
+    return stages
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def get_list_proposals_query(
+    skip: Optional[int] = None,
+    limit: Optional[int] = None,
+    filter: Optional[dict] = None,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
+    sort: Optional[list[tuple[str, int]]] = None,
+    where: Optional[dict] = None,
+    now: Optional[datetime] = None,
+):
+    """Lists the proposals matching filter on their stored fields and where on
+    their computed fields, sorted by sort, submittedAt descending by default
+
+    The proposals are paginated once sorted, the votes and voters are only read
+    before the pagination when sorting or filtering by the votes totals.
+    """
+    if filter is None:
+        filter = {}
+    if where is None:
+        where = {}
+    if sort is None:
+        sort = [("submittedAt", -1)]
+
+    # The votes and voters are read at the same block, and from the same DAO, as
+    # the proposals
+    current_block_filter = get_scope_filter(as_of_block, dao)
+    votes_lookups = get_proposals_votes_lookups(current_block_filter)
+
+    computed_fields = {field for field, _ in sort} | set(where)
+    needs_votes = bool(computed_fields & PROPOSAL_VOTES_FIELDS)
+
+    pipeline: list[dict[str, Any]] = [
+        {"$match": {**current_block_filter, **filter}},
+        *get_proposals_computed_fields(utils.utcnow() if now is None else now),
+    ]
+    if needs_votes:
+        pipeline += votes_lookups
+        pipeline.append(
+            {
+                "$addFields": {
+                    "yesVotesTotal": {"$sum": "$yesVotersMembers.shares"},
+                    "noVotesTotal": {"$sum": "$noVotersMembers.shares"},
+                }
+            }
+        )
+    if where:
+        pipeline.append({"$match": where})
+
+    # The proposals submitted in the same block are listed in the order they were
+    # added, so that the pages don't overlap
+    pipeline.append({"$sort": {**dict(sort), "id": dict(sort).get("id", 1)}})
+    if skip is not None:
+        pipeline.append({"$skip": skip})
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    if not needs_votes:
+        pipeline += votes_lookups
+    pipeline.append({"$project": {field: False for field in PROPOSAL_COMPUTED_FIELDS}})
+
     # Disable pipeline operator when using mongomock
     # because it doesn't support it
     if os.getenv("USING_MONGOMOCK", "").lower() == "true":
@@ -150,31 +630,218 @@ def get_list_proposals_query(
     return pipeline
 
 
+def get_block_time(info: "Info", block_number: int) -> Optional[datetime]:
+    """The time of block_number, as the time of the last event indexed at or before
+    it: the time the state read at block_number was last changed by the events. None
+    if no event was indexed yet."""
+    db: Database = info.context["db"]
+    event = db["events"].find_one(
+        {"blockNumber": {"$lte": block_number}},
+        projection=["emittedAt"],
+        sort=[("blockNumber", -1)],
+    )
+    if event is None:
+        return None
+
+    emitted_at = event["emittedAt"]
+    # pymongo returns naive datetimes unless the client is tz_aware
+    if emitted_at.tzinfo is None:
+        emitted_at = emitted_at.replace(tzinfo=timezone.utc)
+    return emitted_at
+
+
+def get_now(info: "Info", as_of_block: Optional[int] = None) -> datetime:
+    """The time the statuses of the proposals are computed at, the time of
+    as_of_block for the historical queries"""
+    if as_of_block is not None and (block_time := get_block_time(info, as_of_block)):
+        return block_time
+    return utils.utcnow()
+
+
+# pylint: disable=too-many-arguments
 def list_proposals(
-    info: Info,
+    info: "Info",
     skip: Optional[int] = None,
     limit: Optional[int] = None,
+    filter: Optional[dict] = None,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
+    sort: Optional[list[tuple[str, int]]] = None,
+    where: Optional[dict] = None,
 ):
+    if read_model := get_read_model(info, as_of_block):
+        return read_model.list_proposals(
+            skip=skip, limit=limit, filter=filter, dao=dao, sort=sort, where=where
+        )
+
     db: Database = info.context["db"]
 
-    pipeline = get_list_proposals_query(skip=skip, limit=limit)
+    pipeline = get_list_proposals_query(
+        skip=skip,
+        limit=limit,
+        filter=filter,
+        as_of_block=as_of_block,
+        dao=dao,
+        sort=sort,
+        where=where,
+        now=get_now(info, as_of_block),
+    )
 
     proposals = db["proposals"].aggregate(pipeline)
 
     return proposals
 
 
-def get_bank(info: Info):
-    current_block_filter = {"_chain.valid_to": None}
+def list_votes(
+    info: "Info",
+    filter: Optional[dict] = None,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
+):
+    if filter is None:
+        filter = {}
+
+    if read_model := get_read_model(info, as_of_block):
+        return read_model.list_votes(filter, dao=dao)
 
     db: Database = info.context["db"]
+    return db["votes"].find(
+        {**get_scope_filter(as_of_block, dao), **filter}, sort=[("votedAt", -1)]
+    )
 
-    bank = db["bank"].find_one(
+
+def member_did_vote(
+    info: "Info",
+    proposal_id: int,
+    member_address: bytes,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
+) -> bool:
+    if read_model := get_read_model(info, as_of_block):
+        votes = read_model.list_votes(
+            {"proposalId": proposal_id, "voterAddress": member_address}, dao=dao
+        )
+        return bool(votes)
+
+    db: Database = info.context["db"]
+    vote = db["votes"].find_one(
         {
-            **current_block_filter,
-            "bankAddress": utils.int_to_bytes(config.bank_address),
-        }
+            **get_scope_filter(as_of_block, dao),
+            "proposalId": proposal_id,
+            "voterAddress": member_address,
+        },
+        projection=["_id"],
     )
+    return vote is not None
+
+
+def list_events(
+    info: "Info",
+    filter: Optional[dict] = None,
+    after: Optional[tuple[datetime, Any]] = None,
+    limit: Optional[int] = None,
+    dao: Optional[bytes] = None,
+):
+    """Lists the events matching filter, the latest first, following the
+    (emittedAt, _id) keyset after if given"""
+    if filter is None:
+        filter = {}
+
+    query = {**get_scope_filter(dao=dao), **filter}
+    if after is not None:
+        emitted_at, id_ = after
+        query["$or"] = [
+            {"emittedAt": {"$lt": emitted_at}},
+            {"emittedAt": emitted_at, "_id": {"$lt": id_}},
+        ]
+
+    db: Database = info.context["db"]
+    return db["events"].find(
+        query, sort=[("emittedAt", -1), ("_id", -1)], limit=limit or 0
+    )
+
+
+def get_proposal(info: "Info", id: int, dao: Optional[bytes] = None) -> Optional[dict]:
+    proposals = list(
+        list_proposals(info=info, skip=0, limit=1, filter={"id": id}, dao=dao)
+    )
+    return proposals[0] if proposals else None
+
+
+def list_tokens(
+    info: "Info",
+    filter: Optional[dict] = None,
+    as_of_block: Optional[int] = None,
+    dao: Optional[bytes] = None,
+):
+    if filter is None:
+        filter = {}
+
+    if read_model := get_read_model(info, as_of_block):
+        return read_model.list_tokens(filter, dao=dao)
+
+    db: Database = info.context["db"]
+    return db["tokens"].find({**get_scope_filter(as_of_block, dao), **filter})
+
+
+# pylint: disable=too-many-arguments
+def list_rollups(
+    info: "Info",
+    collection: str,
+    period: str,
+    filter: Optional[dict] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    dao: Optional[bytes] = None,
+):
+    """Lists the rollups of the periods starting in [start, end[ in chronological
+    order, the periods without any event have no rollup"""
+    if filter is None:
+        filter = {}
+
+    period_start: dict[str, datetime] = {}
+    if start is not None:
+        period_start["$gte"] = start
+    if end is not None:
+        period_start["$lt"] = end
+    if period_start:
+        filter = {**filter, "periodStart": period_start}
+
+    db: Database = info.context["db"]
+    return db[collection].find(
+        {**get_scope_filter(dao=dao), "period": period, **filter},
+        sort=[("periodStart", 1)],
+    )
+
+
+def get_bank_address(info: "Info", dao: Optional[bytes] = None) -> Optional[bytes]:
+    """The address of the bank of dao, the config one if not given"""
+    if dao is None:
+        return utils.int_to_bytes(config.bank_address)
+
+    if read_model := get_read_model(info):
+        bank = read_model.get_bank({}, dao=dao)
+        return bank["bankAddress"] if bank else None
+
+    db: Database = info.context["db"]
+    bank = db["bank"].find_one(get_scope_filter(dao=dao), projection=["bankAddress"])
+    return bank["bankAddress"] if bank else None
+
+
+def get_bank(
+    info: "Info", as_of_block: Optional[int] = None, dao: Optional[bytes] = None
+):
+    # A DAO has a single bank
+    bank_filter = (
+        {"bankAddress": utils.int_to_bytes(config.bank_address)} if dao is None else {}
+    )
+    if read_model := get_read_model(info, as_of_block):
+        return read_model.get_bank(bank_filter, dao=dao)
+
+    current_block_filter = get_scope_filter(as_of_block, dao)
+
+    db: Database = info.context["db"]
+    bank = db["bank"].find_one({**current_block_filter, **bank_filter})
 
     total = db["members"].aggregate(
         [
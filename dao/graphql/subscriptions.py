@@ -0,0 +1,290 @@
+# pylint: disable=redefined-builtin
+"""Live updates pushed to the GraphQL clients over websockets.
+
+The subscriptions are driven by the "events" collection written by the indexer. A
+single EventWatcher per server polls it for new events and fans them out to all
+the subscribers, so the number of clients doesn't change the load on MongoDB.
+Change streams aren't used because they require a replica set.
+
+The proposals, members and banks changed by the new events are read once per poll
+by the watcher, and published along with the events.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, Iterable, Optional
+
+import strawberry
+from pymongo.database import Database
+from strawberry.types import Info
+
+from . import logger, storage
+from .bank import Bank, get_bank
+from .common import HexValue
+from .members import Member
+from .proposals import PROPOSAL_TYPE_TO_CLASS, Proposal
+from .read_model import ReadModel
+from .votes import Vote
+
+# Field holding the id of the proposal changed by each event
+PROPOSAL_EVENTS = {
+    "ProposalAdded": "id",
+    "OnboardProposalAdded": "id",
+    "GuildKickProposalAdded": "id",
+    "WhitelistProposalAdded": "id",
+    "UnWhitelistProposalAdded": "id",
+    "SwapProposalAdded": "id",
+    "ProposalStatusUpdated": "id",
+    "VoteSubmitted": "proposalId",
+}
+
+# Field holding the address of the member changed by each event
+MEMBER_EVENTS = {
+    "MemberAdded": "memberAddress",
+    "MemberUpdated": "memberAddress",
+    "RoleGranted": "account",
+    "RoleRevoked": "account",
+    "VoteSubmitted": "onBehalfAddress",
+    "UserTokenBalanceIncreased": "memberAddress",
+    "UserTokenBalanceDecreased": "memberAddress",
+}
+
+BANK_BALANCE_EVENTS = {"UserTokenBalanceIncreased", "UserTokenBalanceDecreased"}
+
+# Field of the published events holding the entities they changed
+UPDATES_FIELD = "_updates"
+
+
+class SubscriptionOverflow(Exception):
+    pass
+
+
+# pylint: disable=too-many-instance-attributes
+class EventWatcher:
+    """Polls the "events" collection and publishes the new events to every
+    subscriber queue.
+
+    A subscriber that doesn't keep up with the events is disconnected once it has
+    queue_size pending events, rather than slowing down the others.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        poll_interval: float = 1,
+        queue_size: int = 1000,
+        read_model: Optional[ReadModel] = None,
+    ):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.read_model = read_model
+        self._queues: set[asyncio.Queue] = set()
+        self._last_id = None
+        self._watching = False
+        # Address of the bank of each DAO
+        self._bank_addresses: dict[Optional[bytes], Optional[bytes]] = {}
+
+    @property
+    def subscribers_count(self) -> int:
+        return len(self._queues)
+
+    def _latest_id(self):
+        latest = self.db["events"].find_one(sort=[("_id", -1)], projection=["_id"])
+        return latest["_id"] if latest else None
+
+    def _poll(self) -> list[dict]:
+        # ObjectIds are increasing as the events are inserted by a single indexer
+        filter = {} if self._last_id is None else {"_id": {"$gt": self._last_id}}
+        events = list(self.db["events"].find(filter, sort=[("_id", 1)]))
+        if events:
+            self._last_id = events[-1]["_id"]
+        return events
+
+    def _get_bank_address(self, info, dao: Optional[bytes]) -> Optional[bytes]:
+        if self._bank_addresses.get(dao) is None:
+            self._bank_addresses[dao] = storage.get_bank_address(info, dao=dao)
+        return self._bank_addresses[dao]
+
+    def _get_updates(self, events: list[dict]) -> list[dict]:
+        """The events with the entities they changed, each entity is read once"""
+        # The storage functions only read the context of the GraphQL info
+        info = SimpleNamespace(context={"db": self.db, "read_model": self.read_model})
+        entities: dict[tuple, Any] = {}
+
+        def get(key: tuple, read, **kwargs):
+            if key not in entities:
+                entities[key] = read(info, **kwargs)
+            return entities[key]
+
+        published = []
+        for event in events:
+            name, dao = event["name"], event.get("dao")
+            updates = {}
+
+            if name in PROPOSAL_EVENTS:
+                id_ = event[PROPOSAL_EVENTS[name]]
+                updates["proposal"] = get(
+                    ("proposal", dao, id_), get_proposal, id=id_, dao=dao
+                )
+            if name in MEMBER_EVENTS:
+                address = event[MEMBER_EVENTS[name]]
+                updates["member"] = get(
+                    ("member", dao, address), get_member, address=address, dao=dao
+                )
+            if name in BANK_BALANCE_EVENTS and event[
+                "memberAddress"
+            ] == self._get_bank_address(info, dao):
+                updates["bank"] = get(("bank", dao), get_bank, dao=dao)
+
+            published.append({**event, UPDATES_FIELD: updates})
+        return published
+
+    def publish(self, event: dict):
+        for queue in list(self._queues):
+            if queue.qsize() >= self.queue_size:
+                logger.warning("Disconnecting a subscriber that can't keep up")
+                self._queues.discard(queue)
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(event)
+
+    async def poll_once(self):
+        loop = asyncio.get_running_loop()
+
+        if not self._queues:
+            self._watching = False
+            return
+
+        if not self._watching:
+            # Subscribers only receive the events inserted after they subscribed
+            self._last_id = await loop.run_in_executor(None, self._latest_id)
+            self._watching = True
+            return
+
+        events = await loop.run_in_executor(None, self._poll)
+        for event in await loop.run_in_executor(None, self._get_updates, events):
+            self.publish(event)
+
+    async def run(self):
+        logger.info("Watching new events every %ss", self.poll_interval)
+        while True:
+            try:
+                await self.poll_once()
+            # pylint: disable=broad-except
+            except Exception as error:
+                logger.warning("Cannot poll the new events: %s", error)
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def subscribe(
+        self, names: Optional[Iterable[str]] = None, dao: Optional[bytes] = None
+    ) -> AsyncGenerator[dict, None]:
+        """Yields the new events, or only the ones with the given names, of the given
+        dao"""
+        names = None if names is None else set(names)
+
+        # One slot more than queue_size for the overflow marker
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size + 1)
+        self._queues.add(queue)
+
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    raise SubscriptionOverflow(
+                        "Too many pending updates, the subscription was closed"
+                    )
+                if names is not None and event["name"] not in names:
+                    continue
+                if dao is not None and event.get("dao") != dao:
+                    continue
+                yield event
+        finally:
+            self._queues.discard(queue)
+
+
+def get_proposal(info, id: int, dao: Optional[bytes]) -> Optional[Proposal]:
+    proposal = storage.get_proposal(info=info, id=id, dao=dao)
+    if proposal is not None:
+        return PROPOSAL_TYPE_TO_CLASS[proposal["type"]].from_mongo(proposal)
+    return None
+
+
+def get_member(info, address: bytes, dao: Optional[bytes]) -> Optional[Member]:
+    member = storage.get_member(info=info, member_address=address, dao=dao)
+    return Member.from_mongo(member) if member else None
+
+
+def get_update(event: dict, entity: str):
+    """The entity changed by the event, as read by the watcher"""
+    return event.get(UPDATES_FIELD, {}).get(entity)
+
+
+@asynccontextmanager
+async def watch(info: Info, names: Iterable[str], dao: Optional[bytes] = None):
+    """Subscribes to the events with the given names, of dao if given, the
+    subscription is closed as soon as the GraphQL subscription is, rather than when
+    garbage collected"""
+    events = info.context["event_watcher"].subscribe(names, dao=dao)
+    try:
+        yield events
+    finally:
+        await events.aclose()
+
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def proposalUpdated(
+        self,
+        info: Info,
+        proposalId: Optional[int] = None,
+        dao: Optional[HexValue] = None,
+    ) -> AsyncGenerator[Proposal, None]:
+        async with watch(info, PROPOSAL_EVENTS, dao) as events:
+            async for event in events:
+                id_ = event[PROPOSAL_EVENTS[event["name"]]]
+                if proposalId is not None and id_ != proposalId:
+                    continue
+
+                if (proposal := get_update(event, "proposal")) is not None:
+                    yield proposal
+
+    @strawberry.subscription
+    async def voteSubmitted(
+        self,
+        info: Info,
+        proposalId: Optional[int] = None,
+        dao: Optional[HexValue] = None,
+    ) -> AsyncGenerator[Vote, None]:
+        async with watch(info, ["VoteSubmitted"], dao) as events:
+            async for event in events:
+                if proposalId is None or event["proposalId"] == proposalId:
+                    yield Vote.from_event(event)
+
+    @strawberry.subscription
+    async def memberUpdated(
+        self,
+        info: Info,
+        memberAddress: Optional[HexValue] = None,
+        dao: Optional[HexValue] = None,
+    ) -> AsyncGenerator[Member, None]:
+        async with watch(info, MEMBER_EVENTS, dao) as events:
+            async for event in events:
+                address = event[MEMBER_EVENTS[event["name"]]]
+                if memberAddress is not None and address != memberAddress:
+                    continue
+
+                if (member := get_update(event, "member")) is not None:
+                    yield member
+
+    @strawberry.subscription
+    async def bankBalanceChanged(
+        self, info: Info, dao: Optional[HexValue] = None
+    ) -> AsyncGenerator[Bank, None]:
+        async with watch(info, BANK_BALANCE_EVENTS, dao) as events:
+            async for event in events:
+                # Only the balance changes of the bank
+                if (bank := get_update(event, "bank")) is not None:
+                    yield bank
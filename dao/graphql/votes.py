@@ -0,0 +1,27 @@
+from datetime import datetime
+
+import strawberry
+
+from .common import FromMongoMixin, HexValue
+
+
+@strawberry.type
+class Vote(FromMongoMixin):
+    proposalId: int
+    # The member the vote counts for
+    voterAddress: HexValue
+    # The account that submitted the vote, either the voter or its delegate
+    callerAddress: HexValue
+    vote: bool
+    votedAt: datetime
+
+    @classmethod
+    def from_event(cls, event: dict):
+        """Creates a Vote from a VoteSubmitted document of the "events" collection"""
+        return cls(
+            proposalId=event["proposalId"],
+            voterAddress=event["onBehalfAddress"],
+            callerAddress=event["callerAddress"],
+            vote=event["vote"],
+            votedAt=event["emittedAt"],
+        )
@@ -0,0 +1,104 @@
+"""Freshness of the indexed data.
+
+The indexer writes its progress to the "_health" collection after each block, and
+the chain head known by the gateway every time it is polled. The GraphQL servers
+read it from the same database, their /health endpoint answers 503 when the data
+they serve is stale so the load balancer routes the queries to the fresh replicas.
+
+The data is fresh while the indexer is at most health_max_lag_blocks behind the
+chain head, and has updated the health document in the last health_max_age
+seconds. When the chain doesn't produce blocks the indexer doesn't commit, the
+chain head polls keep the document up to date.
+"""
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from pymongo.database import Database
+
+from dao import config, utils
+
+HEALTH_COLLECTION = "_health"
+
+
+class EventsRate:
+    """Moving average of the events handled per second over the last window
+    seconds"""
+
+    def __init__(self, window: float = 60):
+        self.window = window
+        self._blocks: deque[tuple[float, int]] = deque()
+
+    def record(self, events: int, at: Optional[float] = None):
+        at = time.monotonic() if at is None else at
+        self._blocks.append((at, events))
+        while self._blocks[0][0] < at - self.window:
+            self._blocks.popleft()
+
+    def get(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        if not self._blocks or now <= self._blocks[0][0]:
+            return 0.0
+        # The events of the oldest block were handled before the window
+        events = sum(count for _, count in list(self._blocks)[1:])
+        return events / (now - self._blocks[0][0])
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # pymongo returns naive datetimes unless the client is tz_aware
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _seconds(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return (_as_utc(end) - _as_utc(start)).total_seconds()
+
+
+def get_health(doc: Optional[dict], now: Optional[datetime] = None) -> dict[str, Any]:
+    """The freshness of the data from the health document written by the
+    indexer"""
+    doc = doc or {}
+    now = utils.utcnow() if now is None else now
+
+    indexed_block = doc.get("indexedBlock")
+    chain_head_block = doc.get("chainHeadBlock")
+    lag_blocks = None
+    if indexed_block is not None and chain_head_block is not None:
+        lag_blocks = max(chain_head_block - indexed_block, 0)
+    lag_seconds = _seconds(
+        doc.get("indexedBlockTimestamp"), doc.get("chainHeadTimestamp")
+    )
+    updated_seconds = _seconds(doc.get("updatedAt"), now)
+
+    return {
+        "indexedBlock": indexed_block,
+        "indexedBlockTimestamp": _as_utc(doc.get("indexedBlockTimestamp")),
+        "chainHeadBlock": chain_head_block,
+        "chainHeadTimestamp": _as_utc(doc.get("chainHeadTimestamp")),
+        "lagBlocks": lag_blocks,
+        "lagSeconds": None if lag_seconds is None else max(lag_seconds, 0),
+        "eventsPerSecond": doc.get("eventsPerSecond", 0.0),
+        "lastCommitAt": _as_utc(doc.get("committedAt")),
+        "secondsSinceCommit": _seconds(doc.get("committedAt"), now),
+        "healthy": (
+            lag_blocks is not None
+            and lag_blocks <= config.health_max_lag_blocks
+            and updated_seconds is not None
+            and updated_seconds <= config.health_max_age
+        ),
+    }
+
+
+def read_health(db: Database, now: Optional[datetime] = None) -> dict[str, Any]:
+    return get_health(db[HEALTH_COLLECTION].find_one({}), now)
+
+
+def to_json(health: dict[str, Any]) -> dict[str, Any]:
+    return {
+        name: value.isoformat() if isinstance(value, datetime) else value
+        for name, value in health.items()
+    }
@@ -0,0 +1,288 @@
+"""Backfill mode of the indexer, while it is far behind the chain head.
+
+During a full reindex every write pays for the server-side validation, for the
+maintenance of the indexes only used by the GraphQL queries, and for the write
+concern. In backfill mode:
+
+- the server-side validation is turned off, the documents are validated
+  in-process against the same $jsonSchema instead, once per document shape: the
+  documents with the same fields and types as an already validated one are
+  trusted
+- the writes are acknowledged by the primary only, w=1, and the bulk writes of the
+  in-memory state are unordered
+- the indexes of the GraphQL queries are dropped, the indexer's own queries keep
+  theirs
+
+The indexer enters backfill mode when it is more than threshold blocks behind the
+chain head, and switches back to safe mode once it is less than threshold / 2
+blocks behind: the validation is turned back on and the indexes of the queries are
+built, before the next block is handled. The lag is evaluated at every block, with
+or without events. A restart in safe mode restores them as
+well, init_db sets the validators and builds all the indexes.
+"""
+import os
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from apibara import Info
+from apibara.model import NewBlock
+from pymongo import WriteConcern
+from pymongo.database import Database
+
+from dao import metrics
+from dao.graphql import storage
+from dao.indexer import logger
+from dao.indexer.handler import BlockHandler
+
+INT32_RANGE = range(-(2**31), 2**31)
+
+
+class DocumentValidationError(Exception):
+    pass
+
+
+# pylint: disable=too-many-return-statements
+def get_bson_type(value: Any) -> str:
+    """The $jsonSchema bsonType of value once encoded by pymongo"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if value in INT32_RANGE else "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, bytes):
+        return "binData"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return type(value).__name__
+
+
+def get_shape(value: Any) -> Any:
+    """The fields and types of value, recursively"""
+    if isinstance(value, dict):
+        return tuple(sorted((name, get_shape(item)) for name, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ("array", tuple(get_shape(item) for item in value))
+    return get_bson_type(value)
+
+
+# pylint: disable=too-many-branches
+def check_document(schema: dict, value: Any, path: str = "document"):
+    """Raises DocumentValidationError if value doesn't match the $jsonSchema, only
+    the keywords used by the validators of dao/indexer/validators are supported"""
+    bson_type = schema.get("bsonType")
+    if bson_type is not None:
+        allowed = [bson_type] if isinstance(bson_type, str) else bson_type
+        if get_bson_type(value) not in allowed:
+            raise DocumentValidationError(
+                f"{path}: type did not match, {get_bson_type(value)} isn't {allowed}"
+            )
+
+    if "minimum" in schema and value < schema["minimum"]:
+        raise DocumentValidationError(f"{path}: {value} is below the minimum")
+    if "maximum" in schema and value > schema["maximum"]:
+        raise DocumentValidationError(f"{path}: {value} is above the maximum")
+    if "enum" in schema and value not in schema["enum"]:
+        raise DocumentValidationError(f"{path}: {value!r} isn't one of the values")
+
+    if isinstance(value, dict):
+        for name in schema.get("required", []):
+            if name not in value:
+                raise DocumentValidationError(f"{path}: {name} is required")
+        for name, property_schema in schema.get("properties", {}).items():
+            if name in value:
+                check_document(property_schema, value[name], f"{path}.{name}")
+
+    if isinstance(value, (list, tuple)):
+        if schema.get("uniqueItems") and len(
+            {get_value_key(item) for item in value}
+        ) < len(value):
+            raise DocumentValidationError(f"{path}: the items aren't unique")
+
+        items = schema.get("items")
+        if isinstance(items, dict):
+            for index, item in enumerate(value):
+                check_document(items, item, f"{path}.{index}")
+        elif isinstance(items, list):
+            for index, (item_schema, item) in enumerate(zip(items, value)):
+                check_document(item_schema, item, f"{path}.{index}")
+
+
+def get_value_key(value: Any) -> Any:
+    # Hashable and equal for equal values
+    if isinstance(value, dict):
+        return tuple(
+            sorted((name, get_value_key(item)) for name, item in value.items())
+        )
+    if isinstance(value, (list, tuple)):
+        return tuple(get_value_key(item) for item in value)
+    return (get_bson_type(value), value)
+
+
+class ShapeValidator:
+    """Validates the documents in-process, once per collection and shape"""
+
+    def __init__(self, collections: Optional[Iterable[str]] = None):
+        self.schemas = {
+            collection: storage.load_validator(collection)["$jsonSchema"]
+            for collection in (
+                storage.VALIDATED_COLLECTIONS if collections is None else collections
+            )
+        }
+        self._shapes: set[tuple[str, Any]] = set()
+
+    def check(self, collection: str, doc: dict):
+        schema = self.schemas.get(collection)
+        if schema is None:
+            return
+
+        shape = (collection, get_shape(doc))
+        if shape in self._shapes:
+            return
+
+        check_document(schema, doc, collection)
+        self._shapes.add(shape)
+
+
+class ValidatingStorage:
+    """Proxy for apibara's Storage validating the inserted documents, and the
+    fields set by the updates"""
+
+    def __init__(self, storage_, validator: ShapeValidator):
+        self._storage = storage_
+        self._validator = validator
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+    def _check(self, collection: str, doc: dict):
+        # apibara adds _chain
+        self._validator.check(
+            collection, {name: value for name, value in doc.items() if name != "_chain"}
+        )
+
+    async def insert_one(self, collection: str, doc: dict):
+        self._check(collection, doc)
+        return await self._storage.insert_one(collection, doc)
+
+    async def insert_many(self, collection: str, docs: Iterable[dict]):
+        docs = list(docs)
+        for doc in docs:
+            self._check(collection, doc)
+        return await self._storage.insert_many(collection, docs)
+
+    async def find_one_and_replace(
+        self, collection: str, filter: dict, replacement: dict, upsert: bool = False
+    ):
+        # pylint: disable=redefined-builtin
+        self._check(collection, replacement)
+        return await self._storage.find_one_and_replace(
+            collection, filter, replacement, upsert=upsert
+        )
+
+    async def find_one_and_update(self, collection: str, filter: dict, update: dict):
+        # pylint: disable=redefined-builtin
+        schema = self._validator.schemas.get(collection)
+        if schema is not None:
+            # The top-level fields set by the update
+            properties = schema.get("properties", {})
+            for name, value in update.get("$set", {}).items():
+                if name in properties:
+                    check_document(properties[name], value, f"{collection}.{name}")
+        return await self._storage.find_one_and_update(collection, filter, update)
+
+
+class Backfill:
+    """Switches the indexer between the backfill and safe modes depending on its
+    lag behind the chain head"""
+
+    def __init__(self, threshold: int, engine=None):
+        self.threshold = threshold
+        self.engine = engine
+        self.validator = ShapeValidator()
+        self.active = False
+        # The indexer starts without the indexes of the queries, they are built
+        # right away if it isn't far behind
+        self.query_indexes = False
+        # apibara's IndexerStorage, whose database is used for the writes
+        self.indexer_storage = None
+        self._safe_db: Optional[Database] = None
+
+    def attach(self, indexer_storage):
+        self.indexer_storage = indexer_storage
+        self._safe_db = indexer_storage.db
+
+    def get_lag(self, block_number: int) -> Optional[int]:
+        head = metrics.CHAIN_HEAD_BLOCK.get()
+        if not head:
+            return None
+        return int(head) - block_number
+
+    def update(self, db: Database, block_number: int):
+        """Enters or leaves backfill mode depending on the lag of block_number"""
+        lag = self.get_lag(block_number)
+        if lag is None:
+            return
+
+        if not self.active and lag > self.threshold:
+            self.enter(db, lag)
+        elif self.active and lag <= self.threshold // 2:
+            self.leave(db, lag)
+        elif not self.active and not self.query_indexes:
+            storage.create_indexes(db)
+            self.query_indexes = True
+
+    def _set_mode(self, active: bool):
+        # mongomock doesn't support the write concerns
+        write_concern = None
+        if active and os.getenv("USING_MONGOMOCK", "").lower() != "true":
+            write_concern = WriteConcern(w=1)
+
+        if self.indexer_storage is not None and self._safe_db is not None:
+            self.indexer_storage.db = (
+                self._safe_db
+                if write_concern is None
+                else self._safe_db.with_options(write_concern=write_concern)
+            )
+        if self.engine is not None:
+            self.engine.write_concern = write_concern
+            self.engine.ordered = not active
+            self.engine.validate = self.validator.check if active else None
+        self.active = active
+        metrics.BACKFILL_MODE.set(int(active))
+
+    def enter(self, db: Database, lag: int):
+        logger.info("Entering backfill mode, %s blocks behind the chain head", lag)
+        storage.set_validation(db, enabled=False)
+        storage.drop_query_indexes(db)
+        self.query_indexes = False
+        self._set_mode(True)
+
+    def leave(self, db: Database, lag: int):
+        logger.info("Leaving backfill mode, %s blocks behind the chain head", lag)
+        self._set_mode(False)
+        storage.set_validation(db, enabled=True)
+        storage.create_indexes(db)
+        self.query_indexes = True
+
+
+def backfill_block_handler(backfill: Backfill) -> BlockHandler:
+    """Switches the mode at the start of every block, apibara only calls the new
+    events handler for the blocks with events. The block and new events handlers
+    share info, its storage validates the writes of both in backfill mode."""
+
+    async def handler(info: Info, new_block: NewBlock):
+        backfill.update(info.context["db"], new_block.new_head.number)
+
+        if backfill.active:
+            info.storage = ValidatingStorage(info.storage, backfill.validator)
+
+    return handler
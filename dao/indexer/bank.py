@@ -9,11 +9,20 @@ from dao.indexer.base_event import BaseEvent
 from dao.utils import get_block_datetime_utc
 
 
+def balance_entity_keys(member_address: bytes, token_address: bytes) -> set[tuple]:
+    # The token name is read from the tokens registry, the bank of the DAO is added
+    # by daos.scope_entity_keys
+    return {("token", token_address), ("member", member_address)}
+
+
 @dataclass
 class TokenWhitelisted(BaseEvent):
     tokenName: str
     tokenAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("bank",), ("token", self.tokenAddress)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -21,9 +30,15 @@ class TokenWhitelisted(BaseEvent):
             **asdict(self),
             "whitelistedAt": get_block_datetime_utc(block),
         }
+        # The bank keeps the history, the tokens registry the current state
         await storage.update_bank(
             update={"$push": {"whitelistedTokens": token_dict}}, info=info
         )
+        await storage.upsert_token(
+            token_address=self.tokenAddress,
+            token={**token_dict, "unWhitelistedAt": None, "active": True},
+            info=info,
+        )
 
 
 @dataclass
@@ -31,6 +46,9 @@ class TokenUnWhitelisted(BaseEvent):
     tokenName: str
     tokenAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("bank",), ("token", self.tokenAddress)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -38,9 +56,15 @@ class TokenUnWhitelisted(BaseEvent):
             **asdict(self),
             "unWhitelistedAt": get_block_datetime_utc(block),
         }
+        # The bank keeps the history, the tokens registry the current state
         await storage.update_bank(
             update={"$push": {"unWhitelistedTokens": token_dict}}, info=info
         )
+        await storage.upsert_token(
+            token_address=self.tokenAddress,
+            token={**token_dict, "active": False},
+            info=info,
+        )
 
 
 @dataclass
@@ -49,6 +73,9 @@ class UserTokenBalanceIncreased(BaseEvent):
     tokenAddress: bytes
     amount: int
 
+    def entity_keys(self) -> set[tuple]:
+        return balance_entity_keys(self.memberAddress, self.tokenAddress)
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -67,6 +94,9 @@ class UserTokenBalanceDecreased(BaseEvent):
     tokenAddress: bytes
     amount: int
 
+    def entity_keys(self) -> set[tuple]:
+        return balance_entity_keys(self.memberAddress, self.tokenAddress)
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -1,26 +1,47 @@
 from dataclasses import asdict, dataclass
+from typing import Optional
 
 from apibara import Info
 from apibara.model import BlockHeader, StarkNetEvent
 
 from dao import utils
-from dao.indexer import logger
+from dao.indexer import idempotency, logger
+
+
+def get_addresses(payload: dict) -> list[bytes]:
+    return sorted({value for value in payload.values() if isinstance(value, bytes)})
 
 
 @dataclass
 class BaseEvent:
     async def _write_to_events_collection(
-        self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
+        self,
+        info: Info,
+        block: BlockHeader,
+        starknet_event: StarkNetEvent,
+        key: dict,
     ):
         logger.debug("Inserting to 'events': %s", self)
 
+        payload = asdict(self)
         event_dict = {
             "name": starknet_event.name,
             "emittedAt": utils.get_block_datetime_utc(block),
-            **asdict(self),
+            **payload,
+            # Unique, the event is applied once it is recorded
+            **key,
+            # The accounts and contracts of the event, to list the activity of an
+            # address whatever the field it appears in
+            "addresses": get_addresses(payload),
         }
         await info.storage.insert_one("events", event_dict)
 
+    def entity_keys(self) -> Optional[set[tuple]]:
+        """Keys of the entities read or written when handling the event. Events
+        sharing a key are applied in order, others can be applied concurrently.
+        None means the event can touch any entity."""
+        return None
+
     # pylint: disable=unused-argument
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
@@ -30,7 +51,15 @@ class BaseEvent:
     async def handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
+        """Applies the event once, see dao/indexer/idempotency.py"""
+        key = idempotency.get_event_key(block, starknet_event)
+        if await idempotency.is_applied(info, key):
+            logger.info(
+                "Skipping event %s %s, already applied", starknet_event.name, key
+            )
+            return
+
+        await self._handle(idempotency.get_event_info(info, key), block, starknet_event)
         await self._write_to_events_collection(
-            info=info, block=block, starknet_event=starknet_event
+            info=info, block=block, starknet_event=starknet_event, key=key
         )
-        await self._handle(info, block, starknet_event)
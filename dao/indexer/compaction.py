@@ -0,0 +1,143 @@
+"""Compaction of the superseded versions of the documents.
+
+Apibara's storage never updates a document in place: every update closes the
+current version by setting its _chain.valid_to and inserts a new one. The closed
+versions are only needed to rollback a chain reorganization, once their valid_to
+is older than the finality depth they can be deleted, or moved to an archive
+collection.
+"""
+from dataclasses import dataclass
+from functools import wraps
+from typing import Optional
+
+from apibara import Info
+from apibara.model import NewEvents
+from pymongo import ReplaceOne
+from pymongo.database import Database
+
+from dao.indexer import logger
+
+COMPACTED_COLLECTIONS = [
+    "members",
+    "bank",
+    "proposals",
+    "proposal_params",
+    "tokens",
+    "treasury_rollups",
+    "membership_rollups",
+]
+
+# apibara ignores the collections starting with "_" when invalidating blocks
+ARCHIVE_PREFIX = "_archive_"
+
+
+def get_indexed_block(db: Database, indexer_id: str) -> Optional[int]:
+    state = db["_apibara"].find_one({"indexer_id": indexer_id})
+    if state is None:
+        return None
+    return state.get("indexed_to")
+
+
+def compact_collection(
+    db: Database,
+    collection: str,
+    finalized_block: int,
+    batch_size: int = 1000,
+    archive: bool = False,
+) -> int:
+    """Deletes, or archives, at most batch_size versions of collection superseded
+    before finalized_block, returns the number of compacted versions"""
+    superseded = {"_chain.valid_to": {"$ne": None, "$lt": finalized_block}}
+
+    versions = list(db[collection].find(superseded, limit=batch_size))
+    if not versions:
+        return 0
+
+    if archive:
+        # Upserts so a batch archived but not deleted, because of a crash, can be
+        # archived again
+        db[ARCHIVE_PREFIX + collection].bulk_write(
+            [
+                ReplaceOne({"_id": version["_id"]}, version, upsert=True)
+                for version in versions
+            ],
+            ordered=False,
+        )
+
+    db[collection].delete_many(
+        {"_id": {"$in": [version["_id"] for version in versions]}}
+    )
+
+    return len(versions)
+
+
+def compact(
+    db: Database,
+    finalized_block: int,
+    batch_size: int = 1000,
+    archive: bool = False,
+    max_batches: Optional[int] = None,
+) -> dict[str, int]:
+    """Compacts the versions superseded before finalized_block batch by batch,
+    until there is nothing left or max_batches batches were compacted in each
+    collection. Returns the number of compacted versions by collection"""
+    counts = {}
+
+    for collection in COMPACTED_COLLECTIONS:
+        counts[collection] = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            count = compact_collection(
+                db, collection, finalized_block, batch_size=batch_size, archive=archive
+            )
+            counts[collection] += count
+            batches += 1
+
+            if count < batch_size:
+                break
+
+    logger.info(
+        "Compacted the versions superseded before block=%s, archive=%s: %s",
+        finalized_block,
+        archive,
+        counts,
+    )
+
+    return counts
+
+
+@dataclass
+class Compactor:
+    """Compacts a single batch per collection every interval blocks, to keep the
+    time spent compacting in the indexer bounded"""
+
+    finality_depth: int
+    interval: int
+    batch_size: int = 1000
+    archive: bool = False
+    last_block_number: int = 0
+
+    def maybe_compact(self, db: Database, block_number: int):
+        if block_number - self.last_block_number < self.interval:
+            return
+
+        finalized_block = block_number - self.finality_depth
+        if finalized_block > 0:
+            compact(
+                db,
+                finalized_block,
+                batch_size=self.batch_size,
+                archive=self.archive,
+                max_batches=1,
+            )
+        self.last_block_number = block_number
+
+
+def compaction_handler(new_events_handler, compactor: Compactor):
+    @wraps(new_events_handler)
+    async def wrapper(info: Info, block_events: NewEvents):
+        await new_events_handler(info, block_events)
+        compactor.maybe_compact(info.context["db"], block_events.block.number)
+
+    return wrapper
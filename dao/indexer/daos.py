@@ -0,0 +1,134 @@
+# pylint: disable=redefined-builtin
+"""Indexing of several DAOs in a single indexer process.
+
+The DAOs share the indexer's database, gateway client and caches. Each event is
+handled with the DAO of the contract that emitted it: the documents written are
+tagged with the DAO's contract address in their "dao" field, and every read and
+update is restricted to the DAO's documents.
+"""
+from typing import Iterable, Optional
+
+from apibara import Info
+from apibara.indexer.storage import Storage
+from apibara.model import StarkNetEvent
+
+from dao import config, utils
+from dao.models import Dao
+
+
+class DaoStorage:
+    """Restricts the apibara storage to the documents of a DAO"""
+
+    def __init__(self, storage: Storage, dao_address: bytes):
+        self._storage = storage
+        self.dao_address = dao_address
+
+    def _filter(self, filter: dict) -> dict:
+        return {**filter, "dao": self.dao_address}
+
+    def _tag(self, doc: dict) -> dict:
+        return {**doc, "dao": self.dao_address}
+
+    async def insert_one(self, collection: str, doc: dict):
+        await self._storage.insert_one(collection, self._tag(doc))
+
+    async def insert_many(self, collection: str, docs: Iterable[dict]):
+        await self._storage.insert_many(collection, [self._tag(doc) for doc in docs])
+
+    async def delete_one(self, collection: str, filter: dict):
+        await self._storage.delete_one(collection, self._filter(filter))
+
+    async def delete_many(self, collection: str, filter: dict):
+        await self._storage.delete_many(collection, self._filter(filter))
+
+    async def find_one(self, collection: str, filter: dict) -> Optional[dict]:
+        return await self._storage.find_one(collection, self._filter(filter))
+
+    # pylint: disable=too-many-arguments
+    async def find(
+        self,
+        collection: str,
+        filter: dict,
+        sort: Optional[dict[str, int]] = None,
+        projection: Optional[dict] = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> Iterable[dict]:
+        return await self._storage.find(
+            collection,
+            self._filter(filter),
+            sort=sort,
+            projection=projection,
+            skip=skip,
+            limit=limit,
+        )
+
+    async def find_one_and_replace(
+        self, collection: str, filter: dict, replacement: dict, upsert: bool = False
+    ):
+        return await self._storage.find_one_and_replace(
+            collection, self._filter(filter), self._tag(replacement), upsert=upsert
+        )
+
+    async def find_one_and_update(self, collection: str, filter: dict, update: dict):
+        return await self._storage.find_one_and_update(
+            collection, self._filter(filter), update
+        )
+
+
+def get_default_dao() -> Dao:
+    """The DAO of the config, used when the indexer isn't given any DAO"""
+    return Dao(
+        address=b"",
+        bank_address=utils.int_to_bytes(config.bank_address),
+    )
+
+
+def get_dao(info: Info) -> Dao:
+    """The DAO of the event being handled"""
+    return info.context.get("dao") or get_default_dao()
+
+
+def get_event_dao(info: Info, starknet_event: StarkNetEvent) -> Optional[Dao]:
+    """The DAO of the contract that emitted starknet_event, None if the indexer
+    isn't given any DAO"""
+    daos: Optional[dict[bytes, Dao]] = info.context.get("daos")
+    if not daos:
+        return None
+
+    # The event addresses are 32 bytes long, the DAOs are keyed by int_to_bytes
+    address = utils.int_to_bytes(int.from_bytes(starknet_event.address, "big"))
+    if (dao := daos.get(address)) is None:
+        raise ValueError(
+            f"Event {starknet_event.name} of unknown DAO 0x{address.hex()}"
+        )
+    return dao
+
+
+def get_event_info(info: Info, starknet_event: StarkNetEvent) -> Info:
+    """The info to handle starknet_event with, scoped to the DAO that emitted it"""
+    if (dao := get_event_dao(info, starknet_event)) is None:
+        return info
+
+    return Info(
+        context={**info.context, "dao": dao},
+        storage=DaoStorage(info.storage, dao.address),
+    )
+
+
+def scope_entity_keys(
+    dao: Optional[Dao], keys: Optional[set[tuple]]
+) -> Optional[set[tuple]]:
+    """Adds the bank to the keys of the events touching the DAO's bank balances,
+    and prefixes the keys with the DAO so the events of different DAOs never
+    conflict"""
+    if keys is None:
+        return None
+
+    if dao is None:
+        dao = get_default_dao()
+
+    if ("member", dao.bank_address) in keys:
+        keys = keys | {("bank",)}
+
+    return {(dao.address, *key) for key in keys}
@@ -56,15 +56,13 @@ deserializers: dict[Type, Serializer] = {
 }
 
 
-# pylint: disable=too-many-locals
-async def deserialize_starknet_event(
-    fields: dict[str, Type],
-    info: Info,
-    block: BlockHeader,
-    starknet_event: StarkNetEvent,
-) -> dict:
+async def decode_starknet_event(info: Info, starknet_event: StarkNetEvent) -> Any:
+    """Transforms the raw event data to python values using the contract's ABI"""
     contract = await get_contract(
-        starknet_event.address.hex(), info.context["starknet_client"]
+        starknet_event.address.hex(),
+        info.context["starknet_client"],
+        abi=info.context.get("contract_abi"),
+        cache_dir=info.context.get("abi_cache_dir"),
     )
 
     contract_events = get_contract_events(contract)
@@ -77,11 +75,21 @@ async def deserialize_starknet_event(
 
     # Transforms cairo data to python (needs types of the values and values)
     event_data = [int.from_bytes(b, "big") for b in starknet_event.data]
-    python_data = cairo_serializer.to_python(
+    return cairo_serializer.to_python(
         value_types=emitted_event_abi["data"],
         values=event_data,
     )
 
+
+async def deserialize_python_data(
+    fields: dict[str, Type],
+    python_data: Any,
+    info: Info,
+    block: BlockHeader,
+    starknet_event: StarkNetEvent,
+) -> dict:
+    """Deserializes the decoded event values to the types of the fields, this can
+    require external data like the timestamp of a BlockNumber"""
     # TODO: validate the matching between the fields and their types
     # in python_data and __annotations__
     kwargs = {}
@@ -111,3 +119,20 @@ async def deserialize_starknet_event(
             raise ValueError(f"No deserializer found for type {field_type}")
 
     return kwargs
+
+
+async def deserialize_starknet_event(
+    fields: dict[str, Type],
+    info: Info,
+    block: BlockHeader,
+    starknet_event: StarkNetEvent,
+) -> dict:
+    python_data = await decode_starknet_event(info=info, starknet_event=starknet_event)
+
+    return await deserialize_python_data(
+        fields=fields,
+        python_data=python_data,
+        info=info,
+        block=block,
+        starknet_event=starknet_event,
+    )
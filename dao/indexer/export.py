@@ -0,0 +1,185 @@
+"""Bulk export of the indexed data for offline analytics.
+
+Every dataset is streamed from MongoDB in block order and written to gzipped
+NDJSON files partitioned by block range, so the memory used doesn't depend on the
+size of the export. Each row is a document, or a version of a document, with the
+block it was written at as blockNumber.
+
+The last exported block is kept in a watermark file of the output directory, the
+next export resumes from the following block.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from pymongo.database import Database
+
+from dao.indexer import logger
+
+WATERMARK_FILE = "_watermark.json"
+
+BALANCE_EVENTS = {"UserTokenBalanceIncreased": 1, "UserTokenBalanceDecreased": -1}
+
+
+def _to_row(document: dict) -> dict:
+    chain = document.pop("_chain")
+    # The marks of the writes of the events, see dao/indexer/idempotency.py
+    document.pop("_applied", None)
+    return {"blockNumber": chain["valid_from"], **document}
+
+
+def _to_transaction(event: dict) -> dict:
+    return {
+        "blockNumber": event["_chain"]["valid_from"],
+        "timestamp": event["emittedAt"],
+        "memberAddress": event["memberAddress"],
+        "tokenAddress": event["tokenAddress"],
+        "amount": BALANCE_EVENTS[event["name"]] * event["amount"],
+    }
+
+
+# Collection, filter and row of each dataset. The members and proposals datasets
+# hold every version of the documents, a version superseding the previous one.
+DATASETS: dict[str, tuple[str, dict, Callable[[dict], dict]]] = {
+    "events": ("events", {}, _to_row),
+    "members": ("members", {}, _to_row),
+    "proposals": ("proposals", {}, _to_row),
+    "transactions": (
+        "events",
+        {"name": {"$in": list(BALANCE_EVENTS)}},
+        _to_transaction,
+    ),
+}
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return "0x" + value.hex()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {value!r} of type {type(value)}")
+
+
+def iter_rows(
+    db: Database, dataset: str, from_block: int, to_block: int, batch_size: int = 5000
+) -> Iterator[dict]:
+    """Yields the rows of dataset written between from_block and to_block included,
+    in block order"""
+    collection, filter_, to_row = DATASETS[dataset]
+
+    cursor = db[collection].find(
+        {**filter_, "_chain.valid_from": {"$gte": from_block, "$lte": to_block}},
+        projection={"_id": False},
+        sort=[("_chain.valid_from", 1)],
+        batch_size=batch_size,
+    )
+    for document in cursor:
+        yield to_row(document)
+
+
+def get_partition_path(
+    directory: Union[str, Path], first_block: int, last_block: int
+) -> Path:
+    return Path(directory) / f"blocks-{first_block:012d}-{last_block:012d}.ndjson.gz"
+
+
+def write_partitions(
+    rows: Iterable[dict],
+    directory: Union[str, Path],
+    from_block: int,
+    to_block: int,
+    partition_size: int,
+) -> int:
+    """Writes the rows, sorted by block, to one file per partition of partition_size
+    blocks. A partition only partially in [from_block, to_block] is named after the
+    exported blocks, so an incremental export never overwrites a previous file.
+    Returns the number of rows written"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    partition = None
+    f = tmp_path = path = None
+
+    def _close():
+        if f is not None:
+            f.close()
+            # Renamed once complete so a crash never leaves a truncated partition
+            os.replace(tmp_path, path)
+
+    try:
+        for row in rows:
+            if row["blockNumber"] // partition_size != partition:
+                _close()
+
+                partition = row["blockNumber"] // partition_size
+                path = get_partition_path(
+                    directory,
+                    max(partition * partition_size, from_block),
+                    min((partition + 1) * partition_size - 1, to_block),
+                )
+                tmp_path = path.with_name(path.name + ".tmp")
+                f = gzip.open(tmp_path, "wt", encoding="utf-8")
+
+            f.write(json.dumps(row, default=_json_default))
+            f.write("\n")
+            count += 1
+    except BaseException:
+        if f is not None:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+        raise
+
+    _close()
+
+    return count
+
+
+# pylint: disable=too-many-arguments
+def export(
+    db: Database,
+    output_dir: Union[str, Path],
+    from_block: int,
+    to_block: int,
+    datasets: Optional[Iterable[str]] = None,
+    partition_size: int = 10000,
+    batch_size: int = 5000,
+) -> dict[str, int]:
+    """Exports the datasets to output_dir/<dataset>/, returns the number of rows
+    exported by dataset"""
+    if datasets is None:
+        datasets = DATASETS
+
+    counts = {}
+    for dataset in datasets:
+        rows = iter_rows(db, dataset, from_block, to_block, batch_size=batch_size)
+        counts[dataset] = write_partitions(
+            rows,
+            Path(output_dir) / dataset,
+            from_block=from_block,
+            to_block=to_block,
+            partition_size=partition_size,
+        )
+
+    logger.info(
+        "Exported blocks %s to %s to %s: %s", from_block, to_block, output_dir, counts
+    )
+
+    return counts
+
+
+def read_watermark(output_dir: Union[str, Path]) -> Optional[int]:
+    path = Path(output_dir) / WATERMARK_FILE
+    if not path.exists():
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["blockNumber"]
+
+
+def write_watermark(output_dir: Union[str, Path], block_number: int):
+    with open(Path(output_dir) / WATERMARK_FILE, "w", encoding="utf-8") as f:
+        json.dump({"blockNumber": block_number}, f)
@@ -0,0 +1,246 @@
+"""Resilient access to the Starknet gateway.
+
+PooledGatewayClient is a starknet_py GatewayClient whose requests to the feeder
+gateway:
+
+- reuse the connections of a single keep-alive HTTP session
+- wait for one of max_concurrency slots, bounding the requests in flight
+- are retried with an exponential backoff on transport errors, timeouts and
+  429/5xx responses, the Starknet errors (unknown contract, ...) aren't retried
+- are rejected right away while the circuit breaker is open, after
+  failure_threshold consecutive failures, until reset_timeout has passed
+
+All the gateway lookups of the indexer, including the ones made by starknet_py
+itself like Contract.from_address, go through it. A slow or failing gateway delays
+the events needing it without piling up requests.
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import aiohttp
+from starknet_py.net.client_errors import ClientError
+from starknet_py.net.gateway_client import GatewayClient
+from starknet_py.net.http_client import GatewayHttpClient
+
+from dao import config, metrics
+from dao.indexer import logger
+
+RETRYABLE_STATUSES = {"429", "500", "502", "503", "504"}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, ClientError):
+        # The gateway answers the Starknet errors with a 500 too
+        return (
+            error.code in RETRYABLE_STATUSES
+            and "StarknetErrorCode" not in error.message
+        )
+    return False
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures. Once reset_timeout has
+    passed, a single trial request is let through: the circuit closes if it
+    succeeds and opens again otherwise."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial):
+            raise CircuitOpenError(
+                f"The gateway circuit is open after {self.failures} failures"
+            )
+        if state == "half-open":
+            self._trial = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        metrics.GATEWAY_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    "Opening the gateway circuit after %s failures", self.failures
+                )
+            self.opened_at = self.clock()
+            metrics.GATEWAY_CIRCUIT_OPEN.set(1)
+        self._trial = False
+
+
+class SessionHttpClient(GatewayHttpClient):
+    """Sends the requests with the shared session, starknet_py wraps it in
+    contextlib.nullcontext which isn't an async context manager before Python 3.10
+    """
+
+    @asynccontextmanager
+    async def _shared_session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        yield self.session
+
+    def http_session(self):
+        return self._shared_session()
+
+
+class ResilientHttpClient(SessionHttpClient):
+    """Sends the feeder gateway requests through PooledGatewayClient.request"""
+
+    def __init__(
+        self, url, session: aiohttp.ClientSession, client: "PooledGatewayClient"
+    ):
+        super().__init__(url=url, session=session)
+        self.client = client
+
+    async def call(self, method_name: str, params: Optional[dict] = None) -> dict:
+        send = partial(SessionHttpClient.call, self, method_name, params)
+        return await self.client.request(method_name, send)
+
+
+# pylint: disable=too-many-instance-attributes
+class PooledGatewayClient(GatewayClient):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        net,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        request_timeout: float = 30,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # The connections are kept alive between the requests
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=request_timeout),
+        )
+        super().__init__(net, session=self.session)
+
+        # Only the reads are retried, the transactions are sent as is
+        self._feeder_gateway_client = ResilientHttpClient(
+            self._feeder_gateway_client.url, self.session, self
+        )
+        self._gateway_client = SessionHttpClient(
+            self._gateway_client.url, session=self.session
+        )
+
+    async def close(self):
+        await self.session.close()
+
+    async def __aenter__(self) -> "PooledGatewayClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def get_backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter, so the retries of concurrent
+        requests are spread over time"""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    async def request(self, method: str, send: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                self.circuit_breaker.before_call()
+            except CircuitOpenError:
+                metrics.GATEWAY_REJECTED.inc(method=method)
+                raise
+
+            async with self._semaphore:
+                metrics.GATEWAY_IN_FLIGHT.inc()
+                start = time.perf_counter()
+                try:
+                    result = await send()
+                # pylint: disable=broad-except
+                except Exception as error:
+                    metrics.GATEWAY_REQUEST_LATENCY.observe(
+                        time.perf_counter() - start, method=method, result="error"
+                    )
+                    if not is_retryable(error):
+                        # The gateway answered, it isn't failing
+                        self.circuit_breaker.record_success()
+                        raise
+
+                    self.circuit_breaker.record_failure()
+                    if attempt >= self.max_retries:
+                        raise
+                    failure = error
+                else:
+                    metrics.GATEWAY_REQUEST_LATENCY.observe(
+                        time.perf_counter() - start, method=method, result="success"
+                    )
+                    self.circuit_breaker.record_success()
+                    return result
+                finally:
+                    metrics.GATEWAY_IN_FLIGHT.dec()
+
+            # The slot is released while waiting
+            delay = self.get_backoff(attempt)
+            attempt += 1
+            metrics.GATEWAY_RETRIES.inc(method=method)
+            logger.warning(
+                "Retrying %s in %.2fs (attempt %s/%s) after: %r",
+                method,
+                delay,
+                attempt,
+                self.max_retries,
+                failure,
+            )
+            await asyncio.sleep(delay)
+
+
+def create_gateway_client(net) -> PooledGatewayClient:
+    """Creates the gateway client configured by the gateway_* settings"""
+    return PooledGatewayClient(
+        net,
+        max_concurrency=config.gateway_max_concurrency,
+        max_retries=config.gateway_max_retries,
+        backoff_base=config.gateway_backoff_base,
+        backoff_max=config.gateway_backoff_max,
+        request_timeout=config.gateway_request_timeout,
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=config.gateway_circuit_failure_threshold,
+            reset_timeout=config.gateway_circuit_reset_timeout,
+        ),
+    )
@@ -1,13 +1,14 @@
-from typing import Any, Callable, Coroutine, Type
+from typing import Any, Callable, Coroutine, Iterable, Type
 
 from apibara import Info
-from apibara.model import BlockHeader, NewEvents, StarkNetEvent
+from apibara.model import BlockHeader, NewBlock, NewEvents, StarkNetEvent
 
-from dao.indexer import bank, logger, members, proposals
+from dao import metrics
+from dao.indexer import bank, logger, members, pipeline, proposals
 from dao.indexer.base_event import BaseEvent
-from dao.indexer.deserializer import deserialize_starknet_event
 
 EventHandler = Callable[[Info, BlockHeader, StarkNetEvent], Coroutine[Any, Any, None]]
+BlockHandler = Callable[[Info, NewBlock], Coroutine[Any, Any, None]]
 
 ALL_EVENTS: dict[str, Type[BaseEvent]] = {
     "ProposalStatusUpdated": proposals.ProposalStatusUpdated,
@@ -30,6 +31,19 @@ ALL_EVENTS: dict[str, Type[BaseEvent]] = {
 }
 
 
+def combine_block_handlers(block_handlers: Iterable[BlockHandler]) -> BlockHandler:
+    """apibara takes a single block handler. It is called for every block, before
+    its events, while the new events handler is only called for the blocks with
+    events."""
+    block_handlers = list(block_handlers)
+
+    async def handler(info: Info, new_block: NewBlock):
+        for block_handler in block_handlers:
+            await block_handler(info, new_block)
+
+    return handler
+
+
 async def default_new_events_handler(
     info: Info,
     block_events: NewEvents,
@@ -38,24 +52,33 @@ async def default_new_events_handler(
     if event_classes is None:
         event_classes = ALL_EVENTS
 
-    for starknet_event in block_events.events:
-        if event_class := event_classes.get(starknet_event.name):
-            logger.debug(
-                "Handling event=%s emitted during block=%s with event_class=%s",
-                block_events.block,
-                starknet_event.name,
-                event_class,
-            )
-            kwargs = await deserialize_starknet_event(
-                fields=event_class.__annotations__,
+    block = block_events.block
+    queue_size = info.context.get("pipeline_queue_size", 0)
+
+    with metrics.BLOCK_LATENCY.time(mode="pipeline" if queue_size else "sequential"):
+        if queue_size:
+            await pipeline.run_pipeline(
                 info=info,
-                block=block_events.block,
-                starknet_event=starknet_event,
+                block_events=block_events,
+                event_classes=event_classes,
+                queue_size=queue_size,
             )
-            event = event_class(**kwargs)
+            return
 
-            await event.handle(
-                info=info, block=block_events.block, starknet_event=starknet_event
-            )
-        else:
-            logger.error("Cannot find event class for %s", starknet_event)
+        scheduler = pipeline.create_scheduler(info)
+
+        for starknet_event in block_events.events:
+            if event_class := event_classes.get(starknet_event.name):
+                logger.debug(
+                    "Handling event=%s emitted during block=%s with event_class=%s",
+                    starknet_event.name,
+                    block.number,
+                    event_class,
+                )
+                decoded = await pipeline.decode(info, starknet_event, event_class)
+                event = await pipeline.enrich(info, block, decoded)
+                await pipeline.schedule(scheduler, info, block, starknet_event, event)
+            else:
+                logger.error("Cannot find event class for %s", starknet_event)
+
+        await scheduler.join()
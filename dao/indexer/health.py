@@ -0,0 +1,98 @@
+"""Progress of the indexer, reported in the "_health" collection and at /health,
+see dao/health.py"""
+from datetime import datetime
+from functools import wraps
+from typing import Any, Optional
+
+from aiohttp import web
+from apibara import Info
+from apibara.model import BlockHeader, NewBlock, NewEvents
+from pymongo.database import Database
+
+from dao import config, health, utils
+from dao.indexer import logger
+from dao.indexer.handler import BlockHandler
+
+
+class HealthRecorder:
+    def __init__(
+        self,
+        indexer_id: str = config.indexer_id,
+        rate_window: float = config.health_rate_window,
+    ):
+        self.indexer_id = indexer_id
+        # Set once the indexer storage is created
+        self.db: Optional[Database] = None
+        self.rate = health.EventsRate(rate_window)
+        self.fields: dict[str, Any] = {}
+        # The block being indexed and the number of its events handled so far
+        self._block: Optional[BlockHeader] = None
+        self._events = 0
+
+    def _update(self, **fields):
+        fields["updatedAt"] = utils.utcnow()
+        self.fields.update(fields)
+        if self.db is None:
+            return
+
+        try:
+            self.db[health.HEALTH_COLLECTION].update_one(
+                {"indexerId": self.indexer_id}, {"$set": fields}, upsert=True
+            )
+        # pylint: disable=broad-except
+        except Exception as error:
+            # The health report doesn't stop the indexer
+            logger.warning("Cannot write the health report: %s", error)
+
+    def count_events(self, events: int):
+        """Called once events of the block being indexed are handled, before apibara
+        commits them"""
+        self._events += events
+
+    def record_block(self, block: BlockHeader, events: int):
+        """Called once block is committed"""
+        self.rate.record(events)
+        self._update(
+            indexedBlock=block.number,
+            indexedBlockTimestamp=block.timestamp,
+            eventsPerSecond=round(self.rate.get(), 3),
+            committedAt=utils.utcnow(),
+        )
+
+    def begin_block(self, block: BlockHeader):
+        """Called at the start of every block, once the previous one is committed:
+        apibara commits the writes of a block when the new events handler returns,
+        so the previous block is recorded here"""
+        previous, events = self._block, self._events
+        self._block, self._events = block, 0
+        if previous is not None:
+            self.record_block(previous, events)
+
+    def record_chain_head(self, block_number: int, timestamp: datetime):
+        self._update(chainHeadBlock=block_number, chainHeadTimestamp=timestamp)
+
+    def get(self) -> dict[str, Any]:
+        return health.get_health(self.fields)
+
+
+def health_handler(new_events_handler, recorder: HealthRecorder):
+    @wraps(new_events_handler)
+    async def wrapper(info: Info, block_events: NewEvents):
+        await new_events_handler(info, block_events)
+        recorder.count_events(len(block_events.events))
+
+    return wrapper
+
+
+def health_block_handler(recorder: HealthRecorder) -> BlockHandler:
+    async def handler(_info: Info, new_block: NewBlock):
+        recorder.begin_block(new_block.new_head)
+
+    return handler
+
+
+async def health_view(request: web.Request) -> web.Response:
+    report = request.app["health"].get()
+    return web.json_response(
+        health.to_json(report), status=200 if report["healthy"] else 503
+    )
@@ -0,0 +1,183 @@
+# pylint: disable=redefined-builtin
+"""Replay-safe application of the events.
+
+Each event is keyed by its block number, transaction hash and index in the block.
+The event is recorded in the events collection with its key once all its writes
+are applied, an event already recorded is skipped when it is applied again.
+
+An event applied again after a failure can have applied part of its writes. Each
+document written by an event is marked with the position of the event in the
+chain, and with the writes of the event already applied to it:
+
+    "_applied": {"event": <position>, "writes": [<write id>, ...]}
+
+A write is identified by a hash of its collection, filter and update. The updates
+only match the documents not marked by the event or by a later one, or whose
+marks miss the write, and the inserts are skipped if the document of the same
+entity is marked by the event or a later one. The $inc on the balances and the
+$push on the votes, transactions and roles are then applied once per event
+whatever the number of retries. The events sharing a document are applied in
+chain order, see BaseEvent.entity_keys, so the event marking a document is the
+last one applied to it.
+
+The writes of the uncommitted blocks are rolled back when the indexer starts, by
+apibara's runner invalidating the data from the starting sequence, as apibara's
+updates aren't atomic.
+"""
+import hashlib
+from typing import Iterable, Optional
+
+import bson
+from apibara import Info
+from apibara.model import BlockHeader, StarkNetEvent
+
+from dao.graphql.storage import HISTORY_INDEXES
+
+# The events of a block are indexed on 20 bits in the position of an event
+LOG_INDEX_BITS = 20
+
+APPLIED_FIELD = "_applied"
+
+
+def get_event_key(block: BlockHeader, starknet_event: StarkNetEvent) -> dict:
+    return {
+        "blockNumber": block.number,
+        "transactionHash": starknet_event.transaction_hash,
+        "logIndex": starknet_event.log_index,
+    }
+
+
+def get_event_position(key: dict) -> int:
+    """Orders the events of the chain"""
+    return (key["blockNumber"] << LOG_INDEX_BITS) | key["logIndex"]
+
+
+def get_write_id(collection: str, filter: dict, update: dict) -> str:
+    # BSON is independent of the timezone objects of the dates
+    write = bson.encode({"collection": collection, "filter": filter, "update": update})
+    return hashlib.blake2b(write, digest_size=8).hexdigest()
+
+
+def _and(filter: dict, condition: dict) -> dict:
+    if any(name in filter for name in condition):
+        return {"$and": [filter, condition]}
+    return {**filter, **condition}
+
+
+class IdempotentStorage:
+    """Proxy for apibara's Storage applying the writes of an event once"""
+
+    def __init__(self, storage, position: int):
+        self._storage = storage
+        self.position = position
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+    def _mark(self, doc: dict, write_id: str) -> dict:
+        return {**doc, APPLIED_FIELD: {"event": self.position, "writes": [write_id]}}
+
+    async def _is_inserted(self, collection: str, doc: dict) -> bool:
+        keys = HISTORY_INDEXES.get(collection)
+        if keys is None:
+            return False
+        return bool(
+            await self._storage.find_one(
+                collection,
+                {
+                    **{key: doc.get(key) for key in keys},
+                    f"{APPLIED_FIELD}.event": {"$gte": self.position},
+                },
+            )
+        )
+
+    def _mark_insert(self, collection: str, doc: dict) -> dict:
+        # The insert of the entity
+        keys = HISTORY_INDEXES.get(collection, [])
+        return self._mark(
+            doc, get_write_id(collection, {key: doc.get(key) for key in keys}, {})
+        )
+
+    async def insert_one(self, collection: str, doc: dict):
+        if await self._is_inserted(collection, doc):
+            return
+        await self._storage.insert_one(collection, self._mark_insert(collection, doc))
+
+    async def insert_many(self, collection: str, docs: Iterable[dict]):
+        docs = [
+            self._mark_insert(collection, doc)
+            for doc in docs
+            if not await self._is_inserted(collection, doc)
+        ]
+        if docs:
+            await self._storage.insert_many(collection, docs)
+
+    async def find_one_and_replace(
+        self, collection: str, filter: dict, replacement: dict, upsert: bool = False
+    ):
+        # Replacing again gives the same document
+        return await self._storage.find_one_and_replace(
+            collection,
+            filter,
+            self._mark(replacement, get_write_id(collection, filter, replacement)),
+            upsert=upsert,
+        )
+
+    async def find_one_and_update(
+        self, collection: str, filter: dict, update: dict
+    ) -> Optional[dict]:
+        write_id = get_write_id(collection, filter, update)
+
+        # The first write of the event to the document
+        existing = await self._storage.find_one_and_update(
+            collection,
+            _and(
+                filter,
+                {
+                    "$or": [
+                        {f"{APPLIED_FIELD}.event": {"$lt": self.position}},
+                        {f"{APPLIED_FIELD}.event": None},
+                    ]
+                },
+            ),
+            {
+                **update,
+                "$set": {
+                    **update.get("$set", {}),
+                    APPLIED_FIELD: {"event": self.position, "writes": [write_id]},
+                },
+            },
+        )
+        if existing is not None:
+            return existing
+
+        # The document is already written by the event
+        return await self._storage.find_one_and_update(
+            collection,
+            _and(
+                filter,
+                {
+                    f"{APPLIED_FIELD}.event": self.position,
+                    f"{APPLIED_FIELD}.writes": {"$ne": write_id},
+                },
+            ),
+            {
+                **update,
+                "$push": {
+                    **update.get("$push", {}),
+                    f"{APPLIED_FIELD}.writes": write_id,
+                },
+            },
+        )
+
+
+async def is_applied(info: Info, key: dict) -> bool:
+    return bool(await info.storage.find_one("events", dict(key)))
+
+
+def get_event_info(info: Info, key: dict) -> Info:
+    """The info to apply the event keyed by key with"""
+    return Info(
+        context=info.context,
+        storage=IdempotentStorage(info.storage, get_event_position(key)),
+    )
@@ -1,32 +1,65 @@
-from typing import Any, Callable, Coroutine
+import asyncio
+from typing import Any, Callable, Coroutine, Optional
 
 from apibara import IndexerRunner, Info
 from apibara.indexer import IndexerRunnerConfiguration
 from apibara.model import BlockHeader, EventFilter, StarkNetEvent
-from starknet_py.net.gateway_client import GatewayClient
 
 from dao import config
 from dao.graphql import storage
-from dao.indexer import logger
-from dao.indexer.handler import default_new_events_handler
+from dao.indexer import (
+    backfill,
+    compaction,
+    gateway,
+    health,
+    logger,
+    metrics,
+    scheduler,
+    snapshot,
+    state,
+    status,
+)
+from dao.indexer.handler import combine_block_handlers, default_new_events_handler
+from dao.models import Dao
 
 EventHandler = Callable[[Info, BlockHeader, StarkNetEvent], Coroutine[Any, Any, None]]
 
 
-# pylint: disable=too-many-arguments
+# pylint: disable=too-many-arguments,too-many-locals,too-many-statements
 async def run_indexer(
     server_url,
     mongo_url,
     starknet_network_url,
     filters: list[EventFilter],
+    daos: Optional[list[Dao]] = None,
     ssl=True,
     restart: bool = False,
     indexer_id: str = config.indexer_id,
     new_events_handler=default_new_events_handler,
+    abi: Optional[list] = None,
+    abi_cache_dir: Optional[str] = None,
+    metrics_host: str = "localhost",
+    metrics_port: Optional[int] = None,
+    pipeline_queue_size: int = 0,
+    concurrent_handlers: bool = False,
+    snapshot_path: Optional[str] = None,
+    snapshot_interval: int = config.snapshot_interval,
+    from_snapshot: Optional[str] = None,
+    compaction_interval: Optional[int] = None,
+    finality_depth: int = config.finality_depth,
+    archive_versions: bool = False,
+    in_memory_state: bool = False,
+    backfill_threshold: Optional[int] = None,
 ):
     logger.info(
         "Starting the indexer with server_url=%s, mongo_url=%s,"
-        " starknet_network_url=%s, indexer_id=%s, restart=%s, ssl=%s, filters=%s",
+        " starknet_network_url=%s, indexer_id=%s, restart=%s, ssl=%s, filters=%s,"
+        " daos=%s,"
+        " abi_cache_dir=%s,"
+        " metrics_port=%s, pipeline_queue_size=%s, concurrent_handlers=%s,"
+        " snapshot_path=%s, snapshot_interval=%s, from_snapshot=%s,"
+        " compaction_interval=%s, finality_depth=%s, archive_versions=%s,"
+        " in_memory_state=%s, backfill_threshold=%s",
         server_url,
         mongo_url,
         starknet_network_url,
@@ -34,8 +67,82 @@ async def run_indexer(
         restart,
         ssl,
         filters,
+        daos,
+        abi_cache_dir,
+        metrics_port,
+        pipeline_queue_size,
+        concurrent_handlers,
+        snapshot_path,
+        snapshot_interval,
+        from_snapshot,
+        compaction_interval,
+        finality_depth,
+        archive_versions,
+        in_memory_state,
+        backfill_threshold,
     )
 
+    if restart and from_snapshot is not None:
+        raise ValueError("restart and from_snapshot cannot be used together")
+
+    starknet_client = gateway.create_gateway_client(starknet_network_url)
+    recorder = health.HealthRecorder(indexer_id)
+
+    engine = None
+    if in_memory_state:
+        engine = state.StateEngine(undo_depth=finality_depth)
+        new_events_handler = state.state_handler(new_events_handler, engine)
+
+    # Called for every block, before its events
+    block_handlers: list = [status.status_block_handler]
+
+    # Instrumented
+    new_events_handler = status.status_handler(new_events_handler)
+
+    backfill_controller = None
+    if backfill_threshold is not None:
+        backfill_controller = backfill.Backfill(backfill_threshold, engine)
+        # The mode is switched before the statuses are refreshed
+        block_handlers.insert(0, backfill.backfill_block_handler(backfill_controller))
+
+    if concurrent_handlers:
+        # The handlers applied concurrently overlap on the storage operations
+        block_handlers.insert(0, scheduler.executor_block_handler)
+
+    if metrics_port is not None:
+        await metrics.start_metrics_server(metrics_host, metrics_port, recorder)
+        new_events_handler = metrics.instrument_handler(new_events_handler)
+
+    # Keep a reference to the task, otherwise it may be garbage collected
+    chain_head_task = asyncio.create_task(
+        metrics.watch_chain_head(starknet_client, recorder=recorder)
+    )
+
+    if snapshot_path is not None:
+        # Taken before the block handlers write the state of the block
+        block_handlers.insert(
+            0,
+            snapshot.snapshot_block_handler(
+                snapshot.SnapshotWriter(snapshot_path, snapshot_interval)
+            ),
+        )
+
+    if compaction_interval is not None:
+        new_events_handler = compaction.compaction_handler(
+            new_events_handler,
+            compaction.Compactor(
+                finality_depth=finality_depth,
+                interval=compaction_interval,
+                batch_size=config.compaction_batch_size,
+                archive=archive_versions,
+            ),
+        )
+
+    # Reported once the block is fully handled, or at the start of the next one
+    # for the blocks without events
+    new_events_handler = health.health_handler(new_events_handler, recorder)
+    block_handlers.append(health.health_block_handler(recorder))
+
     runner = IndexerRunner(
         config=IndexerRunnerConfiguration(
             apibara_url=server_url,
@@ -47,13 +154,39 @@ async def run_indexer(
         new_events_handler=new_events_handler,
     )
 
+    runner.add_block_handler(combine_block_handlers(block_handlers))
+    if engine is not None:
+        runner.add_reorg_handler(state.reorg_handler(engine))
+
     # pylint: disable=protected-access
-    storage.init_db(runner._indexer_storage.db)
+    indexer_storage = runner._indexer_storage
+
+    index_from_block = None
+    if from_snapshot is not None:
+        # Replaces the indexer state with the snapshot, indexing then resumes from
+        # the block following the snapshot
+        indexer_storage.drop_database()
+        snapshot_block = snapshot.restore_snapshot(indexer_storage.db, from_snapshot)
+        index_from_block = snapshot_block + 1
+
+    if backfill_controller is not None:
+        backfill_controller.attach(indexer_storage)
+
+    # The indexes of the queries are built once the backfill is done
+    storage.init_db(indexer_storage.db, query_indexes=backfill_controller is None)
+    recorder.db = indexer_storage.db
 
     runner.set_context(
         {
             "starknet_network_url": starknet_network_url,
-            "starknet_client": GatewayClient(starknet_network_url),
+            "starknet_client": starknet_client,
+            "contract_abi": abi,
+            "abi_cache_dir": abi_cache_dir,
+            "pipeline_queue_size": pipeline_queue_size,
+            "concurrent_handlers": concurrent_handlers,
+            "db": indexer_storage.db,
+            # The events are handled with the DAO of their contract
+            "daos": {dao.address: dao for dao in daos or []},
         }
     )
 
@@ -62,8 +195,12 @@ async def run_indexer(
     #
     # For now, this also helps the SDK map between human-readable
     # event names and StarkNet events.
-    runner.create_if_not_exists(filters=filters)
+    runner.create_if_not_exists(filters=filters, index_from_block=index_from_block)
 
     logger.info("Initialization completed. Entering main loop.")
 
-    await runner.run()
+    try:
+        await runner.run()
+    finally:
+        chain_head_task.cancel()
+        await starknet_client.close()
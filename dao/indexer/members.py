@@ -4,7 +4,7 @@ from apibara import Info
 from apibara.model import BlockHeader, StarkNetEvent
 
 from dao import utils
-from dao.indexer import storage
+from dao.indexer import rollups, storage
 from dao.indexer.base_event import BaseEvent
 from dao.indexer.deserializer import BlockNumber
 
@@ -16,32 +16,23 @@ class VoteSubmitted(BaseEvent):
     vote: bool
     onBehalfAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("vote", self.proposalId, self.onBehalfAddress)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
-        # TODO: store both callerAddress and onBehalfAddress, we'll need to know
-        # who voted at some point
-        if self.vote:
-            update_proposal_vote = {"$push": {"yesVoters": self.onBehalfAddress}}
-        else:
-            update_proposal_vote = {"$push": {"noVoters": self.onBehalfAddress}}
-
-        await storage.update_proposal(
-            proposal_id=self.proposalId,
-            update=update_proposal_vote,
-            info=info,
-        )
-
-        if self.vote:
-            update_member_vote = {"$push": {"yesVotes": self.proposalId}}
-        else:
-            update_member_vote = {"$push": {"noVotes": self.proposalId}}
-
-        await storage.update_member(
-            member_address=self.onBehalfAddress,
-            update=update_member_vote,
-            info=info,
-        )
+        # Votes are stored on their own rather than pushed to the proposal and the
+        # member, which would create a new version of both documents at each vote
+        vote_dict = {
+            "proposalId": self.proposalId,
+            "voterAddress": self.onBehalfAddress,
+            "callerAddress": self.callerAddress,
+            "vote": self.vote,
+            "votedAt": utils.get_block_datetime_utc(block),
+            "blockNumber": block.number,
+        }
+        await info.storage.insert_one("votes", vote_dict)
 
 
 @dataclass
@@ -51,6 +42,9 @@ class MemberAdded(BaseEvent):
     loot: int
     onboardedAt: BlockNumber
 
+    def entity_keys(self) -> set[tuple]:
+        return {("member", self.memberAddress), ("membership_rollups",)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -60,6 +54,12 @@ class MemberAdded(BaseEvent):
             "exitedAt": None,
         }
         await info.storage.insert_one("members", member_dict)
+        await rollups.update_membership_rollups(
+            info=info,
+            timestamp=utils.get_block_datetime_utc(block),
+            before=None,
+            after=member_dict,
+        )
 
 
 @dataclass
@@ -72,6 +72,9 @@ class MemberUpdated(BaseEvent):
     lastProposalYesVote: int
     onboardedAt: BlockNumber
 
+    def entity_keys(self) -> set[tuple]:
+        return {("member", self.memberAddress), ("membership_rollups",)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -83,11 +86,18 @@ class MemberUpdated(BaseEvent):
         update_member_dict["jailedAt"] = block_datetime if self.jailed else None
         update_member_dict["exitedAt"] = block_datetime if not self.shares else None
 
-        return await storage.update_member(
+        existing = await storage.update_member(
             member_address=self.memberAddress,
             update={"$set": update_member_dict},
             info=info,
         )
+        if existing is not None:
+            await rollups.update_membership_rollups(
+                info=info,
+                timestamp=block_datetime,
+                before=existing,
+                after={**existing, **update_member_dict},
+            )
 
 
 @dataclass
@@ -96,6 +106,9 @@ class RoleGranted(BaseEvent):
     role: str
     sender: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("member", self.account)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -113,6 +126,9 @@ class RoleRevoked(BaseEvent):
     role: str
     sender: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("member", self.account)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
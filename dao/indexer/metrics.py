@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Optional
+
+from aiohttp import web
+from apibara import Info
+from apibara.model import NewEvents
+from starknet_py.net.gateway_client import GatewayClient
+
+from dao import metrics
+from dao.indexer import logger
+from dao.indexer.health import HealthRecorder, health_view
+from dao.indexer.scheduler import STORAGE_OPERATIONS
+
+
+class InstrumentedStorage:
+    """Proxy for apibara's Storage recording the count and latency of the
+    operations sent to each collection"""
+
+    OPERATIONS = STORAGE_OPERATIONS
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def __getattr__(self, name):
+        attr = getattr(self._storage, name)
+
+        if name not in self.OPERATIONS:
+            return attr
+
+        @wraps(attr)
+        async def wrapper(*args, **kwargs):
+            collection = kwargs.get("collection", args[0] if args else None)
+            with metrics.MONGO_LATENCY.time(collection=collection, operation=name):
+                result = await attr(*args, **kwargs)
+            metrics.MONGO_OPERATIONS.inc(collection=collection, operation=name)
+            return result
+
+        return wrapper
+
+
+def instrument_handler(new_events_handler):
+    @wraps(new_events_handler)
+    async def wrapper(info: Info, block_events: NewEvents):
+        info.storage = InstrumentedStorage(info.storage)
+
+        await new_events_handler(info, block_events)
+
+        metrics.BLOCKS_PROCESSED.inc()
+        metrics.INDEXED_BLOCK.set(block_events.block.number)
+        metrics.update_block_lag()
+
+    return wrapper
+
+
+async def watch_chain_head(
+    client: GatewayClient,
+    interval: float = 10,
+    recorder: Optional[HealthRecorder] = None,
+):
+    while True:
+        try:
+            with metrics.GATEWAY_LATENCY.time(method="get_latest_block"):
+                block = await client.get_block(block_number="latest")
+        # pylint: disable=broad-except
+        except Exception as error:
+            logger.warning("Cannot fetch the chain head: %s", error)
+        else:
+            metrics.CHAIN_HEAD_BLOCK.set(block.block_number)
+            metrics.update_block_lag()
+            if recorder is not None:
+                recorder.record_chain_head(
+                    block.block_number,
+                    datetime.fromtimestamp(block.timestamp, tz=timezone.utc),
+                )
+
+        await asyncio.sleep(interval)
+
+
+# pylint: disable=unused-argument
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+async def start_metrics_server(
+    host: str, port: int, recorder: Optional[HealthRecorder] = None
+) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    if recorder is not None:
+        app["health"] = recorder
+        app.router.add_get("/health", health_view)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    logger.info("Metrics server started at http://%s:%s/metrics", host, port)
+
+    return runner
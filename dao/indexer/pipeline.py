@@ -0,0 +1,175 @@
+"""Staged processing of the events of a block.
+
+The events go through 3 stages connected by bounded queues:
+
+- decode: transforms the raw event data to python values using the contract's ABI
+- enrich: deserializes the values, fetching external data like block timestamps
+- apply: writes the event to the storage, in the order of the block or, when
+  concurrent handlers are enabled, in the order of the block per entity
+
+Enrichments are started as soon as an event is decoded, so gateway lookups of the
+next events overlap with the storage writes of the current one. The size of the
+queues bounds the number of events in flight and provides the backpressure.
+"""
+import asyncio
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Optional, Type
+
+from apibara import Info
+from apibara.model import BlockHeader, NewEvents, StarkNetEvent
+
+from dao import metrics
+from dao.indexer import daos, logger
+from dao.indexer.base_event import BaseEvent
+from dao.indexer.deserializer import decode_starknet_event, deserialize_python_data
+from dao.indexer.scheduler import KeyedScheduler
+
+
+@dataclass
+class DecodedEvent:
+    starknet_event: StarkNetEvent
+    event_class: Type[BaseEvent]
+    python_data: Any
+
+
+async def decode(
+    info: Info, starknet_event: StarkNetEvent, event_class: Type[BaseEvent]
+) -> DecodedEvent:
+    python_data = await decode_starknet_event(info=info, starknet_event=starknet_event)
+    return DecodedEvent(starknet_event, event_class, python_data)
+
+
+async def enrich(info: Info, block: BlockHeader, decoded: DecodedEvent) -> BaseEvent:
+    kwargs = await deserialize_python_data(
+        fields=decoded.event_class.__annotations__,
+        python_data=decoded.python_data,
+        info=info,
+        block=block,
+        starknet_event=decoded.starknet_event,
+    )
+    return decoded.event_class(**kwargs)
+
+
+async def apply(
+    info: Info, block: BlockHeader, starknet_event: StarkNetEvent, event: BaseEvent
+):
+    info = daos.get_event_info(info, starknet_event)
+    with metrics.HANDLER_LATENCY.time(event=starknet_event.name):
+        await event.handle(info=info, block=block, starknet_event=starknet_event)
+    metrics.EVENTS_PROCESSED.inc(event=starknet_event.name)
+
+
+async def _decode_stage(
+    info: Info,
+    block_events: NewEvents,
+    event_classes: dict[str, Type[BaseEvent]],
+    decoded_queue: asyncio.Queue,
+):
+    for starknet_event in block_events.events:
+        if event_class := event_classes.get(starknet_event.name):
+            logger.debug(
+                "Decoding event=%s emitted during block=%s with event_class=%s",
+                starknet_event.name,
+                block_events.block.number,
+                event_class,
+            )
+            decoded = await decode(info, starknet_event, event_class)
+            await decoded_queue.put(decoded)
+        else:
+            logger.error("Cannot find event class for %s", starknet_event)
+
+    await decoded_queue.put(None)
+
+
+async def _enrich_stage(
+    info: Info,
+    block: BlockHeader,
+    decoded_queue: asyncio.Queue,
+    enriched_queue: asyncio.Queue,
+):
+    while (decoded := await decoded_queue.get()) is not None:
+        # Enrichment runs in the background, the apply stage awaits the tasks
+        # in order so the events are still applied in the order of the block
+        task = asyncio.create_task(enrich(info, block, decoded))
+        try:
+            await enriched_queue.put((decoded.starknet_event, task))
+        except asyncio.CancelledError:
+            _discard(task)
+            raise
+
+    await enriched_queue.put(None)
+
+
+async def schedule(
+    scheduler: KeyedScheduler,
+    info: Info,
+    block: BlockHeader,
+    starknet_event: StarkNetEvent,
+    event: BaseEvent,
+):
+    # The entities of different DAOs never conflict
+    keys = daos.scope_entity_keys(
+        daos.get_event_dao(info, starknet_event), event.entity_keys()
+    )
+    await scheduler.submit(keys, partial(apply, info, block, starknet_event, event))
+
+
+def create_scheduler(info: Info) -> KeyedScheduler:
+    return KeyedScheduler(concurrent=info.context.get("concurrent_handlers", False))
+
+
+async def _apply_stage(info: Info, block: BlockHeader, enriched_queue: asyncio.Queue):
+    scheduler = create_scheduler(info)
+
+    while (item := await enriched_queue.get()) is not None:
+        starknet_event, task = item
+        event = await task
+        await schedule(scheduler, info, block, starknet_event, event)
+
+    await scheduler.join()
+
+
+def _discard(task: asyncio.Task):
+    if task.done():
+        # Retrieve the exception to avoid asyncio logging it as never retrieved
+        if not task.cancelled():
+            task.exception()
+    else:
+        task.cancel()
+
+
+def _discard_pending(enriched_queue: asyncio.Queue):
+    while not enriched_queue.empty():
+        if (item := enriched_queue.get_nowait()) is not None:
+            _, task = item
+            _discard(task)
+
+
+async def run_pipeline(
+    info: Info,
+    block_events: NewEvents,
+    event_classes: dict[str, Type[BaseEvent]],
+    queue_size: int,
+):
+    """Handles the events of a block, returns once all of them are applied"""
+    decoded_queue: asyncio.Queue[Optional[DecodedEvent]] = asyncio.Queue(queue_size)
+    enriched_queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+    block = block_events.block
+
+    stages = [
+        asyncio.create_task(
+            _decode_stage(info, block_events, event_classes, decoded_queue)
+        ),
+        asyncio.create_task(_enrich_stage(info, block, decoded_queue, enriched_queue)),
+        asyncio.create_task(_apply_stage(info, block, enriched_queue)),
+    ]
+
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        for stage in stages:
+            stage.cancel()
+        _discard_pending(enriched_queue)
+        raise
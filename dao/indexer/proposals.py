@@ -4,7 +4,7 @@ from apibara import Info
 from apibara.model import BlockHeader, StarkNetEvent
 
 from dao import utils
-from dao.indexer import logger, storage
+from dao.indexer import idempotency, logger, storage
 from dao.indexer.base_event import BaseEvent
 from dao.indexer.deserializer import BlockNumber
 from dao.models import ProposalRawStatus
@@ -19,6 +19,9 @@ class ProposalAdded(BaseEvent):
     submittedAt: BlockNumber
     submittedBy: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id), ("proposal_params", self.type)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -34,7 +37,7 @@ class ProposalAdded(BaseEvent):
                 " indexer is handling ProposalParamsUpdated events"
             )
 
-        del proposal_params["_id"]
+        proposal_params.pop("_id", None)
 
         proposal_dict = {
             **asdict(self),
@@ -59,9 +62,16 @@ class ProposalParamsUpdated(BaseEvent):
     votingDuration: int
     graceDuration: int
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal_params", self.type)}
+
     async def handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
+        # Not recorded in the events, the insert is skipped when applied again
+        info = idempotency.get_event_info(
+            info, idempotency.get_event_key(block, starknet_event)
+        )
         logger.debug("Inserting proposal_params %s", self)
         await info.storage.insert_one("proposal_params", asdict(self))
 
@@ -75,6 +85,9 @@ class OnboardProposalAdded(BaseEvent):
     tributeOffered: int
     tributeAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -90,6 +103,9 @@ class ProposalStatusUpdated(BaseEvent):
     id: int
     status: str
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -113,6 +129,9 @@ class GuildKickProposalAdded(BaseEvent):
     id: int
     memberAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -129,6 +148,9 @@ class WhitelistProposalAdded(BaseEvent):
     tokenName: str
     tokenAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -145,6 +167,9 @@ class UnWhitelistProposalAdded(BaseEvent):
     tokenName: str
     tokenAddress: bytes
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -163,6 +188,9 @@ class SwapProposalAdded(BaseEvent):
     paymentAddress: bytes
     paymentRequested: int
 
+    def entity_keys(self) -> set[tuple]:
+        return {("proposal", self.id)}
+
     async def _handle(
         self, info: Info, block: BlockHeader, starknet_event: StarkNetEvent
     ):
@@ -0,0 +1,126 @@
+# pylint: disable=redefined-builtin
+"""Hourly and daily rollups of the treasury and the membership.
+
+The rollups are updated incrementally while the events are applied: a rollup
+document holds the flows of its period, reset at each period, and the levels at
+the close of the period, carried over from the previous period. They are written
+through the apibara storage like the other collections, so a chain
+reorganization rolls them back too.
+"""
+from datetime import datetime
+from typing import Optional
+
+from apibara import Info
+
+from dao.indexer import logger
+from dao.models import RollupPeriod
+
+TREASURY_ROLLUPS = "treasury_rollups"
+MEMBERSHIP_ROLLUPS = "membership_rollups"
+
+
+def get_period_start(timestamp: datetime, period: RollupPeriod) -> datetime:
+    start = timestamp.replace(minute=0, second=0, microsecond=0)
+    if period is RollupPeriod.DAY:
+        start = start.replace(hour=0)
+    return start
+
+
+# pylint: disable=too-many-arguments
+async def update_rollups(
+    info: Info,
+    collection: str,
+    key: dict,
+    timestamp: datetime,
+    flows: Optional[dict[str, int]] = None,
+    levels: Optional[dict[str, int]] = None,
+):
+    """Adds flows and levels to the rollups of every period containing timestamp,
+    creating the rollups opened by timestamp from the previous ones"""
+    flows = flows or {}
+    levels = levels or {}
+
+    for period in RollupPeriod:
+        filter = {
+            **key,
+            "period": period.value,
+            "periodStart": get_period_start(timestamp, period),
+        }
+
+        if not await info.storage.find_one(collection, dict(filter)):
+            previous = list(
+                await info.storage.find(
+                    collection,
+                    {**key, "period": period.value},
+                    sort={"periodStart": -1},
+                    limit=1,
+                )
+            )
+            opening = previous[0] if previous else {}
+
+            # Opened without the changes, they are added by the update below so
+            # an event applied again adds them once, see dao/indexer/idempotency.py
+            rollup = {
+                **filter,
+                **{name: 0 for name in flows},
+                **{name: opening.get(name, 0) for name in levels},
+            }
+            logger.debug("Opening rollup %s", rollup)
+            await info.storage.insert_one(collection, rollup)
+
+        await info.storage.find_one_and_update(
+            collection=collection,
+            filter=filter,
+            update={"$inc": {**flows, **levels}},
+        )
+
+
+async def update_treasury_rollups(
+    info: Info, timestamp: datetime, token_address: bytes, amount: int
+):
+    await update_rollups(
+        info=info,
+        collection=TREASURY_ROLLUPS,
+        key={"tokenAddress": token_address},
+        timestamp=timestamp,
+        flows={"inflow": max(amount, 0), "outflow": max(-amount, 0)},
+        levels={"closingBalance": amount},
+    )
+
+
+def get_member_status(member: Optional[dict]) -> Optional[str]:
+    if member is None:
+        return None
+    if member.get("exitedAt") is not None:
+        return "exited"
+    if member.get("jailedAt") is not None:
+        return "jailed"
+    return "active"
+
+
+async def update_membership_rollups(
+    info: Info, timestamp: datetime, before: Optional[dict], after: dict
+):
+    """Adds the change of a member, from before (None for a new member) to after,
+    to the membership rollups"""
+    levels = {
+        "totalShares": after["shares"] - (before["shares"] if before else 0),
+        "totalLoot": after["loot"] - (before["loot"] if before else 0),
+        "activeCount": 0,
+        "jailedCount": 0,
+        "exitedCount": 0,
+    }
+
+    old_status, new_status = get_member_status(before), get_member_status(after)
+    if old_status != new_status:
+        if old_status is not None:
+            levels[f"{old_status}Count"] -= 1
+        levels[f"{new_status}Count"] += 1
+
+    await update_rollups(
+        info=info,
+        collection=MEMBERSHIP_ROLLUPS,
+        key={},
+        timestamp=timestamp,
+        levels=levels,
+    )
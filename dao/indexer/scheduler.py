@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from functools import wraps
+from typing import Any, Awaitable, Callable, Coroutine, Hashable, Iterable, Optional
+
+from apibara import Info
+from apibara.model import NewBlock
+
+EntityKey = Hashable
+
+# The operations of apibara's Storage
+STORAGE_OPERATIONS = {
+    "insert_one",
+    "insert_many",
+    "delete_one",
+    "delete_many",
+    "find_one",
+    "find",
+    "find_one_and_replace",
+    "find_one_and_update",
+}
+
+# The event loop of each executor thread
+_thread_local = threading.local()
+
+
+class KeyedScheduler:
+    """Runs the submitted coroutines concurrently, except the ones sharing an entity
+    key which run in the order they were submitted.
+
+    A coroutine submitted with keys=None may touch any entity, it waits for all the
+    previous coroutines and all the following ones wait for it.
+
+    When concurrent is False, submit simply awaits the coroutine.
+    """
+
+    def __init__(self, concurrent: bool = True):
+        self.concurrent = concurrent
+        self._tasks: list[asyncio.Task] = []
+        self._last_by_key: dict[EntityKey, asyncio.Task] = {}
+        self._barrier: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def _run(
+        dependencies: list[asyncio.Task], coro_factory: Callable[[], Awaitable]
+    ):
+        if dependencies:
+            # Raises if any dependency failed, the coroutine is then never started
+            await asyncio.gather(*dependencies)
+        return await coro_factory()
+
+    async def submit(
+        self,
+        keys: Optional[Iterable[EntityKey]],
+        coro_factory: Callable[[], Awaitable],
+    ):
+        if not self.concurrent:
+            await coro_factory()
+            return
+
+        if keys is None:
+            dependencies = [task for task in self._tasks if not task.done()]
+        else:
+            keys = set(keys)
+            dependencies = [
+                self._last_by_key[key] for key in keys if key in self._last_by_key
+            ]
+            if self._barrier is not None:
+                dependencies.append(self._barrier)
+
+        task = asyncio.create_task(self._run(dependencies, coro_factory))
+        self._tasks.append(task)
+
+        if keys is None:
+            # Following coroutines depend on the barrier, which itself depends on
+            # all the previous ones
+            self._barrier = task
+            self._last_by_key.clear()
+        else:
+            for key in keys:
+                self._last_by_key[key] = task
+
+    async def join(self):
+        """Waits for all the submitted coroutines, raises the first error if any"""
+        tasks, self._tasks = self._tasks, []
+        self._last_by_key.clear()
+        self._barrier = None
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+
+def _run_in_thread(coro: Coroutine) -> Any:
+    loop = getattr(_thread_local, "loop", None)
+    if loop is None:
+        loop = _thread_local.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+class ExecutorStorage:
+    """Proxy for apibara's Storage running its operations in the default executor,
+    so that the handlers applied concurrently overlap on the MongoDB round trips.
+
+    apibara's operations are coroutines making blocking pymongo calls, each one is
+    run to completion in an executor thread. The session of the block can only be
+    used by one thread at a time, the operations use implicit sessions instead:
+    apibara doesn't start a transaction, and the reads go to the primary. The
+    cursors returned by find are read in the thread as well.
+    """
+
+    def __init__(self, storage):
+        # pylint: disable=protected-access
+        self._storage = type(storage)(storage._db, None, storage._block_number)
+
+    def __getattr__(self, name):
+        attr = getattr(self._storage, name)
+
+        if name not in STORAGE_OPERATIONS:
+            return attr
+
+        async def run(*args, **kwargs):
+            result = await attr(*args, **kwargs)
+            return list(result) if name == "find" else result
+
+        @wraps(attr)
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, _run_in_thread, run(*args, **kwargs)
+            )
+
+        return wrapper
+
+
+async def executor_block_handler(info: Info, _new_block: NewBlock):
+    """Runs the storage operations of the block in the executor. The block and new
+    events handlers share info, it must be the first block handler to wrap
+    apibara's Storage."""
+    info.storage = ExecutorStorage(info.storage)
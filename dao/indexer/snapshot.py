@@ -0,0 +1,150 @@
+"""Snapshots of the current state of the derived collections.
+
+A snapshot is a gzipped stream of BSON documents: a header with the block number
+followed by the current version of every document of SNAPSHOT_COLLECTIONS.
+Restoring a snapshot lets the indexer resume from the snapshot block instead of
+replaying every event from genesis. The "events" collection is part of the
+snapshots: it feeds the activity queries, and its documents are the keys of the
+events already applied, see dao/indexer/idempotency.py.
+
+A snapshot is written at the start of a block, once the previous one is committed
+and before the block handlers write to the state, whether the block has events or
+not.
+"""
+import gzip
+import os
+from pathlib import Path
+from typing import Iterator, Union
+
+import bson
+from apibara import Info
+from apibara.model import NewBlock
+from bson.codec_options import CodecOptions
+from pymongo.database import Database
+
+from dao.indexer import logger
+from dao.indexer.handler import BlockHandler
+
+# 2 added the events
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_COLLECTIONS = [
+    "members",
+    "bank",
+    "proposals",
+    "proposal_params",
+    "votes",
+    "tokens",
+    "treasury_rollups",
+    "membership_rollups",
+    "events",
+]
+
+CODEC_OPTIONS = CodecOptions(tz_aware=True)
+
+
+def _current_documents(db: Database, collection: str) -> Iterator[dict]:
+    return db[collection].find(
+        {"_chain.valid_to": None}, projection={"_id": False, "_chain": False}
+    )
+
+
+def write_snapshot(db: Database, path: Union[str, Path], block_number: int):
+    """Writes the state at block_number, the file is replaced atomically so a crash
+    while writing never leaves a truncated snapshot"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    counts = {}
+    with gzip.open(tmp_path, "wb") as f:
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "blockNumber": block_number,
+            "collections": SNAPSHOT_COLLECTIONS,
+        }
+        f.write(bson.encode(header))
+
+        for collection in SNAPSHOT_COLLECTIONS:
+            counts[collection] = 0
+            for document in _current_documents(db, collection):
+                f.write(bson.encode({"c": collection, "d": document}))
+                counts[collection] += 1
+
+    os.replace(tmp_path, path)
+
+    logger.info("Wrote snapshot at block=%s to %s: %s", block_number, path, counts)
+
+
+def read_snapshot(path: Union[str, Path]) -> tuple[int, Iterator[tuple[str, dict]]]:
+    """Returns the snapshot block number and an iterator over the
+    (collection, document) pairs"""
+    f = gzip.open(path, "rb")
+    documents = bson.decode_file_iter(f, codec_options=CODEC_OPTIONS)
+
+    header = next(documents)
+    if header.get("version") != SNAPSHOT_VERSION:
+        f.close()
+        raise ValueError(
+            f"Unsupported snapshot version {header.get('version')} in {path}, expected"
+            f" {SNAPSHOT_VERSION}"
+        )
+
+    def _iter_documents():
+        with f:
+            for item in documents:
+                yield item["c"], item["d"]
+
+    return header["blockNumber"], _iter_documents()
+
+
+def restore_snapshot(
+    db: Database, path: Union[str, Path], batch_size: int = 1000
+) -> int:
+    """Bulk inserts the snapshot documents as valid from the snapshot block,
+    returns the snapshot block number"""
+    block_number, documents = read_snapshot(path)
+
+    batches: dict[str, list[dict]] = {}
+    counts: dict[str, int] = {}
+
+    def _flush(collection: str):
+        if batch := batches.pop(collection, None):
+            db[collection].insert_many(batch, ordered=False)
+            counts[collection] = counts.get(collection, 0) + len(batch)
+
+    for collection, document in documents:
+        document["_chain"] = {"valid_from": block_number, "valid_to": None}
+        batches.setdefault(collection, []).append(document)
+
+        if len(batches[collection]) >= batch_size:
+            _flush(collection)
+
+    for collection in list(batches):
+        _flush(collection)
+
+    logger.info("Restored snapshot at block=%s from %s: %s", block_number, path, counts)
+
+    return block_number
+
+
+class SnapshotWriter:
+    def __init__(self, path: Union[str, Path], interval: int):
+        self.path = path
+        self.interval = interval
+        self.last_block_number = 0
+
+    def maybe_write(self, db: Database, block_number: int):
+        if block_number - self.last_block_number >= self.interval:
+            write_snapshot(db, self.path, block_number)
+            self.last_block_number = block_number
+
+
+def snapshot_block_handler(writer: SnapshotWriter) -> BlockHandler:
+    """Writes a snapshot every writer.interval blocks, apibara only calls the new
+    events handler for the blocks with events. The snapshot is taken at the
+    previous block, whose events are all applied and committed."""
+
+    async def handler(info: Info, new_block: NewBlock):
+        writer.maybe_write(info.context["db"], new_block.new_head.number - 1)
+
+    return handler
@@ -0,0 +1,561 @@
+# pylint: disable=redefined-builtin
+"""In-memory state of the indexer.
+
+With the in-memory state, the events are applied to the current members,
+proposals, bank, tokens and proposal params held in memory, instead of reading and
+writing MongoDB at each step of the handlers:
+
+- StateStorage serves the handlers' reads and updates of these collections from
+  the StateEngine, it implements the subset of the apibara storage and of the
+  MongoDB query and update operators the handlers use
+- the documents inserted in the events and votes collections are buffered
+- once all the events of a block are applied, the documents changed during the
+  block are written to MongoDB in one bulk write per collection, as new versions
+  like the apibara storage does, before apibara commits the block cursor
+
+The other collections, like the rollups, are read and written through the apibara
+storage.
+
+The state is loaded from MongoDB when the first block is handled, once apibara has
+invalidated the data of an unfinished block. The previous value of each document
+changed during a block is kept in an undo log for undo_depth blocks, a chain
+reorganization restores them while apibara rolls back MongoDB. The state is
+reloaded from MongoDB when the reorganization is deeper than the undo logs.
+
+The updates copy the top-level fields they change and share the others with the
+previous value of the document, which is what the undo logs keep.
+"""
+import copy
+from collections import defaultdict
+from functools import wraps
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from apibara import Info
+from apibara.model import NewEvents
+from bson import ObjectId
+from pymongo import InsertOne, UpdateMany, WriteConcern
+from pymongo.database import Database
+
+from dao import config, metrics
+from dao.indexer import logger
+from dao.query import get_path, matches
+
+# Collections held in memory, with the fields identifying their documents
+STATE_COLLECTIONS: dict[str, tuple[str, ...]] = {
+    "members": ("memberAddress",),
+    "proposals": ("id",),
+    "bank": ("bankAddress",),
+    "tokens": ("tokenAddress",),
+    "proposal_params": ("type",),
+}
+# Collections the handlers only insert into
+APPEND_COLLECTIONS = ("events", "votes")
+
+Document = dict[str, Any]
+Key = tuple
+
+
+def to_bson_value(value: Any) -> Any:
+    """Copies value as MongoDB stores it, the tuples become lists"""
+    if isinstance(value, dict):
+        return {name: to_bson_value(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_bson_value(item) for item in value]
+    return value
+
+
+def _get_index(array: list, array_path: str, part: str, filter: dict) -> int:
+    if part != "$":
+        return int(part)
+
+    # The positional operator updates the first item matched by the filter
+    prefix = array_path + "."
+    item_filter = {
+        path[len(prefix) :]: condition
+        for path, condition in filter.items()
+        if path.startswith(prefix)
+    }
+    if not item_filter:
+        raise ValueError(f"The filter doesn't match any item of {array_path}")
+    for index, item in enumerate(array):
+        if isinstance(item, dict) and matches(item, item_filter):
+            return index
+    raise ValueError(f"No item of {array_path} matches {item_filter}")
+
+
+def _resolve(doc: Document, path: str, filter: dict) -> tuple[Any, Any]:
+    """The container of the value at path, and its key or index in it"""
+    parts = path.split(".")
+    container: Any = doc
+    for depth, part in enumerate(parts):
+        if isinstance(container, list):
+            key: Any = _get_index(container, ".".join(parts[:depth]), part, filter)
+        else:
+            key = part
+        if depth == len(parts) - 1:
+            return container, key
+        if isinstance(container, dict) and container.get(key) is None:
+            container[key] = {}
+        container = container[key]
+
+    raise ValueError(f"Invalid path {path}")
+
+
+def _get(container: Any, key: Any) -> Any:
+    if isinstance(container, list):
+        return container[key] if key < len(container) else None
+    return container.get(key)
+
+
+def apply_update(doc: Document, update: dict, filter: dict) -> Document:
+    """The document updated with the MongoDB update operators, doc isn't modified:
+    the fields updated are copied, the others are shared with doc"""
+    updated = dict(doc)
+    copied: set[str] = set()
+
+    for op, fields in update.items():
+        for path, value in fields.items():
+            field = path.split(".")[0]
+            if field not in copied and updated.get(field) is not None:
+                nested = "." in path
+                updated[field] = (copy.deepcopy if nested else copy.copy)(
+                    updated[field]
+                )
+                copied.add(field)
+
+            container, key = _resolve(updated, path, filter)
+            value = to_bson_value(value)
+
+            if op == "$set":
+                container[key] = value
+            elif op == "$unset":
+                container.pop(key, None)
+            elif op == "$inc":
+                container[key] = (_get(container, key) or 0) + value
+            elif op == "$push":
+                if _get(container, key) is None:
+                    container[key] = []
+                container[key].append(value)
+            elif op == "$pull":
+                container[key] = [
+                    item
+                    for item in _get(container, key) or []
+                    if not (
+                        matches(item, value)
+                        if isinstance(value, dict)
+                        else item == value
+                    )
+                ]
+            else:
+                raise NotImplementedError(f"Unsupported update operator {op}")
+
+    return updated
+
+
+def _sort(docs: list[Document], sort: dict[str, int]):
+    # Sorted by the last key first, MongoDB sorts the missing and null values first
+    for path, order in reversed(sort.items()):
+        docs.sort(
+            key=lambda doc, path=path: (
+                (values := get_path(doc, path)) and values[0] is not None,
+                values[0] if values else None,
+            ),
+            reverse=order < 0,
+        )
+
+
+def _project(doc: Document, projection: Optional[dict]) -> Document:
+    if not projection:
+        return dict(doc)
+    if any(projection.values()):
+        return {
+            name: doc[name] for name in projection if projection[name] and name in doc
+        }
+    return {name: value for name, value in doc.items() if name not in projection}
+
+
+# pylint: disable=too-many-instance-attributes
+class StateEngine:
+    def __init__(self, undo_depth: int = config.finality_depth):
+        self.undo_depth = undo_depth
+        self.db: Optional[Database] = None
+        self.documents: dict[str, dict[Key, Document]] = {
+            collection: {} for collection in STATE_COLLECTIONS
+        }
+        # The block being applied
+        self.block: Optional[int] = None
+        # Previous value of the documents changed during each block, None for the
+        # documents created during the block
+        self.undo_logs: dict[int, dict[tuple[str, Key], Optional[Document]]] = {}
+        # The first block the undo logs can roll back, None until a block is applied
+        self.undo_from: Optional[int] = None
+        # Documents inserted in the append collections during the block
+        self.inserts: dict[str, list[Document]] = defaultdict(list)
+
+        # Set by the backfill mode: unordered bulk writes acknowledged with
+        # write_concern, and the documents checked by validate(collection, doc)
+        self.ordered = True
+        self.write_concern: Optional[WriteConcern] = None
+        self.validate: Optional[Callable[[str, Document], None]] = None
+
+    @staticmethod
+    def get_key(collection: str, doc: dict) -> Key:
+        # The documents are tagged with their DAO when the indexer is given DAOs
+        return (
+            doc.get("dao"),
+            *(doc.get(field) for field in STATE_COLLECTIONS[collection]),
+        )
+
+    @staticmethod
+    def get_key_filter(collection: str, key: Key) -> dict:
+        return {
+            "dao": key[0],
+            **dict(zip(STATE_COLLECTIONS[collection], key[1:])),
+        }
+
+    @property
+    def loaded(self) -> bool:
+        return self.db is not None
+
+    def load(self, db: Database):
+        """Loads the current documents of the state collections from MongoDB"""
+        self.db = db
+        for collection in STATE_COLLECTIONS:
+            docs = self.db[collection].find(
+                {"_chain.valid_to": None}, projection={"_id": False, "_chain": False}
+            )
+            self.documents[collection] = {
+                self.get_key(collection, doc): doc for doc in docs
+            }
+        self.undo_logs.clear()
+        self.undo_from = None
+        self.inserts.clear()
+
+        logger.info(
+            "Loaded the state: %s",
+            {name: len(docs) for name, docs in self.documents.items()},
+        )
+
+    def begin_block(self, block_number: int):
+        self.block = block_number
+        self.undo_logs.setdefault(block_number, {})
+        if self.undo_from is None:
+            self.undo_from = block_number
+
+    def _write(self, collection: str, key: Key, doc: Optional[Document]):
+        undo_log = self.undo_logs[self.block]
+        documents = self.documents[collection]
+        if (collection, key) not in undo_log:
+            undo_log[(collection, key)] = documents.get(key)
+
+        if doc is None:
+            documents.pop(key, None)
+        else:
+            documents[key] = doc
+
+    def _find(self, collection: str, filter: dict) -> Iterator[tuple[Key, Document]]:
+        documents = self.documents[collection]
+
+        # Looked up by key when the filter has one
+        fields = STATE_COLLECTIONS[collection]
+        if all(
+            field in filter and not isinstance(filter[field], dict) for field in fields
+        ):
+            key = self.get_key(collection, filter)
+            if (doc := documents.get(key)) is not None and matches(doc, filter):
+                yield key, doc
+            return
+
+        for key, doc in list(documents.items()):
+            if matches(doc, filter):
+                yield key, doc
+
+    def insert(self, collection: str, doc: Document):
+        # A document of the same key is replaced by a new version
+        doc = to_bson_value(doc)
+        self._write(collection, self.get_key(collection, doc), doc)
+
+    def append(self, collection: str, doc: Document):
+        self.inserts[collection].append(
+            {
+                **to_bson_value(doc),
+                "_chain": {"valid_from": self.block, "valid_to": None},
+            }
+        )
+
+    def find_one(self, collection: str, filter: dict) -> Optional[Document]:
+        for _, doc in self._find(collection, filter):
+            return dict(doc)
+        return None
+
+    # pylint: disable=too-many-arguments
+    def find(
+        self,
+        collection: str,
+        filter: dict,
+        sort: Optional[dict[str, int]] = None,
+        projection: Optional[dict] = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> list[Document]:
+        docs = [doc for _, doc in self._find(collection, filter)]
+        if sort:
+            _sort(docs, sort)
+        docs = docs[skip : skip + limit if limit else None]
+        return [_project(doc, projection) for doc in docs]
+
+    def find_one_and_update(
+        self, collection: str, filter: dict, update: dict
+    ) -> Optional[Document]:
+        for key, doc in self._find(collection, filter):
+            updated = apply_update(doc, update, filter)
+            if (new_key := self.get_key(collection, updated)) != key:
+                self._write(collection, key, None)
+            self._write(collection, new_key, updated)
+            return dict(doc)
+        return None
+
+    def find_one_and_replace(
+        self, collection: str, filter: dict, replacement: dict, upsert: bool = False
+    ) -> Optional[Document]:
+        for key, doc in self._find(collection, filter):
+            self._write(collection, key, None)
+            self.insert(collection, replacement)
+            return dict(doc)
+
+        if upsert:
+            self.insert(collection, replacement)
+        return None
+
+    def delete(self, collection: str, filter: dict, many: bool = False):
+        for key, _ in list(self._find(collection, filter)):
+            self._write(collection, key, None)
+            if not many:
+                return
+
+    def write_inserts(self, collection: str):
+        if docs := self.inserts.pop(collection, None):
+            self.db[collection].insert_many(docs)
+
+    def get_flush_operations(self, block_number: int) -> dict[str, list]:
+        operations: dict[str, list] = defaultdict(list)
+
+        for (collection, key), previous in self.undo_logs.get(block_number, {}).items():
+            current = self.documents[collection].get(key)
+            if current == previous:
+                continue
+
+            # The new version is identified so that the operations of a block can
+            # be applied in any order
+            new_id = ObjectId() if current is not None else None
+            if previous is not None:
+                operations[collection].append(
+                    UpdateMany(
+                        {
+                            **self.get_key_filter(collection, key),
+                            # Also the versions written during the block outside
+                            # of the state, like the statuses of the proposals
+                            "_id": {"$ne": new_id},
+                            "_chain.valid_to": None,
+                        },
+                        {"$set": {"_chain.valid_to": block_number}},
+                    )
+                )
+            if current is not None:
+                if self.validate is not None:
+                    self.validate(collection, current)
+                operations[collection].append(
+                    InsertOne(
+                        {
+                            **current,
+                            "_id": new_id,
+                            "_chain": {"valid_from": block_number, "valid_to": None},
+                        }
+                    )
+                )
+
+        for collection, docs in self.inserts.items():
+            if self.validate is not None:
+                for doc in docs:
+                    self.validate(
+                        collection,
+                        {
+                            name: value
+                            for name, value in doc.items()
+                            if name != "_chain"
+                        },
+                    )
+            operations[collection] += [InsertOne(doc) for doc in docs]
+
+        return operations
+
+    def flush(self, block_number: int):
+        """Writes the documents changed during the block to MongoDB"""
+        with metrics.STATE_FLUSH_LATENCY.time():
+            operations = self.get_flush_operations(block_number)
+            for collection, collection_operations in operations.items():
+                self.db[collection].with_options(
+                    write_concern=self.write_concern
+                ).bulk_write(collection_operations, ordered=self.ordered)
+                metrics.STATE_FLUSHED_OPERATIONS.inc(
+                    len(collection_operations), collection=collection
+                )
+        self.inserts.clear()
+
+        logger.debug(
+            "Flushed block %s: %s",
+            block_number,
+            {collection: len(ops) for collection, ops in operations.items()},
+        )
+
+        # The blocks deeper than undo_depth are final
+        for number in [
+            n for n in self.undo_logs if n <= block_number - self.undo_depth
+        ]:
+            del self.undo_logs[number]
+            self.undo_from = max(self.undo_from or 0, number + 1)
+
+    def rollback(self, block_number: int):
+        """Restores the state before block_number"""
+        self.inserts.clear()
+
+        if self.undo_from is None or block_number < self.undo_from:
+            logger.info(
+                "Reloading the state, block %s is deeper than the undo logs",
+                block_number,
+            )
+            self.load(self.db)
+            return
+
+        for number in sorted(self.undo_logs, reverse=True):
+            if number < block_number:
+                break
+            for (collection, key), previous in self.undo_logs.pop(number).items():
+                if previous is None:
+                    self.documents[collection].pop(key, None)
+                else:
+                    self.documents[collection][key] = previous
+
+        logger.info("Rolled back the state to block %s", block_number - 1)
+
+
+class StateStorage:
+    """apibara's Storage for the handlers, serving the state collections from the
+    engine. The documents returned must not be modified below their top-level
+    fields, which are shared with the engine."""
+
+    def __init__(self, engine: StateEngine, storage):
+        self._engine = engine
+        self._storage = storage
+
+    def _passthrough(self, collection: str):
+        # The documents buffered are written before reading or deleting any
+        if collection in APPEND_COLLECTIONS:
+            self._engine.write_inserts(collection)
+        return self._storage
+
+    async def insert_one(self, collection: str, doc: dict):
+        if collection in STATE_COLLECTIONS:
+            self._engine.insert(collection, doc)
+        elif collection in APPEND_COLLECTIONS:
+            self._engine.append(collection, doc)
+        else:
+            await self._storage.insert_one(collection, doc)
+
+    async def insert_many(self, collection: str, docs: Iterable[dict]):
+        for doc in docs:
+            await self.insert_one(collection, doc)
+
+    async def delete_one(self, collection: str, filter: dict):
+        if collection in STATE_COLLECTIONS:
+            self._engine.delete(collection, filter)
+        else:
+            await self._passthrough(collection).delete_one(collection, filter)
+
+    async def delete_many(self, collection: str, filter: dict):
+        if collection in STATE_COLLECTIONS:
+            self._engine.delete(collection, filter, many=True)
+        else:
+            await self._passthrough(collection).delete_many(collection, filter)
+
+    async def find_one(self, collection: str, filter: dict) -> Optional[dict]:
+        if collection in STATE_COLLECTIONS:
+            return self._engine.find_one(collection, filter)
+        if collection in APPEND_COLLECTIONS:
+            # Looks up the buffered documents without writing them, the applied
+            # events are looked up for each event
+            for doc in self._engine.inserts.get(collection, []):
+                if matches(doc, filter):
+                    return doc
+            return await self._storage.find_one(collection, filter)
+        return await self._passthrough(collection).find_one(collection, filter)
+
+    # pylint: disable=too-many-arguments
+    async def find(
+        self,
+        collection: str,
+        filter: dict,
+        sort: Optional[dict[str, int]] = None,
+        projection: Optional[dict] = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> Iterable[dict]:
+        if collection in STATE_COLLECTIONS:
+            return self._engine.find(collection, filter, sort, projection, skip, limit)
+        return await self._passthrough(collection).find(
+            collection, filter, sort=sort, projection=projection, skip=skip, limit=limit
+        )
+
+    async def find_one_and_replace(
+        self, collection: str, filter: dict, replacement: dict, upsert: bool = False
+    ):
+        if collection in STATE_COLLECTIONS:
+            return self._engine.find_one_and_replace(
+                collection, filter, replacement, upsert
+            )
+        return await self._passthrough(collection).find_one_and_replace(
+            collection, filter, replacement, upsert=upsert
+        )
+
+    async def find_one_and_update(self, collection: str, filter: dict, update: dict):
+        if collection in STATE_COLLECTIONS:
+            return self._engine.find_one_and_update(collection, filter, update)
+        return await self._passthrough(collection).find_one_and_update(
+            collection, filter, update
+        )
+
+
+def state_handler(new_events_handler, engine: StateEngine):
+    """Applies the events of each block to the in-memory state, then writes the
+    changes to MongoDB"""
+
+    @wraps(new_events_handler)
+    async def wrapper(info: Info, block_events: NewEvents):
+        block_number = block_events.block.number
+        if not engine.loaded:
+            engine.load(info.context["db"])
+
+        engine.begin_block(block_number)
+        try:
+            await new_events_handler(
+                Info(context=info.context, storage=StateStorage(engine, info.storage)),
+                block_events,
+            )
+            engine.flush(block_number)
+        except BaseException:
+            # The block is applied again once the indexer restarts
+            engine.rollback(block_number)
+            raise
+
+    return wrapper
+
+
+def reorg_handler(engine: StateEngine):
+    """Rolls back the in-memory state along with MongoDB"""
+
+    # pylint: disable=unused-argument
+    async def handler(info: Info, invalidated_block: int):
+        if engine.loaded:
+            engine.rollback(invalidated_block)
+
+    return handler
@@ -0,0 +1,193 @@
+# pylint: disable=redefined-builtin
+"""Materialized status of the proposals.
+
+The status of a submitted proposal depends on the time, its votes and the shares
+of the members. It is derived for each block, with the block timestamp as the
+current time, and written to the proposals as derivedStatus with derivedStatusUntil,
+the time it changes at unless an event changes it first. The proposals can then be
+filtered by status with an indexed query.
+
+At the start of every block, whether or not it has events, the status is derived
+again for the proposals whose derivedStatusUntil has passed. After the events of a
+block, it is derived again for the proposals:
+
+- whose derivedStatusUntil has passed
+- updated during the block, or never derived
+- voted during the block
+- submitted, when a member was updated during the block, the votable shares and
+  the weight of the votes depend on the members
+
+The status is written through the apibara storage, a chain reorganization rolls
+it back with the rest of the proposal.
+"""
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Optional
+
+from apibara import Info
+from apibara.model import BlockHeader, NewBlock, NewEvents
+
+from dao import utils
+from dao.graphql.storage import get_votable_members_query
+from dao.indexer import logger
+from dao.models import (
+    ProposalRawStatus,
+    ProposalStatus,
+    get_status_ending_at,
+    get_submitted_status,
+)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # pymongo returns naive datetimes
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _percentage(part: int, total: int) -> float:
+    return round(part / total * 100, 2) if total else 0
+
+
+def _scope(proposal: dict) -> dict:
+    # The votes and members of the proposal's DAO
+    return {"dao": proposal["dao"]} if "dao" in proposal else {}
+
+
+async def get_votes_totals(info: Info, proposal: dict) -> tuple[int, int]:
+    """The shares of the members who voted yes and no"""
+    votes = await info.storage.find(
+        "votes", {"proposalId": proposal["id"], **_scope(proposal)}
+    )
+    voters = {vote["voterAddress"]: vote["vote"] for vote in votes}
+
+    members = await info.storage.find(
+        "members", {"memberAddress": {"$in": list(voters)}, **_scope(proposal)}
+    )
+    totals = {True: 0, False: 0}
+    for member in members:
+        totals[voters[member["memberAddress"]]] += member["shares"]
+
+    return totals[True], totals[False]
+
+
+async def get_total_votable_shares(
+    info: Info, proposal: dict, voting_period_ending_at: datetime
+) -> int:
+    query = get_votable_members_query(
+        voting_period_ending_at=voting_period_ending_at,
+        submitted_at=proposal["submittedAt"],
+    )
+    members = await info.storage.find("members", {**query, **_scope(proposal)})
+    return sum(member["shares"] for member in members)
+
+
+async def derive_status(
+    info: Info, proposal: dict, now: datetime
+) -> tuple[ProposalStatus, Optional[datetime]]:
+    """The status of the proposal at now and the time it changes at"""
+    submitted_at = _as_utc(proposal["submittedAt"])
+    voting_period_ending_at = submitted_at + timedelta(
+        minutes=proposal["votingDuration"]
+    )
+    grace_period_ending_at = voting_period_ending_at + timedelta(
+        minutes=proposal["graceDuration"]
+    )
+
+    raw_status = ProposalRawStatus(proposal["rawStatus"])
+    if raw_status is ProposalRawStatus.APPROVED:
+        return ProposalStatus.APPROVED, None
+    if raw_status is ProposalRawStatus.REJECTED:
+        return ProposalStatus.REJECTED, None
+    if raw_status is not ProposalRawStatus.SUBMITTED:
+        return ProposalStatus.UNKNOWN, None
+
+    # Only read once the voting period has ended
+    votes: dict[str, float] = {}
+    if now >= voting_period_ending_at:
+        yes, no = await get_votes_totals(info, proposal)
+        total_votable_shares = await get_total_votable_shares(
+            info, proposal, voting_period_ending_at
+        )
+        votes["majority"] = _percentage(yes, yes + no)
+        votes["quorum"] = _percentage(yes + no, total_votable_shares)
+
+    status = get_submitted_status(
+        now=now,
+        voting_period_ending_at=voting_period_ending_at,
+        grace_period_ending_at=grace_period_ending_at,
+        is_approved=lambda: (
+            votes["majority"] >= proposal["majority"]
+            and votes["quorum"] >= proposal["quorum"]
+        ),
+    )
+    return status, get_status_ending_at(
+        status, voting_period_ending_at, grace_period_ending_at
+    )
+
+
+async def find_stale_proposals(
+    info: Info, block: BlockHeader, now: datetime
+) -> list[dict]:
+    filters = [
+        {"derivedStatusUntil": {"$lte": now}},
+        {"derivedStatus": None},
+        {"_chain.valid_from": block.number},
+    ]
+
+    for vote in await info.storage.find("votes", {"_chain.valid_from": block.number}):
+        filters.append({"id": vote["proposalId"], **_scope(vote)})
+
+    if list(
+        await info.storage.find("members", {"_chain.valid_from": block.number}, limit=1)
+    ):
+        filters.append({"rawStatus": ProposalRawStatus.SUBMITTED.value})
+
+    return list(await info.storage.find("proposals", {"$or": filters}))
+
+
+async def refresh_statuses(info: Info, block: BlockHeader) -> int:
+    """Writes the status of the stale proposals, returns the number of proposals
+    whose status changed"""
+    now = utils.get_block_datetime_utc(block)
+
+    changed = 0
+    for proposal in await find_stale_proposals(info, block, now):
+        status, until = await derive_status(info, proposal, now)
+        previous_until = proposal.get("derivedStatusUntil")
+        if (
+            proposal.get("derivedStatus") == status.value
+            and (previous_until if previous_until is None else _as_utc(previous_until))
+            == until
+        ):
+            continue
+
+        logger.debug(
+            "Deriving status=%s until=%s for proposal %s", status, until, proposal["id"]
+        )
+        await info.storage.find_one_and_update(
+            collection="proposals",
+            filter={"id": proposal["id"], **_scope(proposal)},
+            update={
+                "$set": {"derivedStatus": status.value, "derivedStatusUntil": until}
+            },
+        )
+        changed += 1
+
+    return changed
+
+
+def status_handler(new_events_handler):
+    """Derives the status of the proposals once all the events of the block are
+    applied"""
+
+    @wraps(new_events_handler)
+    async def wrapper(info: Info, block_events: NewEvents):
+        await new_events_handler(info, block_events)
+        await refresh_statuses(info, block_events.block)
+
+    return wrapper
+
+
+async def status_block_handler(info: Info, new_block: NewBlock):
+    """Derives the statuses changed by the time, apibara only calls the new events
+    handler for the blocks with events"""
+    await refresh_statuses(info, new_block.new_head)
@@ -4,8 +4,8 @@ from typing import Optional
 from apibara import Info
 from apibara.model import BlockHeader
 
-from dao import config, utils
-from dao.indexer import logger
+from dao import utils
+from dao.indexer import daos, logger, rollups
 
 
 async def update_proposal(
@@ -38,6 +38,7 @@ async def update_member(
         update=update,
     )
     logger.debug("Existing member %s", existing)
+    return existing
 
 
 async def get_member(
@@ -62,7 +63,7 @@ async def update_bank(
     if filter is None:
         filter = {}
 
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = daos.get_dao(info).bank_address
 
     # Create bank if not exists
     if not await info.storage.find_one("bank", {"bankAddress": bank_address}):
@@ -85,7 +86,7 @@ async def get_bank(info: Info, filter: Optional[dict] = None):
     if filter is None:
         filter = {}
 
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = daos.get_dao(info).bank_address
     bank = await info.storage.find_one("bank", {"bankAddress": bank_address, **filter})
     return bank
 
@@ -95,7 +96,7 @@ async def add_token_if_not_exists(
 ):
     token_address_filter = {"balances.tokenAddress": token_address}
 
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = daos.get_dao(info).bank_address
     if member_address == bank_address:
         bank = await get_bank(info=info, filter=token_address_filter)
         # The bank doesn't have the token in its balances list
@@ -138,11 +139,37 @@ async def add_token_if_not_exists(
             )
 
 
+async def get_token(info: Info, token_address: bytes) -> Optional[dict]:
+    return await info.storage.find_one("tokens", {"tokenAddress": token_address})
+
+
 async def get_token_name(info: Info, token_address: bytes) -> Optional[str]:
-    bank = await get_bank(info) or {}
-    for whitelisted_token in bank.get("whitelistedTokens", []):
-        if whitelisted_token["tokenAddress"] == token_address:
-            return whitelisted_token["tokenName"]
+    token = await get_token(info=info, token_address=token_address)
+    if token is not None:
+        return token["tokenName"]
+
+
+async def upsert_token(token_address: bytes, token: dict, info: Info):
+    """Sets the fields of the token in the tokens registry, creating it if it
+    doesn't exist"""
+    if not await get_token(info=info, token_address=token_address):
+        token = {
+            "tokenAddress": token_address,
+            "whitelistedAt": None,
+            "unWhitelistedAt": None,
+            **token,
+        }
+        logger.debug("Token not found, creating it with %s", token)
+        await info.storage.insert_one("tokens", token)
+        return
+
+    logger.debug("Updating token %s with %s", token_address, token)
+    existing = await info.storage.find_one_and_update(
+        collection="tokens",
+        filter={"tokenAddress": token_address},
+        update={"$set": token},
+    )
+    logger.debug("Existing token %s", existing)
 
 
 async def update_balance(
@@ -152,7 +179,7 @@ async def update_balance(
     token_address: bytes,
     amount: int,
 ):
-    bank_address = utils.int_to_bytes(config.bank_address)
+    bank_address = daos.get_dao(info).bank_address
     token_name = await get_token_name(token_address=token_address, info=info)
 
     await add_token_if_not_exists(
@@ -176,6 +203,12 @@ async def update_balance(
 
     if member_address == bank_address:
         await update_bank(info=info, update=add_amount, filter=add_amount_filter)
+        await rollups.update_treasury_rollups(
+            info=info,
+            timestamp=utils.get_block_datetime_utc(block),
+            token_address=token_address,
+            amount=amount,
+        )
     else:
         await update_member(
             info=info,
@@ -1,15 +1,18 @@
-"""Apibara indexer entrypoint."""
-# pylint: disable=too-many-arguments,too-many-locals
+"""Apibara indexer entrypoint.
+
+Each command imports its own stack when it runs: the GraphQL server doesn't need
+apibara nor starknet_py, and the indexer doesn't need strawberry. Keep the
+module-level imports light, tests/test_main.py checks the startup of every command.
+"""
+# pylint: disable=too-many-arguments,too-many-locals,import-outside-toplevel
 import asyncio
+import time
 from functools import wraps
 
 import click
-from apibara.model import EventFilter
-from starknet_py.net.gateway_client import GatewayClient
+from pymongo import MongoClient
 
-from dao import config, utils
-from dao.graphql import main as graphql_main
-from dao.indexer import main as indexer_main
+from dao import config
 
 
 def async_command(coro):
@@ -55,8 +58,14 @@ def cli():
 )
 @click.option(
     "--contract-address",
+    "contract_addresses",
     required=True,
-    help="The contract address of the events.",
+    multiple=True,
+    help=(
+        "The contract address of a DAO to index, as <contract> or"
+        " <contract>:<bank> when its bank address differs from the config one. Can be"
+        " repeated to index several DAOs."
+    ),
 )
 @click.option(
     "--events",
@@ -65,6 +74,110 @@ def cli():
         " contract address."
     ),
 )
+@click.option(
+    "--abi-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help=(
+        "The contract's ABI, the events are listed and decoded without fetching the"
+        " contract from the gateway."
+    ),
+)
+@click.option(
+    "--abi-cache-dir",
+    type=click.Path(file_okay=False),
+    default=config.abi_cache_dir,
+    show_default=True,
+    help="Directory where the contracts' ABIs are cached by class hash.",
+)
+@click.option(
+    "--metrics-host",
+    default="localhost",
+    show_default=True,
+    help="Metrics server host.",
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    help="Serve Prometheus metrics on this port, disabled if not set.",
+)
+@click.option(
+    "--pipeline-queue-size",
+    type=int,
+    default=config.pipeline_queue_size,
+    show_default=True,
+    help=(
+        "Number of events in flight between the decode, enrich and apply stages,"
+        " 0 handles the events sequentially."
+    ),
+)
+@click.option(
+    "--concurrent-handlers",
+    is_flag=True,
+    show_default=True,
+    help=(
+        "Apply the events of a block concurrently when they touch different"
+        " proposals, members or the bank."
+    ),
+)
+@click.option(
+    "--snapshot-path",
+    type=click.Path(dir_okay=False),
+    help="Periodically write a snapshot of the indexed state to this file.",
+)
+@click.option(
+    "--snapshot-interval",
+    type=int,
+    default=config.snapshot_interval,
+    show_default=True,
+    help="Number of blocks between two snapshots.",
+)
+@click.option(
+    "--from-snapshot",
+    type=click.Path(exists=True, dir_okay=False),
+    help=(
+        "Restore the indexed state from this snapshot and resume indexing from the"
+        " snapshot block, cannot be used with --restart."
+    ),
+)
+@click.option(
+    "--compaction-interval",
+    type=int,
+    help=(
+        "Compact the superseded versions of the documents every this many blocks,"
+        " disabled if not set."
+    ),
+)
+@click.option(
+    "--finality-depth",
+    type=int,
+    default=config.finality_depth,
+    show_default=True,
+    help="Number of blocks after which a block is considered final.",
+)
+@click.option(
+    "--archive-versions",
+    is_flag=True,
+    show_default=True,
+    help="Move the compacted versions to archive collections instead of deleting them.",
+)
+@click.option(
+    "--in-memory-state",
+    is_flag=True,
+    show_default=True,
+    help=(
+        "Apply the events to the members, proposals, bank and tokens held in memory,"
+        " and write the changes of each block to MongoDB in bulk."
+    ),
+)
+@click.option(
+    "--backfill-threshold",
+    type=int,
+    help=(
+        "Index without the server-side validation, the indexes of the queries and"
+        " with w=1 while more than this many blocks behind the chain head,"
+        " disabled if not set."
+    ),
+)
 @async_command
 async def start_indexer(
     server_url,
@@ -72,19 +185,60 @@ async def start_indexer(
     starknet_network_url,
     restart,
     ssl,
-    contract_address,
+    contract_addresses,
     events=None,
+    abi_file=None,
+    abi_cache_dir=config.abi_cache_dir,
+    metrics_host="localhost",
+    metrics_port=None,
+    pipeline_queue_size=0,
+    concurrent_handlers=False,
+    snapshot_path=None,
+    snapshot_interval=config.snapshot_interval,
+    from_snapshot=None,
+    compaction_interval=None,
+    finality_depth=config.finality_depth,
+    archive_versions=False,
+    in_memory_state=False,
+    backfill_threshold=None,
 ):
     """Start the Apibara indexer."""
-    starknet_client = GatewayClient(starknet_network_url)
+    from apibara.model import EventFilter
+
+    from dao import utils
+    from dao.indexer import gateway, logger
+    from dao.indexer import main as indexer_main
+    from dao.models import Dao
 
-    contract = await utils.get_contract(contract_address, starknet_client)
-    contract_events = utils.get_contract_events(contract)
+    started_at = time.perf_counter()
 
-    if events is None:
-        events = contract_events.keys()
+    abi = utils.load_abi(abi_file) if abi_file is not None else None
 
-    filters = [EventFilter.from_event_name(name, contract_address) for name in events]
+    try:
+        daos = [Dao.parse(address) for address in contract_addresses]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--contract-address")
+
+    filters = []
+    async with gateway.create_gateway_client(starknet_network_url) as starknet_client:
+        for dao in daos:
+            # The contracts sharing a class share the cached ABI
+            contract = await utils.get_contract(
+                dao.hex_address, starknet_client, abi=abi, cache_dir=abi_cache_dir
+            )
+            contract_events = utils.get_contract_events(contract)
+
+            names = events if events is not None else contract_events.keys()
+            filters += [
+                EventFilter.from_event_name(name, dao.hex_address) for name in names
+            ]
+
+    logger.info(
+        "Built %s event filters in %.3fs, abi_file=%s",
+        len(filters),
+        time.perf_counter() - started_at,
+        abi_file,
+    )
 
     await indexer_main.run_indexer(
         server_url=server_url,
@@ -93,6 +247,21 @@ async def start_indexer(
         restart=restart,
         ssl=ssl,
         filters=filters,
+        daos=daos,
+        abi=abi,
+        abi_cache_dir=abi_cache_dir,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        pipeline_queue_size=pipeline_queue_size,
+        concurrent_handlers=concurrent_handlers,
+        snapshot_path=snapshot_path,
+        snapshot_interval=snapshot_interval,
+        from_snapshot=from_snapshot,
+        compaction_interval=compaction_interval,
+        finality_depth=finality_depth,
+        archive_versions=archive_versions,
+        in_memory_state=in_memory_state,
+        backfill_threshold=backfill_threshold,
     )
 
 
@@ -118,12 +287,181 @@ async def start_indexer(
     show_default=True,
     help="GraphQL server port.",
 )
+@click.option(
+    "--read-model",
+    is_flag=True,
+    show_default=True,
+    help=(
+        "Serve the queries of the current state from the members, proposals, bank,"
+        " tokens and votes held in memory, synced with the indexed blocks."
+    ),
+)
 @async_command
-async def start_graphql(mongo_url, db_name, host, port):
+async def start_graphql(mongo_url, db_name, host, port, read_model=False):
     """Start the GraphQL server."""
+    from dao.graphql import main as graphql_main
+
     await graphql_main.run_graphql(
         mongo_url=mongo_url,
         db_name=db_name,
         host=host,
         port=port,
+        read_model=read_model,
+    )
+
+
+@cli.command()
+@click.option(
+    "--mongo-url", default=config.mongo_url, show_default=True, help="MongoDB URL."
+)
+@click.option(
+    "--indexer-id",
+    default=config.indexer_id,
+    show_default=True,
+    help="Id of the indexer whose database is compacted.",
+)
+@click.option(
+    "--finality-depth",
+    type=int,
+    default=config.finality_depth,
+    show_default=True,
+    help="Number of blocks after which a block is considered final.",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=config.compaction_batch_size,
+    show_default=True,
+    help="Maximum number of versions compacted at once in each collection.",
+)
+@click.option(
+    "--archive",
+    is_flag=True,
+    show_default=True,
+    help="Move the compacted versions to archive collections instead of deleting them.",
+)
+def compact(mongo_url, indexer_id, finality_depth, batch_size, archive):
+    """Compact the versions of the documents superseded before the last final
+    block."""
+    from dao.indexer import compaction
+
+    mongo = MongoClient(mongo_url, tz_aware=True)
+    db = mongo[indexer_id.replace("-", "_")]
+
+    indexed_block = compaction.get_indexed_block(db, indexer_id)
+    if indexed_block is None:
+        raise click.ClickException(f"Indexer {indexer_id} has not indexed any block")
+
+    counts = compaction.compact(
+        db,
+        finalized_block=indexed_block - finality_depth,
+        batch_size=batch_size,
+        archive=archive,
+    )
+
+    for collection, count in counts.items():
+        click.echo(f"{collection}: {count} versions compacted")
+
+
+@cli.command()
+@click.option(
+    "--mongo-url", default=config.mongo_url, show_default=True, help="MongoDB URL."
+)
+@click.option(
+    "--indexer-id",
+    default=config.indexer_id,
+    show_default=True,
+    help="Id of the indexer whose database is exported.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    required=True,
+    help="Directory where the datasets are written.",
+)
+@click.option(
+    "--datasets",
+    help=(
+        "The list of the datasets to export, defaults to events, members, proposals"
+        " and transactions."
+    ),
+)
+@click.option(
+    "--since-block",
+    type=int,
+    help=(
+        "First block to export, defaults to the block following the last export to"
+        " the output directory."
+    ),
+)
+@click.option(
+    "--finality-depth",
+    type=int,
+    default=config.finality_depth,
+    show_default=True,
+    help="Only the blocks this deep in the chain are exported, they can't be reverted.",
+)
+@click.option(
+    "--partition-size",
+    type=int,
+    default=config.export_partition_size,
+    show_default=True,
+    help="Number of blocks exported to each file.",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=config.export_batch_size,
+    show_default=True,
+    help="Number of documents read from MongoDB at once.",
+)
+def export(
+    mongo_url,
+    indexer_id,
+    output_dir,
+    datasets,
+    since_block,
+    finality_depth,
+    partition_size,
+    batch_size,
+):
+    """Export the indexed data to gzipped NDJSON files partitioned by block."""
+    from dao.indexer import compaction
+    from dao.indexer import export as export_
+
+    mongo = MongoClient(mongo_url, tz_aware=True)
+    db = mongo[indexer_id.replace("-", "_")]
+
+    if datasets is not None:
+        datasets = datasets.split(",")
+        if unknown := set(datasets) - set(export_.DATASETS):
+            raise click.BadParameter(
+                f"Unknown datasets {sorted(unknown)}", param_hint="--datasets"
+            )
+
+    indexed_block = compaction.get_indexed_block(db, indexer_id)
+    if indexed_block is None:
+        raise click.ClickException(f"Indexer {indexer_id} has not indexed any block")
+
+    if since_block is None:
+        watermark = export_.read_watermark(output_dir)
+        since_block = 0 if watermark is None else watermark + 1
+
+    to_block = indexed_block - finality_depth
+    if since_block > to_block:
+        click.echo(f"Nothing to export, the last final block is {to_block}")
+        return
+
+    counts = export_.export(
+        db,
+        output_dir,
+        from_block=since_block,
+        to_block=to_block,
+        datasets=datasets,
+        partition_size=partition_size,
+        batch_size=batch_size,
     )
+    export_.write_watermark(output_dir, to_block)
+
+    for dataset, count in counts.items():
+        click.echo(f"{dataset}: {count} rows exported")
@@ -0,0 +1,237 @@
+"""Prometheus-style metrics, rendered in the text exposition format.
+
+Only counters, gauges and histograms are supported, which is all the indexer needs,
+so we don't pull in a client library for it.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelValues = tuple[str, ...]
+
+
+class Metric:
+    type_ = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+        REGISTRY.append(self)
+
+    def _label_values(self, labels: dict) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def clear(self):
+        self._values.clear()
+
+    def _format_labels(self, label_values: LabelValues, **extra) -> str:
+        pairs = list(zip(self.labelnames, label_values)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def samples(self) -> Iterator[str]:
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{self._format_labels(label_values)} {value}"
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_ = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_ = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts: dict[LabelValues, list[int]] = {}
+        self._counts: dict[LabelValues, int] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        bucket_counts = self._bucket_counts.setdefault(key, [0] * len(self.buckets))
+        index = bisect_left(self.buckets, value)
+        if index < len(bucket_counts):
+            bucket_counts[index] += 1
+        self._counts[key] = self._counts.get(key, 0) + 1
+        # _values holds the sum of the observations
+        self._values[key] = self._values.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        return self._counts.get(self._label_values(labels), 0)
+
+    def clear(self):
+        super().clear()
+        self._bucket_counts.clear()
+        self._counts.clear()
+
+    def samples(self) -> Iterator[str]:
+        for label_values, bucket_counts in sorted(self._bucket_counts.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = self._format_labels(label_values, le=bound)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+
+            labels = self._format_labels(label_values, le="+Inf")
+            yield f"{self.name}_bucket{labels} {self._counts[label_values]}"
+
+            labels = self._format_labels(label_values)
+            yield f"{self.name}_sum{labels} {self._values[label_values]}"
+            yield f"{self.name}_count{labels} {self._counts[label_values]}"
+
+
+REGISTRY: list[Metric] = []
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+BLOCKS_PROCESSED = Counter(
+    "dao_indexer_blocks_processed_total", "Blocks handled by the indexer."
+)
+EVENTS_PROCESSED = Counter(
+    "dao_indexer_events_total", "Events handled by the indexer.", ["event"]
+)
+BLOCK_LATENCY = Histogram(
+    "dao_indexer_block_duration_seconds",
+    "Time spent handling the events of a block.",
+    ["mode"],
+)
+HANDLER_LATENCY = Histogram(
+    "dao_indexer_handler_duration_seconds",
+    "Time spent applying an event to the storage.",
+    ["event"],
+)
+MONGO_OPERATIONS = Counter(
+    "dao_indexer_mongo_operations_total",
+    "Storage operations issued by the indexer.",
+    ["collection", "operation"],
+)
+MONGO_LATENCY = Histogram(
+    "dao_indexer_mongo_operation_duration_seconds",
+    "Latency of the storage operations issued by the indexer.",
+    ["collection", "operation"],
+)
+GATEWAY_LATENCY = Histogram(
+    "dao_gateway_request_duration_seconds",
+    "Latency of the requests sent to the Starknet gateway.",
+    ["method"],
+)
+GATEWAY_REQUEST_LATENCY = Histogram(
+    "dao_gateway_http_request_duration_seconds",
+    "Latency of each HTTP request sent to the Starknet gateway, retries included.",
+    ["method", "result"],
+)
+GATEWAY_RETRIES = Counter(
+    "dao_gateway_retries_total",
+    "Gateway requests retried after a transient error.",
+    ["method"],
+)
+GATEWAY_REJECTED = Counter(
+    "dao_gateway_rejected_total",
+    "Gateway requests rejected while the circuit breaker was open.",
+    ["method"],
+)
+GATEWAY_IN_FLIGHT = Gauge(
+    "dao_gateway_requests_in_flight", "Requests waiting for the Starknet gateway."
+)
+GATEWAY_CIRCUIT_OPEN = Gauge(
+    "dao_gateway_circuit_open", "1 while the gateway circuit breaker is open."
+)
+GATEWAY_CACHE_LOOKUPS = Counter(
+    "dao_gateway_cache_lookups_total",
+    "Lookups in the gateway response caches.",
+    ["method", "result"],
+)
+GATEWAY_CACHE_HIT_RATIO = Gauge(
+    "dao_gateway_cache_hit_ratio",
+    "Ratio of the gateway lookups served from the cache.",
+    ["method"],
+)
+STATE_FLUSH_LATENCY = Histogram(
+    "dao_indexer_state_flush_duration_seconds",
+    "Time spent writing the in-memory state changes of a block to MongoDB.",
+)
+STATE_FLUSHED_OPERATIONS = Counter(
+    "dao_indexer_state_flushed_operations_total",
+    "Write operations of the in-memory state flushes.",
+    ["collection"],
+)
+INDEXED_BLOCK = Gauge("dao_indexer_block", "Last block handled by the indexer.")
+CHAIN_HEAD_BLOCK = Gauge("dao_chain_head_block", "Latest block known by the gateway.")
+BLOCK_LAG = Gauge(
+    "dao_indexer_block_lag", "Number of blocks the indexer is behind the chain head."
+)
+BACKFILL_MODE = Gauge(
+    "dao_indexer_backfill", "1 while the indexer is in backfill mode."
+)
+
+
+def record_cache_lookup(method: str, hit: bool):
+    GATEWAY_CACHE_LOOKUPS.inc(method=method, result="hit" if hit else "miss")
+
+    hits = GATEWAY_CACHE_LOOKUPS.get(method=method, result="hit")
+    misses = GATEWAY_CACHE_LOOKUPS.get(method=method, result="miss")
+    GATEWAY_CACHE_HIT_RATIO.set(hits / (hits + misses), method=method)
+
+
+def update_block_lag():
+    head = CHAIN_HEAD_BLOCK.get()
+    if head:
+        BLOCK_LAG.set(max(head - INDEXED_BLOCK.get(), 0))
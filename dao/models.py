@@ -1,6 +1,9 @@
+from dataclasses import dataclass
+from datetime import datetime
 from enum import Enum
+from typing import Callable, Optional
 
-import strawberry
+from dao import config, utils
 
 
 class ProposalRawStatus(Enum):
@@ -12,7 +15,8 @@ class ProposalRawStatus(Enum):
     FORCED = "forced"
 
 
-@strawberry.enum
+# Exposed as a GraphQL enum by dao.graphql.proposals, strawberry isn't imported here
+# to keep it out of the indexer
 class ProposalStatus(Enum):
     VOTING_PERIOD = "Voting Period"
     GRACE_PERIOD = "Grace Period"
@@ -30,3 +34,87 @@ class ProposalStatus(Enum):
             ProposalStatus.REJECTED_READY,
             ProposalStatus.APPROVED_READY,
         ]
+
+
+def get_submitted_status(
+    now: datetime,
+    voting_period_ending_at: datetime,
+    grace_period_ending_at: datetime,
+    is_approved: Callable[[], bool],
+) -> ProposalStatus:
+    """The status of a submitted proposal at now, is_approved is only called once
+    the voting period has ended"""
+    if now < voting_period_ending_at:
+        return ProposalStatus.VOTING_PERIOD
+
+    if is_approved():
+        if now < grace_period_ending_at:
+            return ProposalStatus.GRACE_PERIOD
+        return ProposalStatus.APPROVED_READY
+
+    return ProposalStatus.REJECTED_READY
+
+
+def get_status_ending_at(
+    status: ProposalStatus,
+    voting_period_ending_at: datetime,
+    grace_period_ending_at: datetime,
+) -> Optional[datetime]:
+    """When the status of a proposal changes with time, None if it only changes
+    with the events"""
+    if status is ProposalStatus.VOTING_PERIOD:
+        return voting_period_ending_at
+    if status is ProposalStatus.GRACE_PERIOD:
+        return grace_period_ending_at
+    return None
+
+
+class ProposalOrderField(Enum):
+    """The fields the proposals can be sorted by, the computed ones are listed in
+    dao.graphql.storage.PROPOSAL_COMPUTED_FIELDS"""
+
+    ID = "id"
+    SUBMITTED_AT = "submittedAt"
+    VOTING_PERIOD_ENDING_AT = "votingPeriodEndingAt"
+    GRACE_PERIOD_ENDING_AT = "gracePeriodEndingAt"
+    PROCESSED_AT = "processedAt"
+    TIME_REMAINING = "timeRemaining"
+    YES_VOTES_TOTAL = "yesVotesTotal"
+    NO_VOTES_TOTAL = "noVotesTotal"
+
+
+class OrderDirection(Enum):
+    ASC = 1
+    DESC = -1
+
+
+class RollupPeriod(Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+@dataclass(frozen=True)
+class Dao:
+    """A DAO indexed by the indexer, its documents are tagged with its contract
+    address in their "dao" field"""
+
+    address: bytes
+    bank_address: bytes
+
+    @classmethod
+    def parse(cls, value: str) -> "Dao":
+        """Parses "<contract>[:<bank>]", the bank address defaults to the config
+        one"""
+        address, *modules = value.split(":")
+        if len(modules) > 1:
+            raise ValueError(f"Invalid DAO {value!r}, expected <contract>[:<bank>]")
+
+        bank = int(modules[0], 16) if modules else config.bank_address
+        return cls(
+            address=utils.int_to_bytes(int(address, 16)),
+            bank_address=utils.int_to_bytes(bank),
+        )
+
+    @property
+    def hex_address(self) -> str:
+        return "0x" + self.address.hex()
@@ -0,0 +1,94 @@
+# pylint: disable=redefined-builtin
+"""Evaluation of MongoDB filters on the documents held in memory, by the indexer's
+in-memory state and the GraphQL read model.
+
+Only the operators used by the handlers and the GraphQL queries are supported.
+"""
+import operator
+from typing import Any, Callable
+
+Document = dict[str, Any]
+
+ORDERINGS: dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+
+def get_path(doc: Document, path: str) -> list:
+    """The values at the dotted path, traversing the arrays along the path"""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                next_values.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    next_values.append(value[int(part)])
+                next_values += [
+                    item[part]
+                    for item in value
+                    if isinstance(item, dict) and part in item
+                ]
+        values = next_values
+    return values
+
+
+# pylint: disable=too-many-return-statements
+def _match_operator(values: list, op: str, argument: Any) -> bool:
+    # The arrays match if any of their items does
+    candidates = values + [
+        item for value in values if isinstance(value, list) for item in value
+    ]
+
+    if op == "$eq":
+        if argument is None:
+            return not values or None in candidates
+        return argument in candidates
+    if op == "$ne":
+        return not _match_operator(values, "$eq", argument)
+    if op == "$in":
+        return any(_match_operator(values, "$eq", item) for item in argument)
+    if op == "$nin":
+        return not _match_operator(values, "$in", argument)
+    if op == "$exists":
+        return bool(values) == bool(argument)
+    if op in ORDERINGS:
+        for candidate in candidates:
+            try:
+                if candidate is not None and ORDERINGS[op](candidate, argument):
+                    return True
+            except TypeError:
+                continue
+        return False
+
+    raise NotImplementedError(f"Unsupported query operator {op}")
+
+
+def matches(doc: Document, filter: dict) -> bool:
+    """Whether doc matches the MongoDB filter"""
+    for path, condition in filter.items():
+        if path == "$or":
+            if not any(matches(doc, item) for item in condition):
+                return False
+        elif path == "$and":
+            if not all(matches(doc, item) for item in condition):
+                return False
+        elif path.startswith("$"):
+            raise NotImplementedError(f"Unsupported query operator {path}")
+        else:
+            values = get_path(doc, path)
+            if isinstance(condition, dict) and any(
+                name.startswith("$") for name in condition
+            ):
+                if not all(
+                    _match_operator(values, op, argument)
+                    for op, argument in condition.items()
+                ):
+                    return False
+            elif not _match_operator(values, "$eq", condition):
+                return False
+    return True
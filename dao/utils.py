@@ -1,13 +1,22 @@
+import json
 from collections import ChainMap
 from datetime import datetime, timezone
 from functools import lru_cache, wraps
-from typing import Callable, Iterable, Union
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Union
 
-from apibara.model import BlockHeader
 from cachetools import LRUCache, keys
-from starknet_py.contract import Contract
-from starknet_py.net.client_models import GatewayBlock
-from starknet_py.net.gateway_client import GatewayClient
+
+from dao import metrics
+
+# pylint: disable=import-outside-toplevel
+# The GraphQL server uses the conversion helpers only, starknet_py and apibara are
+# imported where needed to keep them out of its startup
+if TYPE_CHECKING:
+    from apibara.model import BlockHeader
+    from starknet_py.contract import Contract
+    from starknet_py.net.client_models import GatewayBlock
+    from starknet_py.net.gateway_client import GatewayClient
 
 
 # TODO: check https://docs.openzeppelin.com/contracts-cairo/0.3.1/utilities
@@ -69,6 +78,7 @@ def async_cached(cache, key=keys.hashkey):
 
     This is a replacement for `@cached()` decorator from cachetools.
     cachetools does not support async at the time of writing.
+    Cache hits and misses are recorded in metrics under the function name.
 
     Source: https://github.com/aiocoro/async-cached
     """
@@ -78,9 +88,12 @@ def async_cached(cache, key=keys.hashkey):
         async def wrapper(*args, **kwargs):
             k = key(*args, **kwargs)
             try:
-                return cache[k]
+                v = cache[k]
+                metrics.record_cache_lookup(func.__name__, hit=True)
+                return v
             except KeyError:
                 pass
+            metrics.record_cache_lookup(func.__name__, hit=False)
             v = await func(*args, **kwargs)
             try:
                 cache[k] = v
@@ -93,17 +106,70 @@ def async_cached(cache, key=keys.hashkey):
     return decorator
 
 
-@async_cached(cache=LRUCache(maxsize=128))
-async def get_contract(address, client: GatewayClient) -> Contract:
-    return await Contract.from_address(address, client=client)
+def load_abi(path: Union[str, Path]) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_abi_cache_path(address, class_hash: int, cache_dir: Union[str, Path]) -> Path:
+    from starknet_py.net.models.address import parse_address
+
+    return Path(cache_dir) / f"{parse_address(address):#066x}-{class_hash:#066x}.json"
+
+
+# Contracts are cached by address, the abi and cache_dir aren't part of the key
+@async_cached(
+    cache=LRUCache(maxsize=128),
+    key=lambda address, client, abi=None, cache_dir=None: keys.hashkey(address, client),
+)
+async def get_contract(
+    address,
+    client: "GatewayClient",
+    abi: Optional[list] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> "Contract":
+    """Creates the contract from abi if given, otherwise from the ABI cached in
+    cache_dir if any, and falls back to fetching its class from the gateway.
+
+    The cached ABIs are keyed by the contract's class hash, which is the only
+    thing fetched from the gateway when the ABI is already cached.
+    """
+    from starknet_py.contract import Contract
+
+    cache_path = None
+
+    if abi is None and cache_dir is not None:
+        with metrics.GATEWAY_LATENCY.time(method="get_class_hash_at"):
+            class_hash = await client.get_class_hash_at(address)
+
+        cache_path = get_abi_cache_path(address, class_hash, cache_dir)
+        if cache_path.exists():
+            abi = load_abi(cache_path)
+
+    if abi is not None:
+        return Contract(address=address, abi=abi, client=client)
+
+    with metrics.GATEWAY_LATENCY.time(method="get_contract"):
+        contract = await Contract.from_address(address, client=client)
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(contract.data.abi, f)
+
+    return contract
 
 
 @async_cached(cache=LRUCache(maxsize=128))
-async def get_block(block_number: int, client: GatewayClient) -> GatewayBlock:
-    return await client.get_block(block_number=block_number)
+async def get_block(block_number: int, client: "GatewayClient") -> "GatewayBlock":
+    with metrics.GATEWAY_LATENCY.time(method="get_block"):
+        return await client.get_block(block_number=block_number)
+
 
+def get_block_datetime_utc(block: Union["GatewayBlock", "BlockHeader"]) -> datetime:
+    from apibara.model import BlockHeader
+    from starknet_py.net.client_models import GatewayBlock
 
-def get_block_datetime_utc(block: Union[GatewayBlock, BlockHeader]) -> datetime:
     if isinstance(block, GatewayBlock):
         return datetime.fromtimestamp(block.timestamp, timezone.utc)
 
@@ -117,7 +183,7 @@ def get_block_datetime_utc(block: Union[GatewayBlock, BlockHeader]) -> datetime:
 
 
 @lru_cache(maxsize=128)
-def get_contract_events(contract: Contract) -> dict:
+def get_contract_events(contract: "Contract") -> dict:
     return {
         element["name"]: element
         for element in contract.data.abi
@@ -11,7 +11,8 @@ from typing import Any, Callable, Optional
 import mongomock
 import pytest
 import requests
-from apibara import EventFilter
+from apibara import EventFilter, Info
+from apibara.indexer.storage import Storage
 from pymongo import MongoClient
 from pymongo.database import Database
 from pytest import Item, MonkeyPatch
@@ -67,6 +68,7 @@ class GraphQL:
 
 
 IndexerProcessRunner = Callable[[list[EventFilter], Any], Indexer]
+InfoFactory = Callable[..., Info]
 GraphQLProcessRunner = Callable[[Optional[str]], GraphQL]
 
 
@@ -161,6 +163,12 @@ def sample_contract_file() -> Path:
     return contract_file
 
 
+@pytest.fixture(scope="session")
+def sample_contract_abi_file() -> Path:
+    tests_dir = Path(__file__).parent
+    return tests_dir / "assets/sample_contract_abi.json"
+
+
 @pytest.fixture(scope="session")
 def contract_file() -> Path:
     root_dir = Path(__file__).parent.parent
@@ -262,6 +270,22 @@ def mongomock_client(monkeypatch: MonkeyPatch) -> MongoClient:
     return mongomock.MongoClient(config.mongo_url, tz_aware=True)
 
 
+@pytest.fixture
+def mongomock_info(mongomock_client: MongoClient) -> InfoFactory:
+    """Creates apibara Info objects storing documents in mongomock at a given block"""
+
+    def _create_info(
+        block_number: int,
+        context: Optional[dict] = None,
+        storage_class=Storage,
+        db_name: str = "db",
+    ) -> Info:
+        storage = storage_class(mongomock_client[db_name], None, block_number)
+        return Info(context={} if context is None else context, storage=storage)
+
+    return _create_info
+
+
 @pytest.fixture
 def mongo_db(request: pytest.FixtureRequest, mongo_client: MongoClient) -> Database:
     db_name = (
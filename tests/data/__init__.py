@@ -2,12 +2,19 @@ from . import graphql_expected, graphql_queries, mongo_expected, mongo_validatio
 from .bank import BANK
 from .members import MEMBERS
 from .proposals import PROPOSAL_PARAMS, PROPOSALS
+from .rollups import MEMBERSHIP_ROLLUPS, TREASURY_ROLLUPS
+from .tokens import TOKENS
+from .votes import VOTES
 
 __all__ = [
     "MEMBERS",
     "PROPOSALS",
     "PROPOSAL_PARAMS",
     "BANK",
+    "VOTES",
+    "TOKENS",
+    "TREASURY_ROLLUPS",
+    "MEMBERSHIP_ROLLUPS",
     "graphql_expected",
     "graphql_queries",
     "mongo_expected",
@@ -1,6 +1,7 @@
 from . import common
 from .members import MEMBERS
 from .proposals import PROPOSALS
+from .votes import VOTES
 
 
 def delete_dict_key(d: dict, key) -> dict:
@@ -28,10 +29,6 @@ PROPOSAL_TYPE_MISMATCH = [
     {
         "rawStatusHistory": [[1, common.START_TIME]]
     },  # should be array of tuple(string, date)
-    {"yesVoters": ["0x1"]},  # should be array of binData
-    {"yesVoters": [b"0x1", None]},  # should be array of tuple(string, date)
-    {"noVoters": ["0x2"]},  # should be array of binData
-    {"noVoters": [b"0x2", None]},  # should be array of tuple(string, date)
     {"rawStatusHistory": [[1, common.START_TIME]]},
     {"applicantAddress": []},  # should be binData
     {"shares": True},  # should be int
@@ -130,10 +127,6 @@ MEMBER_TYPE_MISMATCH = [
     {"exitedAt": True},  # should be date
     {"roles": {}},  # should be array of array of string
     {"roles": ["admin", None]},  # should be array of string
-    {"yesVotes": {}},  # should be array of int
-    {"yesVotes": [1, "2", None]},  # should be array of int
-    {"noVotes": True},  # should be array of int
-    {"noVotes": [True, 1, None]},  # should be array of int
     {
         "balances": [{"tokenName": 1, "tokenAddress": b"0x1"}]
     },  # tokenName should be string
@@ -160,8 +153,6 @@ MEMBER_WRONG_VALUES = [
     {"shares": -1},  # should be >= 0
     {"loot": -5},  # should be >= 0
     {"roles": ["admin", "admin"]},  # should be unique
-    {"yesVotes": [1, 1]},  # should be unique
-    {"noVotes": [2, 2]},  # should be unique
 ]
 
 MEMBER_REQUIRED_FIELDS = [
@@ -352,3 +343,32 @@ BANK_MISSING_REQUIRED = [
         ]
     },
 ]
+
+# votes
+VOTE_TYPE_MISMATCH = [
+    {"proposalId": "1"},  # should be int
+    {"voterAddress": "0x1"},  # should be binData
+    {"callerAddress": "0x1"},  # should be binData
+    {"vote": 1},  # should be bool
+    {"votedAt": True},  # should be date
+    {"blockNumber": 1.0},  # should be int
+]
+
+VOTE_WRONG_VALUES = [
+    {"proposalId": -1},  # should be >= 0
+    {"blockNumber": -1},  # should be >= 0
+]
+
+VOTE_REQUIRED_FIELDS = [
+    "proposalId",
+    "voterAddress",
+    "callerAddress",
+    "vote",
+    "votedAt",
+    "blockNumber",
+]
+
+# Create a test data by removing a required field from a valid vote at a time
+VOTE_MISSING_REQUIRED = [
+    delete_dict_key(VOTES[0], required_field) for required_field in VOTE_REQUIRED_FIELDS
+]
@@ -23,8 +23,6 @@ PROPOSALS = [
         "rawStatusHistory": [["submitted", common.START_TIME]],
         "majority": 50,
         "quorum": 80,
-        "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
     },
     {
         "id": 1,
@@ -44,8 +42,6 @@ PROPOSALS = [
         "rawStatusHistory": [["submitted", common.START_TIME]],
         "majority": 50,
         "quorum": 80,
-        "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
     },
     {
         "id": 2,
@@ -61,8 +57,6 @@ PROPOSALS = [
         "rawStatusHistory": [["submitted", common.START_TIME]],
         "majority": 50,
         "quorum": 80,
-        "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
     },
     {
         "id": 3,
@@ -79,8 +73,6 @@ PROPOSALS = [
         "rawStatusHistory": [["submitted", common.START_TIME]],
         "majority": 50,
         "quorum": 80,
-        "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
     },
     {
         "id": 4,
@@ -97,8 +89,6 @@ PROPOSALS = [
         "rawStatusHistory": [["submitted", common.START_TIME]],
         "majority": 50,
         "quorum": 80,
-        "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
     },
     {
         "id": 5,
@@ -117,7 +107,5 @@ PROPOSALS = [
         "rawStatusHistory": [["submitted", common.START_TIME]],
         "majority": 50,
         "quorum": 80,
-        "yesVoters": [common.ADDRESSES[0].bytes, common.ADDRESSES[1].bytes],
-        "noVoters": [common.ADDRESSES[2].bytes, common.ADDRESSES[3].bytes],
     },
 ]
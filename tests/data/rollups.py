@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from . import common
+
+TREASURY_ROLLUPS = [
+    {
+        "tokenAddress": common.TOKEN_ADDRESS.bytes,
+        "period": "hour",
+        "periodStart": common.START_TIME,
+        "inflow": common.AMOUNT,
+        "outflow": 0,
+        "closingBalance": common.AMOUNT,
+    },
+    {
+        "tokenAddress": common.TOKEN_ADDRESS.bytes,
+        "period": "hour",
+        "periodStart": common.START_TIME + timedelta(hours=1),
+        "inflow": 0,
+        "outflow": common.AMOUNT,
+        "closingBalance": 0,
+    },
+    {
+        "tokenAddress": common.TOKEN_ADDRESS.bytes,
+        "period": "day",
+        "periodStart": common.START_TIME,
+        "inflow": common.AMOUNT,
+        "outflow": common.AMOUNT,
+        "closingBalance": 0,
+    },
+]
+
+MEMBERSHIP_ROLLUPS = [
+    {
+        "period": "hour",
+        "periodStart": common.START_TIME,
+        "totalShares": 7,
+        "totalLoot": 5,
+        "activeCount": 1,
+        "jailedCount": 0,
+        "exitedCount": 0,
+    },
+    {
+        "period": "day",
+        "periodStart": common.START_TIME,
+        "totalShares": 7,
+        "totalLoot": 5,
+        "activeCount": 1,
+        "jailedCount": 0,
+        "exitedCount": 0,
+    },
+]
@@ -0,0 +1,19 @@
+from . import common
+
+# The current state of the tokens of data.BANK, TOKEN_ADDRESS has been unwhitelisted
+TOKENS = [
+    {
+        "tokenName": common.TOKEN_NAME,
+        "tokenAddress": common.TOKEN_ADDRESS.bytes,
+        "whitelistedAt": common.START_TIME,
+        "unWhitelistedAt": common.START_TIME,
+        "active": False,
+    },
+    {
+        "tokenName": common.ANOTHER_TOKEN_NAME,
+        "tokenAddress": common.ANOTHER_TOKEN_ADDRESS.bytes,
+        "whitelistedAt": common.START_TIME,
+        "unWhitelistedAt": None,
+        "active": True,
+    },
+]
@@ -0,0 +1,17 @@
+from . import common
+from .proposals import PROPOSALS
+
+# ADDRESSES[0] and ADDRESSES[1] voted yes on every proposal, ADDRESSES[2] and
+# ADDRESSES[3] voted no
+VOTES = [
+    {
+        "proposalId": proposal["id"],
+        "voterAddress": address.bytes,
+        "callerAddress": address.bytes,
+        "vote": vote,
+        "votedAt": common.START_TIME,
+        "blockNumber": 1,
+    }
+    for proposal in PROPOSALS
+    for address, vote in zip(common.ADDRESSES[:4], (True, True, False, False))
+]
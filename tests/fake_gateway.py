@@ -0,0 +1,83 @@
+"""A local fake of the Starknet feeder gateway, answering the block and class hash
+lookups of the indexer with configurable latency and failures."""
+import asyncio
+import json
+from typing import Optional
+
+from aiohttp import web
+
+CLASS_HASH = 0xC1A55
+
+
+class FakeGateway:
+    def __init__(self, latency: float = 0, head: int = 100):
+        self.latency = latency
+        self.head = head
+        # Status of the next responses, 200 once exhausted
+        self.failures: list[int] = []
+        self.requests: list[str] = []
+        # Client address of each connection
+        self.connections: set[tuple] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def fail(self, status: int = 503, count: int = 1):
+        self.failures += [status] * count
+
+    def block(self, number: int) -> dict:
+        return {
+            "block_hash": hex(number + 1),
+            "parent_block_hash": hex(number),
+            "block_number": number,
+            "status": "ACCEPTED_ON_L2",
+            "state_root": "00",
+            "transactions": [],
+            "timestamp": 1668729600 + number,
+            "gas_price": "0x0",
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.requests.append(method)
+        self.connections.add(request.transport.get_extra_info("peername"))
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        if self.failures:
+            return web.Response(status=self.failures.pop(0), text="Unavailable")
+
+        if method == "get_block":
+            number = request.query["blockNumber"]
+            body = self.block(self.head if number == "latest" else int(number))
+        elif method == "get_class_hash_at":
+            body = hex(CLASS_HASH)
+        else:
+            return web.Response(
+                status=500,
+                text=json.dumps({"code": "StarknetErrorCode.UNKNOWN", "message": ""}),
+            )
+
+        return web.json_response(body)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/feeder_gateway/{method}", self.handle)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+
+        # pylint: disable=protected-access
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
@@ -0,0 +1,93 @@
+from unittest.mock import Mock
+
+import pytest
+from graphql import parse
+from pymongo import MongoClient, _csot
+from pytest import MonkeyPatch
+
+from dao import config
+from dao.graphql import cost
+from dao.graphql.schema import schema
+
+EXPENSIVE_QUERY = """
+    query Proposals {
+        proposals(limit: 1000) {
+            totalVotableShares
+            currentQuorum
+            status
+        }
+    }
+"""
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("{ proposals { id title } }", 10),
+        (EXPENSIVE_QUERY, 10 + 1000 * 30),
+        # Both fragments are counted
+        (
+            """
+            query Proposals($limit: Int!) {
+                proposals(limit: $limit) {
+                    ... on Onboard { shares }
+                    ...Votes
+                }
+            }
+            fragment Votes on Proposal { votes { vote } }
+            """,
+            10 + 5 * 5,
+        ),
+        (
+            "{ members { memberAddress votes { proposalId } } }",
+            5 + config.graphql_default_list_size * 5,
+        ),
+        ("{ __schema { types { name } } }", 0),
+    ],
+)
+def test_get_query_cost(query: str, expected: int):
+    # pylint: disable=protected-access
+    assert (
+        cost.get_query_cost(schema._schema, parse(query), variables={"limit": 5})
+        == expected
+    )
+
+
+def test_query_over_max_cost():
+    db = Mock()
+
+    result = schema.execute_sync(EXPENSIVE_QUERY, context_value={"db": db})
+
+    assert result.data is None
+    assert (
+        result.errors[0].message
+        == f"The query cost 30010 exceeds the maximum cost {config.graphql_max_cost}"
+    )
+    assert result.extensions == {
+        "cost": {"requested": 30010, "maximum": config.graphql_max_cost}
+    }
+    # Rejected before reading anything
+    assert not db.mock_calls
+
+
+def test_query_cost_extension(mongomock_client: MongoClient, monkeypatch: MonkeyPatch):
+    timeouts = []
+    list_proposals = mongomock_client.db.proposals.aggregate
+
+    def aggregate(*args, **kwargs):
+        timeouts.append(_csot.get_timeout())
+        return list_proposals(*args, **kwargs)
+
+    monkeypatch.setattr(mongomock_client.db.proposals, "aggregate", aggregate)
+
+    result = schema.execute_sync(
+        "{ proposals { id } }", context_value={"db": mongomock_client.db}
+    )
+
+    assert result.errors is None
+    assert result.extensions == {
+        "cost": {"requested": 10, "maximum": config.graphql_max_cost}
+    }
+    # The MongoDB operations have a deadline
+    assert timeouts == [config.graphql_max_time_ms / 1000]
+    assert _csot.get_timeout() is None
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+
+from aiohttp.test_utils import TestClient, TestServer
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+from pytest import LogCaptureFixture, MonkeyPatch
+
+from dao.graphql import http_cache
+from dao.graphql.main import create_app
+from dao.graphql.subscriptions import EventWatcher
+
+from .. import data
+from .test_read_model import set_indexed_block
+
+QUERY = "query Proposals { proposals { id title } }"
+
+
+async def test_etag(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.proposals.insert_many(data.PROPOSALS)
+    set_indexed_block(db, 1)
+    indexed_block = http_cache.IndexedBlockWatcher(db)
+    indexed_block.sync()
+    app = create_app(db, EventWatcher(db), indexed_block=indexed_block)
+
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/graphql", json={"query": QUERY})
+        assert response.status == 200
+        assert response.headers["Cache-Control"] == "no-cache"
+        etag = response.headers["ETag"]
+        assert etag.startswith('W/"')
+
+        # Not executed again until a block is indexed
+        response = await client.post(
+            "/graphql", json={"query": QUERY}, headers={"If-None-Match": etag}
+        )
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+
+        set_indexed_block(db, 2)
+        indexed_block.sync()
+        response = await client.post(
+            "/graphql", json={"query": QUERY}, headers={"If-None-Match": etag}
+        )
+        assert response.status == 200
+        assert response.headers["ETag"] != etag
+        assert len((await response.json())["data"]["proposals"]) == len(data.PROPOSALS)
+
+        # The errors aren't cached
+        response = await client.post("/graphql", json={"query": "{ unknown }"})
+        assert "ETag" not in response.headers
+
+        # Nor the health of the indexer
+        response = await client.post(
+            "/graphql", json={"query": "{ proposals { id } health { healthy } }"}
+        )
+        assert response.status == 200
+        assert "ETag" not in response.headers
+
+
+async def test_get_query(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    indexed_block = http_cache.IndexedBlockWatcher(db)
+    app = create_app(db, EventWatcher(db), indexed_block=indexed_block)
+
+    async with TestClient(TestServer(app)) as client:
+        # Not cached until the indexed block is known
+        response = await client.get("/graphql", params={"query": QUERY})
+        assert response.status == 200
+        assert "ETag" not in response.headers
+        assert (await response.json())["data"] == {"proposals": []}
+
+        indexed_block.sync()
+        response = await client.get("/graphql", params={"query": QUERY})
+        assert response.headers["Cache-Control"].startswith("public, max-age=")
+        assert "ETag" in response.headers
+
+
+async def test_compression(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.proposals.insert_many(data.PROPOSALS)
+    db.votes.insert_many(data.VOTES)
+    db.members.insert_many(data.MEMBERS)
+    query = {"query": data.graphql_queries.LIST_PROPOSALS}
+
+    async with TestClient(TestServer(create_app(db, EventWatcher(db)))) as client:
+        response = await client.post(
+            "/graphql", json=query, headers={"Accept-Encoding": "gzip, deflate"}
+        )
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.headers["Content-Encoding"] == "gzip"
+        # Decompressed by the client
+        assert (await response.json())["data"][
+            "proposals"
+        ] == data.graphql_expected.LIST_PROPOSALS
+
+        response = await client.post(
+            "/graphql", json=query, headers={"Accept-Encoding": "identity"}
+        )
+        assert "Content-Encoding" not in response.headers
+
+        # Too small to be worth it
+        response = await client.post(
+            "/graphql", json={"query": QUERY}, headers={"Accept-Encoding": "gzip"}
+        )
+        assert "Content-Encoding" not in response.headers
+
+
+async def test_indexed_block_watcher(
+    mongomock_client: MongoClient, monkeypatch: MonkeyPatch, caplog: LogCaptureFixture
+):
+    caplog.set_level(logging.INFO)
+    db = mongomock_client.db
+    set_indexed_block(db, 1)
+    watcher = http_cache.IndexedBlockWatcher(db, poll_interval=0.01)
+    collection = db["_apibara"]
+    find_one = collection.find_one
+    failing = True
+
+    def failing_find_one(*args, **kwargs):
+        if failing:
+            raise ServerSelectionTimeoutError("No servers found")
+        return find_one(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "find_one", failing_find_one)
+    task = asyncio.create_task(watcher.run())
+    try:
+        await asyncio.sleep(0.05)
+        # The responses aren't cached, and it is logged once
+        assert not watcher.loaded
+        assert caplog.text.count("Cannot read the indexed block") == 1
+
+        failing = False
+        await asyncio.sleep(0.05)
+        assert watcher.loaded and watcher.block == 1
+        assert "Caching the responses" in caplog.text
+    finally:
+        task.cancel()
+
+
+def test_selects_uncached_fields():
+    def selects(query: str, operation_name=None) -> bool:
+        return http_cache.selects_uncached_fields(
+            http_cache.GraphQLRequestData(query, None, operation_name)
+        )
+
+    assert not selects(QUERY)
+    assert selects("{ health { healthy } }")
+    assert selects("{ ... on Query { health { healthy } } }")
+    assert selects(
+        "query { ...Health } fragment Health on Query { health { lagBlocks } }"
+    )
+    # Only the operation executed
+    query = f"{QUERY} query Health {{ health {{ healthy }} }}"
+    assert not selects(query, "Proposals")
+    assert selects(query, "Health")
+    assert not selects("{ health {")
+
+
+def test_get_etag():
+    request_data = http_cache.GraphQLRequestData(QUERY, {"id": 1}, None)
+    etag = http_cache.get_etag(request_data, 10, now=0, max_age=10)
+
+    assert http_cache.get_etag(request_data, 10, now=9, max_age=10) == etag
+    # A new block, or the computed fields are due
+    assert http_cache.get_etag(request_data, 11, now=9, max_age=10) != etag
+    assert http_cache.get_etag(request_data, 10, now=10, max_age=10) != etag
@@ -1,6 +1,8 @@
 # pylint: disable=too-many-arguments,too-many-locals
 from datetime import timedelta
+from unittest.mock import Mock
 
+from pymongo import MongoClient
 from pytest import MonkeyPatch
 
 from dao import utils
@@ -150,19 +152,28 @@ def test_proposal_status(monkeypatch: MonkeyPatch):
     assert proposal.status(info) == ProposalStatus.UNKNOWN
 
 
-def test_proposal_member_did_vote():
+def test_proposal_member_did_vote(mongomock_client: MongoClient):
     proposal = test_proposal_basic()
-
-    memberAddress = "0x0"
-    assert proposal.memberDidVote(memberAddress) is False
-
-    proposal.noVoters = []
-    proposal.yesVoters.append(memberAddress)
-    assert proposal.memberDidVote(memberAddress) is True
-
-    proposal.yesVoters = []
-    proposal.noVoters.append(memberAddress)
-    assert proposal.memberDidVote(memberAddress) is True
+    info = Mock(context={"db": mongomock_client.db})
+
+    memberAddress = b"\x00"
+    assert proposal.memberDidVote(info, memberAddress) is False
+
+    vote = {
+        "proposalId": proposal.id,
+        "voterAddress": memberAddress,
+        "callerAddress": b"\x01",
+        "vote": False,
+        "votedAt": utils.utcnow(),
+        "blockNumber": 1,
+        "_chain": {"valid_from": 1, "valid_to": None},
+    }
+
+    mongomock_client.db.votes.insert_one({**vote, "proposalId": proposal.id + 1})
+    assert proposal.memberDidVote(info, memberAddress) is False
+
+    mongomock_client.db.votes.insert_one(vote)
+    assert proposal.memberDidVote(info, memberAddress) is True
 
 
 def test_proposal_memeber_did_vote():
@@ -1,6 +1,13 @@
+from datetime import timedelta
+
 from pymongo import MongoClient
+from pytest import MonkeyPatch
 
+from dao import utils
+from dao.graphql.common import serialize_hex
+from dao.graphql.members import get_proposal_hex_id
 from dao.graphql.schema import schema
+from dao.models import ProposalRawStatus
 
 from .. import data
 
@@ -26,6 +33,7 @@ def test_proposals_query(mongomock_client: MongoClient):
     context_value = {"db": mongomock_client.db}
 
     mongomock_client.db.proposals.insert_many(data.PROPOSALS)
+    mongomock_client.db.votes.insert_many(data.VOTES)
     mongomock_client.db.members.insert_many(data.MEMBERS)
 
     result = schema.execute_sync(
@@ -54,9 +62,456 @@ def test_bank_query(mongomock_client: MongoClient):
     context_value = {"db": mongomock_client.db}
 
     mongomock_client.db.bank.insert_one(data.BANK)
+    mongomock_client.db.tokens.insert_many(data.TOKENS)
     mongomock_client.db.members.insert_many(data.MEMBERS)
 
     result = schema.execute_sync(data.graphql_queries.BANK, context_value=context_value)
 
     assert result.errors is None
     assert result.data["bank"] == data.graphql_expected.BANK
+
+
+def test_votes_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+
+    mongomock_client.db.bank.insert_one(data.BANK)
+    mongomock_client.db.members.insert_many(data.MEMBERS)
+    mongomock_client.db.proposals.insert_many(data.PROPOSALS)
+    mongomock_client.db.votes.insert_many(data.VOTES)
+
+    query = """
+        query Votes {
+            members {
+                yesVotes
+                noVotes
+            }
+            proposals {
+                id
+                votes {
+                    voterAddress
+                    vote
+                }
+            }
+        }
+    """
+
+    result = schema.execute_sync(query, context_value=context_value)
+
+    assert result.errors is None
+
+    proposal_ids = [
+        serialize_hex(get_proposal_hex_id(proposal["id"]))
+        for proposal in data.PROPOSALS
+    ]
+    members = result.data["members"]
+    assert sorted(members[0]["yesVotes"]) == proposal_ids
+    assert members[0]["noVotes"] == []
+    assert members[2]["yesVotes"] == []
+    assert sorted(members[2]["noVotes"]) == proposal_ids
+
+    for proposal in result.data["proposals"]:
+        votes = sorted(vote["vote"] for vote in proposal["votes"])
+        assert votes == [False, False, True, True]
+
+
+def test_members_votes_query(mongomock_client: MongoClient, monkeypatch: MonkeyPatch):
+    db = mongomock_client.db
+    db.members.insert_many(data.MEMBERS)
+    db.votes.insert_many(data.VOTES)
+
+    # The votes of the members list are read once, not once per member and field
+    find = db.votes.find
+    finds = []
+    monkeypatch.setattr(
+        db.votes,
+        "find",
+        lambda *args, **kwargs: finds.append(args) or find(*args, **kwargs),
+    )
+
+    query = "query Members { members { yesVotes noVotes votes { proposalId } } }"
+    result = schema.execute_sync(query, context_value={"db": db})
+
+    assert result.errors is None
+    assert len(finds) == 1
+    for member in result.data["members"]:
+        assert len(member["votes"]) == len(member["yesVotes"]) + len(member["noVotes"])
+
+
+def test_as_of_block_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+    db = mongomock_client.db
+
+    member = {key: value for key, value in data.MEMBERS[0].items() if key != "_id"}
+    vote = {key: value for key, value in data.VOTES[0].items() if key != "_id"}
+
+    db.members.insert_many(
+        [
+            {**member, "shares": 1, "_chain": {"valid_from": 1, "valid_to": 5}},
+            {**member, "shares": 2, "_chain": {"valid_from": 5, "valid_to": None}},
+        ]
+    )
+    db.votes.insert_one({**vote, "_chain": {"valid_from": 3, "valid_to": None}})
+
+    query = """
+        query Members($asOfBlock: Int) {
+            members(asOfBlock: $asOfBlock) {
+                shares
+                yesVotes
+            }
+        }
+    """
+
+    def execute(as_of_block):
+        result = schema.execute_sync(
+            query,
+            variable_values={"asOfBlock": as_of_block},
+            context_value=context_value,
+        )
+        assert result.errors is None
+        return result.data["members"]
+
+    assert execute(0) == []
+    assert execute(2) == [{"shares": 1, "yesVotes": []}]
+    assert execute(4) == [
+        {
+            "shares": 1,
+            "yesVotes": [serialize_hex(get_proposal_hex_id(vote["proposalId"]))],
+        }
+    ]
+    assert execute(None) == [
+        {
+            "shares": 2,
+            "yesVotes": [serialize_hex(get_proposal_hex_id(vote["proposalId"]))],
+        }
+    ]
+
+
+def test_as_of_block_status_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+    db = mongomock_client.db
+
+    proposal = {key: value for key, value in data.PROPOSALS[0].items() if key != "_id"}
+    db.proposals.insert_one({**proposal, "_chain": {"valid_from": 1, "valid_to": None}})
+    # Events of the DAO at block 1, when the proposal is submitted, and at block 3,
+    # 30 minutes later
+    for block_number, minutes in ((1, 0), (3, 30)):
+        db.events.insert_one(
+            {
+                "name": "ProposalAdded",
+                "blockNumber": block_number,
+                "transactionHash": block_number,
+                "logIndex": 0,
+                "emittedAt": data.common.START_TIME + timedelta(minutes=minutes),
+                "_chain": {"valid_from": block_number, "valid_to": None},
+            }
+        )
+
+    query = """
+        query Proposals($asOfBlock: Int) {
+            proposals(asOfBlock: $asOfBlock) {
+                status
+                active
+                timeRemaining
+            }
+        }
+    """
+
+    def execute(as_of_block):
+        result = schema.execute_sync(
+            query,
+            variable_values={"asOfBlock": as_of_block},
+            context_value=context_value,
+        )
+        assert result.errors is None
+        return result.data["proposals"]
+
+    # The statuses are computed at the time of the block
+    assert execute(1) == [
+        {"status": "VOTING_PERIOD", "active": True, "timeRemaining": -3600}
+    ]
+    assert execute(4) == [
+        {"status": "VOTING_PERIOD", "active": True, "timeRemaining": -1800}
+    ]
+    # The voting period ended long ago, without any vote, and the proposal is
+    # yet to be processed
+    assert execute(None) == [
+        {"status": "REJECTED_READY", "active": True, "timeRemaining": None}
+    ]
+
+
+def test_dao_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+    db = mongomock_client.db
+
+    member = {key: value for key, value in data.MEMBERS[0].items() if key != "_id"}
+    vote = {key: value for key, value in data.VOTES[0].items() if key != "_id"}
+    current = {"_chain": {"valid_from": 1, "valid_to": None}}
+
+    # The same member voted in the first DAO only
+    for dao, shares in ((b"\x01", 10), (b"\x02", 20)):
+        db.members.insert_one({**member, **current, "dao": dao, "shares": shares})
+        db.bank.insert_one({**current, "dao": dao, "bankAddress": dao * 2})
+    db.votes.insert_one({**vote, **current, "dao": b"\x01"})
+
+    query = """
+        query Dao($dao: HexValue) {
+            members(dao: $dao) {
+                dao
+                shares
+                yesVotes
+                votingWeight
+            }
+            bank(dao: $dao) {
+                bankAddress
+                totalShares
+            }
+        }
+    """
+
+    def execute(dao):
+        result = schema.execute_sync(
+            query, variable_values={"dao": dao}, context_value=context_value
+        )
+        assert result.errors is None
+        return result.data
+
+    assert execute("0x01") == {
+        "members": [
+            {
+                "dao": "0x01",
+                "shares": 10,
+                "yesVotes": [serialize_hex(get_proposal_hex_id(vote["proposalId"]))],
+                "votingWeight": 1,
+            }
+        ],
+        "bank": {"bankAddress": "0x0101", "totalShares": 10},
+    }
+    assert execute("0x02") == {
+        "members": [{"dao": "0x02", "shares": 20, "yesVotes": [], "votingWeight": 1}],
+        "bank": {"bankAddress": "0x0202", "totalShares": 20},
+    }
+
+
+def test_history_queries(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+
+    mongomock_client.db.treasury_rollups.insert_many(data.TREASURY_ROLLUPS)
+    mongomock_client.db.membership_rollups.insert_many(data.MEMBERSHIP_ROLLUPS)
+
+    query = """
+        query History($start: DateTime) {
+            treasuryHistory(start: $start) {
+                period
+                periodStart
+                inflow
+                outflow
+                closingBalance
+            }
+            membershipHistory(period: DAY) {
+                period
+                totalShares
+                activeCount
+            }
+        }
+    """
+
+    result = schema.execute_sync(
+        query,
+        variable_values={"start": "2022-11-18T00:30:00+00:00"},
+        context_value=context_value,
+    )
+
+    assert result.errors is None
+    assert result.data["treasuryHistory"] == [
+        {
+            "period": "HOUR",
+            "periodStart": "2022-11-18T01:00:00+00:00",
+            "inflow": 0,
+            "outflow": data.TREASURY_ROLLUPS[1]["outflow"],
+            "closingBalance": 0,
+        }
+    ]
+    assert result.data["membershipHistory"] == [
+        {"period": "DAY", "totalShares": 7, "activeCount": 1}
+    ]
+
+
+def test_proposals_order_by_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+    db = mongomock_client.db
+
+    approved_at = data.common.START_TIME + timedelta(hours=3)
+    proposals = [dict(proposal) for proposal in data.PROPOSALS]
+    proposals[2]["rawStatus"] = ProposalRawStatus.APPROVED.value
+    proposals[2]["rawStatusHistory"] = proposals[2]["rawStatusHistory"] + [
+        [ProposalRawStatus.APPROVED.value, approved_at]
+    ]
+    db.proposals.insert_many(proposals)
+    db.members.insert_many(data.MEMBERS)
+    # ADDRESSES[1] didn't vote on the proposals 1 and 3
+    db.votes.insert_many(
+        vote
+        for vote in data.VOTES
+        if not (
+            vote["proposalId"] in (1, 3)
+            and vote["voterAddress"] == data.common.ADDRESSES[1].bytes
+        )
+    )
+
+    query = """
+        query Proposals(
+            $orderBy: ProposalOrderBy, $where: ProposalWhere, $skip: Int = 1
+        ) {
+            proposals(orderBy: $orderBy, where: $where, skip: $skip, limit: 2) {
+                id
+                yesVotesTotal
+            }
+        }
+    """
+
+    def execute(order_by=None, where=None, skip=1):
+        result = schema.execute_sync(
+            query,
+            variable_values={"orderBy": order_by, "where": where, "skip": skip},
+            context_value=context_value,
+        )
+        assert result.errors is None
+        return result.data["proposals"]
+
+    # Paginated once sorted
+    assert execute({"field": "YES_VOTES_TOTAL", "direction": "ASC"}) == [
+        {"id": 3, "yesVotesTotal": 7},
+        {"id": 0, "yesVotesTotal": 15},
+    ]
+    assert execute({"field": "ID", "direction": "DESC"}) == [
+        {"id": 4, "yesVotesTotal": 15},
+        {"id": 3, "yesVotesTotal": 7},
+    ]
+    assert execute(where={"yesVotesTotal": {"min": 10}}) == [
+        {"id": 2, "yesVotesTotal": 15},
+        {"id": 4, "yesVotesTotal": 15},
+    ]
+
+    processed = {"processedAt": {"start": approved_at.isoformat()}}
+    assert execute(where=processed, skip=0) == [{"id": 2, "yesVotesTotal": 15}]
+    assert execute({"field": "PROCESSED_AT", "direction": "DESC"}, skip=0) == [
+        {"id": 2, "yesVotesTotal": 15},
+        {"id": 0, "yesVotesTotal": 15},
+    ]
+
+
+def test_activity_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+    member, other_member = (address.bytes for address in data.common.ADDRESSES[:2])
+
+    # Two events per hour, the member is in the even ones
+    mongomock_client.db.events.insert_many(
+        {
+            "name": "MemberAdded" if index % 2 else "VoteSubmitted",
+            "emittedAt": data.common.START_TIME + timedelta(hours=index // 2),
+            "memberAddress": other_member if index % 2 else member,
+            "addresses": [other_member if index % 2 else member],
+            "_chain": {"valid_from": index, "valid_to": None},
+        }
+        for index in range(10)
+    )
+
+    query = """
+        query Activity(
+            $after: String, $names: [String!], $address: HexValue, $emittedAt: DateRange
+        ) {
+            activity(
+                limit: 3,
+                after: $after,
+                names: $names,
+                address: $address,
+                emittedAt: $emittedAt
+            ) {
+                name
+                emittedAt
+                payload
+                cursor
+            }
+        }
+    """
+
+    def execute(**variables):
+        result = schema.execute_sync(
+            query, variable_values=variables, context_value=context_value
+        )
+        assert result.errors is None
+        return result.data["activity"]
+
+    def list_all(**variables) -> list[tuple[str, str]]:
+        events, after = [], None
+        while page := execute(after=after, **variables):
+            events += [(event["name"], event["emittedAt"][11:13]) for event in page]
+            after = page[-1]["cursor"]
+        return events
+
+    # The events of the same time are paginated by insertion order
+    first_page = execute()
+    assert [event["emittedAt"][11:13] for event in first_page] == ["04", "04", "03"]
+    assert first_page[0]["payload"] == {
+        "memberAddress": data.common.ADDRESSES[1].string
+    }
+    assert len(list_all()) == 10
+
+    assert list_all(address=data.common.ADDRESSES[0].string) == [
+        ("VoteSubmitted", hour) for hour in ("04", "03", "02", "01", "00")
+    ]
+    assert list_all(
+        names=["MemberAdded"],
+        emittedAt={
+            "start": (data.common.START_TIME + timedelta(hours=1)).isoformat(),
+            "end": (data.common.START_TIME + timedelta(hours=3)).isoformat(),
+        },
+    ) == [("MemberAdded", "02"), ("MemberAdded", "01")]
+
+    result = schema.execute_sync(
+        query, variable_values={"after": "invalid"}, context_value=context_value
+    )
+    assert "Invalid cursor" in result.errors[0].message
+
+
+def test_health_query(mongomock_client: MongoClient):
+    context_value = {"db": mongomock_client.db}
+    query = """
+        query Health {
+            health {
+                indexedBlock
+                chainHeadBlock
+                lagBlocks
+                eventsPerSecond
+                healthy
+            }
+        }
+    """
+
+    result = schema.execute_sync(query, context_value=context_value)
+    assert result.errors is None
+    assert result.data["health"] == {
+        "indexedBlock": None,
+        "chainHeadBlock": None,
+        "lagBlocks": None,
+        "eventsPerSecond": 0,
+        "healthy": False,
+    }
+
+    mongomock_client.db["_health"].insert_one(
+        {
+            "indexedBlock": 10,
+            "chainHeadBlock": 12,
+            "eventsPerSecond": 1.5,
+            "updatedAt": utils.utcnow(),
+        }
+    )
+    result = schema.execute_sync(query, context_value=context_value)
+    assert result.errors is None
+    assert result.data["health"] == {
+        "indexedBlock": 10,
+        "chainHeadBlock": 12,
+        "lagBlocks": 2,
+        "eventsPerSecond": 1.5,
+        "healthy": True,
+    }
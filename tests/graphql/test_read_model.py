@@ -0,0 +1,226 @@
+from datetime import timedelta
+
+from pymongo import MongoClient
+from pymongo.database import Database
+
+from dao import utils
+from dao.graphql.read_model import ReadModel
+from dao.graphql.schema import schema
+from dao.models import ProposalStatus
+
+from .. import data
+
+CURRENT = {"_chain": {"valid_from": 1, "valid_to": None}}
+
+VOTES_QUERY = """
+    query Votes {
+        members {
+            memberAddress
+            yesVotes
+            noVotes
+        }
+        proposals(limit: 20) {
+            id
+            votes {
+                voterAddress
+                vote
+            }
+            memberDidVote(memberAddress: "0x01")
+        }
+    }
+"""
+
+ORDER_BY_QUERY = """
+    query Proposals($orderBy: ProposalOrderBy, $where: ProposalWhere) {
+        proposals(orderBy: $orderBy, where: $where, skip: 1, limit: 2) {
+            id
+            yesVotesTotal
+            noVotesTotal
+        }
+    }
+"""
+
+
+def execute(db: Database, query: str, read_model=None, **variables) -> dict:
+    result = schema.execute_sync(
+        query,
+        variable_values=variables,
+        context_value={"db": db, "read_model": read_model},
+    )
+    assert result.errors is None
+    return result.data
+
+
+def insert(db: Database, collection: str, docs: list[dict], **fields):
+    db[collection].insert_many(
+        [
+            {**{key: value for key, value in doc.items() if key != "_id"}, **fields}
+            for doc in docs
+        ]
+    )
+
+
+def set_indexed_block(db: Database, block_number: int):
+    db["_apibara"].update_one(
+        {"indexer_id": "dao-indexer"},
+        {"$set": {"indexed_to": block_number}},
+        upsert=True,
+    )
+
+
+def test_read_model_queries(mongomock_client: MongoClient):
+    db = mongomock_client.db
+
+    insert(db, "proposals", data.PROPOSALS, **CURRENT)
+    insert(db, "votes", data.VOTES, **CURRENT)
+    insert(db, "members", data.MEMBERS, **CURRENT)
+    insert(db, "bank", [data.BANK], **CURRENT)
+    insert(db, "tokens", data.TOKENS, **CURRENT)
+    set_indexed_block(db, 1)
+
+    read_model = ReadModel(db)
+    read_model.load()
+    assert read_model.loaded
+
+    queries = [
+        (data.graphql_queries.LIST_PROPOSALS, {}),
+        (data.graphql_queries.LIST_MEMBERS, {}),
+        (data.graphql_queries.BANK, {}),
+        (VOTES_QUERY, {}),
+        (ORDER_BY_QUERY, {"orderBy": {"field": "ID", "direction": "DESC"}}),
+        (ORDER_BY_QUERY, {"where": {"yesVotesTotal": {"min": 10}}}),
+    ]
+    expected = [execute(db, query, **variables) for query, variables in queries]
+    assert expected[0]["proposals"] == data.graphql_expected.LIST_PROPOSALS
+
+    # The current state isn't read from MongoDB anymore
+    for collection in ("proposals", "votes", "members", "bank", "tokens"):
+        db.drop_collection(collection)
+
+    for (query, variables), result in zip(queries, expected):
+        assert execute(db, query, read_model, **variables) == result
+
+
+def test_read_model_sync(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    member = {key: value for key, value in data.MEMBERS[0].items() if key != "_id"}
+    other_member = {
+        key: value for key, value in data.MEMBERS[1].items() if key != "_id"
+    }
+
+    query = "query Members { members { memberAddress shares } }"
+
+    def shares(read_model):
+        members = execute(db, query, read_model)["members"]
+        addresses = {
+            data.common.ADDRESSES[0].string: "member",
+            data.common.ADDRESSES[1].string: "other",
+        }
+        return {
+            addresses[member["memberAddress"]]: member["shares"] for member in members
+        }
+
+    insert(db, "members", [member], shares=1, **CURRENT)
+    insert(db, "members", [other_member], shares=2, **CURRENT)
+
+    read_model = ReadModel(db)
+    # Nothing is indexed yet, the queries are read from MongoDB
+    read_model.sync()
+    assert not read_model.loaded
+    assert shares(read_model) == {"member": 1, "other": 2}
+
+    set_indexed_block(db, 1)
+    read_model.sync()
+    assert read_model.block == 1
+
+    # A new version at block 2, and one of block 3 being indexed
+    db.members.update_one(
+        {"memberAddress": member["memberAddress"]},
+        {"$set": {"_chain.valid_to": 2}},
+    )
+    insert(db, "members", [member], shares=10, _chain={"valid_from": 2, "valid_to": 3})
+    insert(
+        db, "members", [member], shares=20, _chain={"valid_from": 3, "valid_to": None}
+    )
+    set_indexed_block(db, 2)
+    read_model.sync()
+    assert read_model.block == 2
+    assert shares(read_model) == {"member": 10, "other": 2}
+
+    # The other member is deleted at block 3
+    db.members.update_one(
+        {"memberAddress": other_member["memberAddress"]},
+        {"$set": {"_chain.valid_to": 3}},
+    )
+    snapshot = read_model.snapshot
+    set_indexed_block(db, 3)
+    read_model.sync()
+    assert shares(read_model) == {"member": 20}
+    # The snapshot read by a query during the sync isn't changed
+    assert snapshot.block == 2
+    assert len(snapshot.documents["members"]) == 2
+    assert [
+        member["shares"]
+        for member in snapshot.members_by_address[member["memberAddress"]]
+    ] == [10]
+
+    # A chain reorganization rolls back block 3, the read model is loaded again
+    db.members.delete_many({"_chain.valid_from": {"$gte": 3}})
+    db.members.update_many(
+        {"_chain.valid_to": {"$gte": 3}}, {"$set": {"_chain.valid_to": None}}
+    )
+    set_indexed_block(db, 2)
+    read_model.sync()
+    assert read_model.block == 2
+    assert shares(read_model) == {"member": 10, "other": 2}
+    assert shares(None) == shares(read_model)
+
+    # asOfBlock queries are read from MongoDB
+    result = execute(
+        db, "query Members { members(asOfBlock: 1) { shares } }", read_model
+    )
+    assert sorted(member["shares"] for member in result["members"]) == [1, 2]
+
+
+def test_time_remaining_query(mongomock_client: MongoClient):
+    db = mongomock_client.db
+
+    # Submitted 90 minutes ago, in the grace period while their status derived at
+    # the end of the voting period isn't refreshed yet
+    submitted_at = utils.utcnow() - timedelta(minutes=90)
+    statuses = [
+        (ProposalStatus.VOTING_PERIOD, 0),
+        (ProposalStatus.GRACE_PERIOD, 0),
+        (ProposalStatus.REJECTED_READY, 100),
+    ]
+    proposals = [
+        {
+            **proposal,
+            "submittedAt": submitted_at,
+            "quorum": quorum,
+            "majority": quorum,
+            "derivedStatus": status.value,
+            "derivedStatusUntil": submitted_at + timedelta(minutes=60),
+        }
+        for proposal, (status, quorum) in zip(data.PROPOSALS, statuses)
+    ]
+    insert(db, "proposals", proposals, **CURRENT)
+    set_indexed_block(db, 1)
+
+    read_model = ReadModel(db)
+    read_model.load()
+
+    query = """
+        query Proposals($where: ProposalWhere) {
+            proposals(where: $where, orderBy: {field: ID, direction: ASC}) {
+                id
+                timeRemaining
+            }
+        }
+    """
+    for model in (None, read_model):
+        result = execute(db, query, model, where={"timeRemaining": {"max": 0}})
+        # The grace period ends in 90 minutes, the rejected proposal has none
+        assert [proposal["id"] for proposal in result["proposals"]] == [0, 1]
+        for proposal in result["proposals"]:
+            assert -90 * 60 <= proposal["timeRemaining"] <= -90 * 60 + 5
@@ -0,0 +1,224 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import MongoClient
+
+from dao.graphql import storage
+from dao.graphql.schema import schema
+from dao.graphql.subscriptions import EventWatcher, SubscriptionOverflow
+
+from .. import data
+from ..data import common
+
+NOW = datetime(2022, 11, 18, tzinfo=timezone.utc)
+
+
+def vote_event(proposal_id: int, vote: bool = True) -> dict:
+    return {
+        "name": "VoteSubmitted",
+        "emittedAt": NOW,
+        "callerAddress": common.ADDRESSES[1].bytes,
+        "proposalId": proposal_id,
+        "vote": vote,
+        "onBehalfAddress": common.ADDRESSES[0].bytes,
+    }
+
+
+async def start(subscription, watcher: EventWatcher) -> asyncio.Task:
+    """Runs the subscription until it waits for events, then starts watching"""
+    subscribers_count = watcher.subscribers_count
+    task = asyncio.create_task(subscription.__anext__())
+    while watcher.subscribers_count == subscribers_count:
+        await asyncio.sleep(0)
+    await watcher.poll_once()
+    return task
+
+
+async def test_vote_submitted(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    # Events inserted before subscribing aren't sent
+    db.events.insert_one(vote_event(0))
+
+    watcher = EventWatcher(db)
+    context_value = {"db": db, "event_watcher": watcher}
+
+    query = """
+        subscription {
+            voteSubmitted(proposalId: 1) {
+                proposalId
+                voterAddress
+                callerAddress
+                vote
+            }
+        }
+    """
+    subscription = await schema.subscribe(query, context_value=context_value)
+    task = await start(subscription, watcher)
+    assert watcher.subscribers_count == 1
+
+    db.events.insert_many([vote_event(0), vote_event(1, vote=False)])
+    await watcher.poll_once()
+    result = await asyncio.wait_for(task, timeout=1)
+
+    assert result.errors is None
+    assert result.data["voteSubmitted"] == {
+        "proposalId": 1,
+        "voterAddress": common.ADDRESSES[0].string,
+        "callerAddress": common.ADDRESSES[1].string,
+        "vote": False,
+    }
+
+    await subscription.aclose()
+    assert watcher.subscribers_count == 0
+
+
+async def test_proposal_updated(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.proposals.insert_many([dict(proposal) for proposal in data.PROPOSALS])
+    db.votes.insert_many([dict(vote) for vote in data.VOTES])
+    db.members.insert_many([dict(member) for member in data.MEMBERS])
+
+    watcher = EventWatcher(db)
+    context_value = {"db": db, "event_watcher": watcher}
+
+    query = """
+        subscription {
+            proposalUpdated {
+                id
+                title
+                yesVotesTotal
+            }
+        }
+    """
+    subscription = await schema.subscribe(query, context_value=context_value)
+    task = await start(subscription, watcher)
+
+    db.events.insert_one(vote_event(0))
+    await watcher.poll_once()
+    result = await asyncio.wait_for(task, timeout=1)
+
+    assert result.errors is None
+    assert result.data["proposalUpdated"] == {
+        "id": 0,
+        "title": data.PROPOSALS[0]["title"],
+        "yesVotesTotal": 15,
+    }
+
+    await subscription.aclose()
+
+
+async def test_proposal_read_once(
+    mongomock_client: MongoClient, monkeypatch: pytest.MonkeyPatch
+):
+    db = mongomock_client.db
+    db.proposals.insert_many([dict(proposal) for proposal in data.PROPOSALS])
+    db.members.insert_many([dict(member) for member in data.MEMBERS])
+
+    reads = []
+    get_proposal = storage.get_proposal
+
+    def counting_get_proposal(**kwargs):
+        reads.append(kwargs["id"])
+        return get_proposal(**kwargs)
+
+    monkeypatch.setattr(storage, "get_proposal", counting_get_proposal)
+
+    watcher = EventWatcher(db)
+    context_value = {"db": db, "event_watcher": watcher}
+    query = "subscription { proposalUpdated { id title } }"
+
+    subscriptions = [
+        await schema.subscribe(query, context_value=context_value) for _ in range(3)
+    ]
+    tasks = [await start(subscription, watcher) for subscription in subscriptions]
+
+    # Both events change the same proposal
+    db.events.insert_many([vote_event(0), vote_event(0, vote=False)])
+    await watcher.poll_once()
+    results = await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+
+    assert [result.data["proposalUpdated"]["id"] for result in results] == [0] * 3
+    # Once per poll, whatever the number of subscribers and events
+    assert reads == [0]
+
+    for subscription in subscriptions:
+        await subscription.aclose()
+
+
+async def test_member_updated(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.members.insert_many([dict(member) for member in data.MEMBERS])
+
+    watcher = EventWatcher(db)
+    context_value = {"db": db, "event_watcher": watcher}
+
+    query = """
+        subscription {
+            memberUpdated(memberAddress: "%s") {
+                memberAddress
+                shares
+            }
+        }
+    """ % (
+        common.ADDRESSES[1].string
+    )
+    subscription = await schema.subscribe(query, context_value=context_value)
+    task = await start(subscription, watcher)
+
+    for address in (common.ADDRESSES[0], common.ADDRESSES[1]):
+        db.events.insert_one(
+            {"name": "RoleGranted", "account": address.bytes, "role": "admin"}
+        )
+    await watcher.poll_once()
+    result = await asyncio.wait_for(task, timeout=1)
+
+    assert result.errors is None
+    assert result.data["memberUpdated"] == {
+        "memberAddress": common.ADDRESSES[1].string,
+        "shares": 8,
+    }
+
+    await subscription.aclose()
+
+
+async def test_watcher_fan_out():
+    watcher = EventWatcher(db=None, queue_size=3)
+    first = watcher.subscribe(["A"])
+    second = watcher.subscribe()
+
+    first_task = asyncio.create_task(first.__anext__())
+    second_task = asyncio.create_task(second.__anext__())
+    await asyncio.sleep(0)
+
+    watcher.publish({"name": "B"})
+    watcher.publish({"name": "A"})
+
+    assert await second_task == {"name": "B"}
+    assert await first_task == {"name": "A"}
+
+    # The second subscriber doesn't consume its events and is disconnected
+    for _ in range(3):
+        watcher.publish({"name": "C"})
+
+    assert watcher.subscribers_count == 1
+    with pytest.raises(SubscriptionOverflow):
+        for _ in range(4):
+            await second.__anext__()
+
+    await first.aclose()
+
+
+async def test_watcher_dao():
+    watcher = EventWatcher(db=None)
+    events = watcher.subscribe(["A"], dao=b"\x02")
+
+    task = asyncio.create_task(events.__anext__())
+    await asyncio.sleep(0)
+
+    watcher.publish({"name": "A", "dao": b"\x01"})
+    watcher.publish({"name": "A", "dao": b"\x02"})
+
+    assert await task == {"name": "A", "dao": b"\x02"}
+
+    await events.aclose()
@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+
+import pytest
+from apibara.model import NewBlock
+from pymongo import MongoClient
+
+from dao import metrics
+from dao.graphql import storage
+from dao.indexer import backfill, state
+
+from .. import data
+from ..conftest import InfoFactory
+from .test_bank import block
+
+PROPOSAL = {key: value for key, value in data.PROPOSALS[0].items() if key != "_id"}
+
+
+def test_validator_pass():
+    validator = backfill.ShapeValidator()
+    validator.check("proposals", PROPOSAL)
+    validator.check("votes", {key: value for key, value in data.VOTES[0].items()})
+
+
+@pytest.mark.parametrize("fields", data.mongo_validation.PROPOSAL_TYPE_MISMATCH)
+def test_validator_type(fields):
+    validator = backfill.ShapeValidator()
+    with pytest.raises(backfill.DocumentValidationError, match="type did not match"):
+        validator.check("proposals", {**PROPOSAL, **fields})
+
+
+@pytest.mark.parametrize("fields", data.mongo_validation.PROPOSAL_WRONG_VALUES)
+def test_validator_wrong(fields):
+    validator = backfill.ShapeValidator()
+    with pytest.raises(
+        backfill.DocumentValidationError, match="minimum|maximum|unique"
+    ):
+        validator.check("proposals", {**PROPOSAL, **fields})
+
+
+@pytest.mark.parametrize("field", data.mongo_validation.PROPOSAL_REQUIRED_FIELDS)
+def test_validator_required(field):
+    validator = backfill.ShapeValidator()
+    proposal = {key: value for key, value in PROPOSAL.items() if key != field}
+    with pytest.raises(backfill.DocumentValidationError, match="required"):
+        validator.check("proposals", proposal)
+
+
+def test_validator_shapes():
+    validator = backfill.ShapeValidator()
+    validator.check("proposals", PROPOSAL)
+
+    # Only the first document of a shape is validated
+    validator.check("proposals", {**PROPOSAL, "majority": 120})
+    with pytest.raises(backfill.DocumentValidationError):
+        validator.check("proposals", {**PROPOSAL, "majority": "120"})
+
+
+async def test_backfill_mode(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    db = mongomock_client.db
+    storage.init_db(db, query_indexes=False)
+    assert "voterAddress_1_votedAt_-1" not in db.votes.index_information()
+
+    engine = state.StateEngine()
+    indexer_storage = SimpleNamespace(db=db)
+    controller = backfill.Backfill(threshold=10, engine=engine)
+    controller.attach(indexer_storage)
+
+    storages = []
+    block_handler = backfill.backfill_block_handler(controller)
+
+    async def run_block(number: int, with_events: bool = True):
+        # As apibara, the new events handler is only called for the blocks with
+        # events, after the block handler
+        info = mongomock_info(number, context={"db": db})
+        await block_handler(info, NewBlock(new_head=block(number)))
+        if with_events:
+            storages.append(info.storage)
+
+    try:
+        metrics.CHAIN_HEAD_BLOCK.set(20)
+        await run_block(1)
+        assert controller.active
+        assert metrics.BACKFILL_MODE.get() == 1
+        assert isinstance(storages[-1], backfill.ValidatingStorage)
+        assert not engine.ordered and engine.validate is not None
+
+        # Backfilling until the indexer is less than threshold / 2 blocks behind,
+        # even if the DAO emitted no events in the last blocks
+        await run_block(14)
+        assert controller.active
+        await run_block(15, with_events=False)
+        assert not controller.active
+        await run_block(16)
+        assert metrics.BACKFILL_MODE.get() == 0
+        assert not isinstance(storages[-1], backfill.ValidatingStorage)
+        assert indexer_storage.db is db
+        assert (
+            engine.ordered and engine.validate is None and engine.write_concern is None
+        )
+
+        # The indexes of the queries are built
+        indexes = db.votes.index_information()
+        assert "voterAddress_1_votedAt_-1" in indexes
+        assert "dao_1__chain.valid_to_1" in indexes
+    finally:
+        metrics.CHAIN_HEAD_BLOCK.set(0)
+        metrics.BACKFILL_MODE.set(0)
+
+
+async def test_backfill_not_behind(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    db = mongomock_client.db
+    storage.init_db(db, query_indexes=False)
+    controller = backfill.Backfill(threshold=100)
+
+    try:
+        metrics.CHAIN_HEAD_BLOCK.set(1010)
+        controller.update(db, 1000)
+        assert not controller.active
+        # Built right away
+        assert "voterAddress_1_votedAt_-1" in db.votes.index_information()
+    finally:
+        metrics.CHAIN_HEAD_BLOCK.set(0)
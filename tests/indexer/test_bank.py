@@ -0,0 +1,85 @@
+import itertools
+from datetime import datetime, timezone
+from typing import Optional
+from unittest.mock import Mock
+
+from apibara.model import BlockHeader
+from pymongo import MongoClient
+
+from dao import utils
+from dao.indexer import bank, members
+
+from ..conftest import InfoFactory
+
+MEMBER = utils.int_to_bytes(0x1)
+TOKEN = utils.int_to_bytes(0xFEE)
+
+
+def block(number: int) -> BlockHeader:
+    timestamp = datetime(2022, 11, 18, number, tzinfo=timezone.utc)
+    return BlockHeader(hash=b"", parent_hash=b"", number=number, timestamp=timestamp)
+
+
+# The events are keyed by their log index, the events already applied are skipped
+LOG_INDEXES = itertools.count()
+
+
+def starknet_event(event, log_index: Optional[int] = None, **fields) -> Mock:
+    if log_index is None:
+        log_index = next(LOG_INDEXES)
+    event_ = Mock(log_index=log_index, transaction_hash=b"\x01", **fields)
+    event_.name = type(event).__name__
+    return event_
+
+
+async def apply(info_factory: InfoFactory, number: int, event):
+    info = info_factory(number)
+    await event.handle(
+        info=info, block=block(number), starknet_event=starknet_event(event)
+    )
+
+
+def current_tokens(client: MongoClient) -> list:
+    return list(
+        client.db.tokens.find(
+            {"_chain.valid_to": None},
+            projection={"_id": False, "_chain": False, "_applied": False},
+        )
+    )
+
+
+async def test_tokens_registry(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    await apply(
+        mongomock_info, 1, members.MemberAdded(MEMBER, 1, 0, block(1).timestamp)
+    )
+    await apply(mongomock_info, 2, bank.TokenWhitelisted("Fee", TOKEN))
+
+    assert current_tokens(mongomock_client) == [
+        {
+            "tokenName": "Fee",
+            "tokenAddress": TOKEN,
+            "whitelistedAt": block(2).timestamp,
+            "unWhitelistedAt": None,
+            "active": True,
+        }
+    ]
+
+    # The token name of the balance is read from the registry
+    await apply(mongomock_info, 3, bank.UserTokenBalanceIncreased(MEMBER, TOKEN, 10))
+    member = mongomock_client.db.members.find_one({"_chain.valid_to": None})
+    assert member["balances"] == [
+        {"tokenAddress": TOKEN, "tokenName": "Fee", "amount": 10}
+    ]
+
+    await apply(mongomock_info, 4, bank.TokenUnWhitelisted("Fee", TOKEN))
+    (token,) = current_tokens(mongomock_client)
+    assert token["active"] is False
+    assert token["unWhitelistedAt"] == block(4).timestamp
+
+    await apply(mongomock_info, 5, bank.TokenWhitelisted("Fee", TOKEN))
+    (token,) = current_tokens(mongomock_client)
+    assert token["active"] is True
+    assert token["whitelistedAt"] == block(5).timestamp
+    assert token["unWhitelistedAt"] is None
@@ -0,0 +1,77 @@
+from unittest.mock import AsyncMock, Mock
+
+from pymongo import MongoClient
+
+from dao.indexer import compaction
+
+
+def populate(db, versions: int = 5):
+    """Inserts versions versions of a member, each valid for 10 blocks"""
+    for i in range(versions):
+        db["members"].insert_one(
+            {
+                "memberAddress": b"\x01",
+                "shares": i,
+                "_chain": {
+                    "valid_from": i * 10,
+                    "valid_to": None if i == versions - 1 else (i + 1) * 10,
+                },
+            }
+        )
+
+
+def test_compact(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    populate(db)
+
+    counts = compaction.compact(db, finalized_block=30, batch_size=1)
+
+    # The versions superseded at block 10 and 20
+    assert counts["members"] == 2
+    assert counts["proposals"] == 0
+    assert [member["shares"] for member in db["members"].find()] == [2, 3, 4]
+    assert "_archive_members" not in db.list_collection_names()
+
+
+def test_compact_archive(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    populate(db)
+
+    counts = compaction.compact(db, finalized_block=100, batch_size=2, archive=True)
+
+    assert counts["members"] == 4
+    assert [member["shares"] for member in db["members"].find()] == [4]
+    archived = db[compaction.ARCHIVE_PREFIX + "members"].find()
+    assert [member["shares"] for member in archived] == [0, 1, 2, 3]
+
+
+def test_compact_max_batches(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    populate(db)
+
+    counts = compaction.compact(db, finalized_block=100, batch_size=1, max_batches=2)
+
+    assert counts["members"] == 2
+    assert db["members"].count_documents({}) == 3
+
+
+async def test_compaction_handler(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    populate(db)
+
+    handler = AsyncMock()
+    compactor = compaction.Compactor(finality_depth=20, interval=30, batch_size=1)
+    wrapper = compaction.compaction_handler(handler, compactor)
+    info = Mock(context={"db": db})
+
+    await wrapper(info, Mock(block=Mock(number=20)))
+    assert db["members"].count_documents({}) == 5
+
+    # A single batch of versions superseded before block 30 is compacted
+    await wrapper(info, Mock(block=Mock(number=50)))
+    assert db["members"].count_documents({}) == 4
+
+    await wrapper(info, Mock(block=Mock(number=60)))
+    assert db["members"].count_documents({}) == 4
+
+    assert handler.await_count == 3
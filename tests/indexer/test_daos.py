@@ -0,0 +1,107 @@
+from unittest.mock import Mock
+
+import pytest
+from pymongo import MongoClient
+
+from dao import config, utils
+from dao.indexer import bank, daos, members, pipeline
+from dao.models import Dao
+
+from ..conftest import InfoFactory
+from .test_bank import MEMBER, TOKEN, block, starknet_event
+
+DAO_1 = Dao.parse("0x0123:0xB1")
+DAO_2 = Dao.parse("0x0456:0xB2")
+DAOS = {dao.address: dao for dao in (DAO_1, DAO_2)}
+
+
+def dao_event(dao: Dao, event) -> Mock:
+    # The event addresses are 32 bytes long
+    return starknet_event(event, address=dao.address.rjust(32, b"\0"))
+
+
+async def apply(info_factory: InfoFactory, number: int, dao: Dao, event):
+    info = info_factory(number, context={"daos": DAOS})
+    await pipeline.apply(info, block(number), dao_event(dao, event), event)
+
+
+def current_documents(client: MongoClient, collection: str, dao: Dao) -> list:
+    return list(
+        client.db[collection].find(
+            {"_chain.valid_to": None, "dao": dao.address},
+            projection={"_id": False, "_chain": False, "dao": False},
+        )
+    )
+
+
+async def test_daos_documents(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    for dao, shares in ((DAO_1, 1), (DAO_2, 2)):
+        await apply(
+            mongomock_info,
+            1,
+            dao,
+            members.MemberAdded(MEMBER, shares, 0, block(1).timestamp),
+        )
+        await apply(mongomock_info, 1, dao, bank.TokenWhitelisted("Fee", TOKEN))
+
+    # The same member and bank balances are updated in each DAO
+    await apply(
+        mongomock_info, 2, DAO_1, bank.UserTokenBalanceIncreased(MEMBER, TOKEN, 10)
+    )
+    await apply(
+        mongomock_info,
+        2,
+        DAO_2,
+        bank.UserTokenBalanceIncreased(DAO_2.bank_address, TOKEN, 20),
+    )
+
+    members_1 = current_documents(mongomock_client, "members", DAO_1)
+    members_2 = current_documents(mongomock_client, "members", DAO_2)
+    assert [member["shares"] for member in members_1] == [1]
+    assert [member["shares"] for member in members_2] == [2]
+    assert members_1[0]["balances"] == [
+        {"tokenAddress": TOKEN, "tokenName": "Fee", "amount": 10}
+    ]
+    assert members_2[0].get("balances") is None
+
+    # Each DAO has its own bank
+    [bank_1] = current_documents(mongomock_client, "bank", DAO_1)
+    [bank_2] = current_documents(mongomock_client, "bank", DAO_2)
+    assert bank_1["bankAddress"] == DAO_1.bank_address
+    assert bank_1.get("balances") is None
+    assert bank_2["bankAddress"] == DAO_2.bank_address
+    assert bank_2["balances"] == [
+        {"tokenAddress": TOKEN, "tokenName": "Fee", "amount": 20}
+    ]
+
+    assert len(current_documents(mongomock_client, "events", DAO_1)) == 3
+    events_2 = current_documents(mongomock_client, "events", DAO_2)
+    assert len(events_2) == 3
+    # The addresses of the payload, the DAO isn't one of them
+    assert events_2[-1]["name"] == "UserTokenBalanceIncreased"
+    assert events_2[-1]["addresses"] == sorted([DAO_2.bank_address, TOKEN])
+
+
+async def test_unknown_dao(mongomock_info: InfoFactory):
+    dao = Dao.parse("0x0789")
+    with pytest.raises(ValueError, match="unknown DAO 0x0789"):
+        await apply(mongomock_info, 1, dao, bank.TokenWhitelisted("Fee", TOKEN))
+
+
+def test_scope_entity_keys():
+    keys = bank.balance_entity_keys(DAO_1.bank_address, TOKEN)
+
+    assert daos.scope_entity_keys(DAO_1, keys) == {
+        (DAO_1.address, "token", TOKEN),
+        (DAO_1.address, "member", DAO_1.bank_address),
+        (DAO_1.address, "bank"),
+    }
+    # The bank of DAO_1 is a member of DAO_2
+    assert (DAO_2.address, "bank") not in daos.scope_entity_keys(DAO_2, keys)
+    assert daos.scope_entity_keys(DAO_1, None) is None
+
+    # Without any DAO, the bank is the config one
+    keys = bank.balance_entity_keys(utils.int_to_bytes(config.bank_address), TOKEN)
+    assert (b"", "bank") in daos.scope_entity_keys(None, keys)
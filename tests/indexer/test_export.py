@@ -0,0 +1,97 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import MongoClient
+
+from dao.indexer import export
+
+TIMESTAMP = datetime(2022, 11, 18, tzinfo=timezone.utc)
+
+
+def populate(db):
+    for block_number in range(0, 30, 5):
+        db["events"].insert_one(
+            {
+                "name": "UserTokenBalanceDecreased",
+                "emittedAt": TIMESTAMP,
+                "memberAddress": b"\x01",
+                "tokenAddress": b"\x02",
+                "amount": block_number,
+                "_chain": {"valid_from": block_number, "valid_to": None},
+            }
+        )
+    db["events"].insert_one(
+        {
+            "name": "MemberAdded",
+            "emittedAt": TIMESTAMP,
+            "memberAddress": b"\x01",
+            "_chain": {"valid_from": 12, "valid_to": None},
+        }
+    )
+    db["members"].insert_many(
+        [
+            {"memberAddress": b"\x01", "_chain": {"valid_from": 12, "valid_to": 20}},
+            {"memberAddress": b"\x01", "_chain": {"valid_from": 20, "valid_to": None}},
+        ]
+    )
+
+
+def read_partitions(directory: Path) -> dict[str, list[dict]]:
+    partitions = {}
+    for path in sorted(directory.iterdir()):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            partitions[path.name] = [json.loads(line) for line in f]
+    return partitions
+
+
+def test_export(mongomock_client: MongoClient, tmp_path: Path):
+    db = mongomock_client.db
+    populate(db)
+
+    counts = export.export(
+        db, tmp_path, from_block=5, to_block=24, partition_size=10, batch_size=2
+    )
+
+    assert counts == {"events": 5, "members": 2, "proposals": 0, "transactions": 4}
+    assert not any((tmp_path / "proposals").iterdir())
+
+    transactions = read_partitions(tmp_path / "transactions")
+    assert list(transactions) == [
+        "blocks-000000000005-000000000009.ndjson.gz",
+        "blocks-000000000010-000000000019.ndjson.gz",
+        "blocks-000000000020-000000000024.ndjson.gz",
+    ]
+    assert transactions["blocks-000000000005-000000000009.ndjson.gz"] == [
+        {
+            "blockNumber": 5,
+            "timestamp": TIMESTAMP.isoformat(),
+            "memberAddress": "0x01",
+            "tokenAddress": "0x02",
+            "amount": -5,
+        }
+    ]
+
+    members = read_partitions(tmp_path / "members")
+    assert members == {
+        "blocks-000000000010-000000000019.ndjson.gz": [
+            {"blockNumber": 12, "memberAddress": "0x01"}
+        ],
+        "blocks-000000000020-000000000024.ndjson.gz": [
+            {"blockNumber": 20, "memberAddress": "0x01"}
+        ],
+    }
+
+    events = read_partitions(tmp_path / "events")
+    assert [
+        event["name"] for event in events["blocks-000000000010-000000000019.ndjson.gz"]
+    ] == ["UserTokenBalanceDecreased", "MemberAdded", "UserTokenBalanceDecreased"]
+
+
+def test_watermark(tmp_path: Path):
+    assert export.read_watermark(tmp_path) is None
+
+    export.write_watermark(tmp_path, 42)
+
+    assert export.read_watermark(tmp_path) == 42
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from starknet_py.net.client_errors import ClientError
+
+from dao import metrics
+from dao.indexer.gateway import CircuitBreaker, CircuitOpenError, PooledGatewayClient
+
+from ..fake_gateway import CLASS_HASH, FakeGateway
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+async def fake_gateway():
+    gateway = FakeGateway()
+    await gateway.start()
+    yield gateway
+    await gateway.stop()
+
+
+def create_client(gateway: FakeGateway, **kwargs) -> PooledGatewayClient:
+    return PooledGatewayClient(gateway.url, backoff_base=0, **kwargs)
+
+
+async def test_lookups(fake_gateway: FakeGateway):
+    async with create_client(fake_gateway) as client:
+        block = await client.get_block(block_number=7)
+        latest = await client.get_block(block_number="latest")
+        class_hash = await client.get_class_hash_at(0x123)
+
+    assert block.block_number == 7
+    assert latest.block_number == fake_gateway.head
+    assert class_hash == CLASS_HASH
+    # The connection is kept alive between the requests
+    assert len(fake_gateway.connections) == 1
+    assert metrics.GATEWAY_REQUEST_LATENCY.count(method="get_block", result="success")
+
+
+async def test_retries(fake_gateway: FakeGateway):
+    retries = metrics.GATEWAY_RETRIES.get(method="get_block")
+    fake_gateway.fail(503, count=2)
+
+    async with create_client(fake_gateway, max_retries=2) as client:
+        block = await client.get_block(block_number=1)
+
+        assert block.block_number == 1
+        assert fake_gateway.requests == ["get_block"] * 3
+        assert metrics.GATEWAY_RETRIES.get(method="get_block") == retries + 2
+
+        fake_gateway.fail(502, count=3)
+        with pytest.raises(ClientError, match="502"):
+            await client.get_block(block_number=1)
+
+
+async def test_starknet_errors_are_not_retried(fake_gateway: FakeGateway):
+    async with create_client(fake_gateway) as client:
+        with pytest.raises(ClientError, match="StarknetErrorCode"):
+            await client.get_class_by_hash(CLASS_HASH)
+
+        assert fake_gateway.requests == ["get_class_by_hash"]
+        assert client.circuit_breaker.failures == 0
+
+
+async def test_concurrency_limit(fake_gateway: FakeGateway):
+    fake_gateway.latency = 0.02
+
+    async with create_client(fake_gateway, max_concurrency=2) as client:
+        blocks = await asyncio.gather(
+            *(client.get_block(block_number=number) for number in range(6))
+        )
+
+    assert [block.block_number for block in blocks] == list(range(6))
+    assert fake_gateway.max_in_flight == 2
+    assert metrics.GATEWAY_IN_FLIGHT.get() == 0
+
+
+async def test_circuit_breaker(fake_gateway: FakeGateway):
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    fake_gateway.fail(503, count=3)
+
+    async with create_client(
+        fake_gateway, max_retries=0, circuit_breaker=breaker
+    ) as client:
+        for _ in range(2):
+            with pytest.raises(ClientError):
+                await client.get_block(block_number=1)
+
+        # Rejected without reaching the gateway
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await client.get_block(block_number=1)
+        assert len(fake_gateway.requests) == 2
+        assert metrics.GATEWAY_CIRCUIT_OPEN.get() == 1
+
+        # A failed trial opens the circuit again
+        clock.now = 10
+        with pytest.raises(ClientError):
+            await client.get_block(block_number=1)
+        assert breaker.state == "open"
+
+        clock.now = 20
+        assert breaker.state == "half-open"
+        assert (await client.get_block(block_number=1)).block_number == 1
+        assert breaker.state == "closed"
+        assert metrics.GATEWAY_CIRCUIT_OPEN.get() == 0
@@ -8,7 +8,7 @@ from dao.indexer import handler
 async def test_default_new_events_handler_edge_cases(
     monkeypatch: MonkeyPatch, caplog: LogCaptureFixture
 ):
-    info = Mock()
+    info = Mock(context={})
     event_mock = Mock()
     block_events = Mock(events=[event_mock])
     get_mock = Mock(return_value=None)
@@ -23,3 +23,17 @@ async def test_default_new_events_handler_edge_cases(
     get_mock.assert_called_once_with(event_mock.name)
 
     assert "Cannot find event class for" in caplog.text
+
+
+async def test_combine_block_handlers():
+    calls = []
+
+    async def first(info, new_block):
+        calls.append(("first", new_block))
+
+    async def second(info, new_block):
+        calls.append(("second", new_block))
+
+    new_block = Mock()
+    await handler.combine_block_handlers([first, second])(Mock(), new_block)
+    assert calls == [("first", new_block), ("second", new_block)]
@@ -0,0 +1,66 @@
+from apibara.model import NewEvents
+from pymongo import MongoClient
+
+from dao.indexer import idempotency
+
+from ..conftest import InfoFactory
+from .test_bank import block, starknet_event
+from .test_state import BLOCKS, COLLECTIONS, current_documents, handle_events, run_block
+
+
+async def test_replayed_blocks(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    for number in BLOCKS:
+        await run_block(mongomock_info, mongomock_client, handle_events, number, "db")
+        # Applied again after a restart
+        for _ in range(2):
+            await run_block(
+                mongomock_info, mongomock_client, handle_events, number, "replay"
+            )
+
+    for collection in COLLECTIONS:
+        assert current_documents(
+            mongomock_client, "replay", collection
+        ) == current_documents(mongomock_client, "db", collection), collection
+
+
+async def test_partially_applied_events(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    async def partial_handler(info, block_events: NewEvents):
+        for index, event in enumerate(BLOCKS[block_events.block.number]):
+            # The writes are applied but the event isn't recorded
+            key = idempotency.get_event_key(
+                block_events.block, starknet_event(event, log_index=index)
+            )
+            await event._handle(
+                idempotency.get_event_info(info, key),
+                block_events.block,
+                starknet_event(event, log_index=index),
+            )
+        await handle_events(info, block_events)
+
+    for number in BLOCKS:
+        await run_block(mongomock_info, mongomock_client, handle_events, number, "db")
+        await run_block(
+            mongomock_info, mongomock_client, partial_handler, number, "partial"
+        )
+
+    for collection in COLLECTIONS:
+        assert current_documents(
+            mongomock_client, "partial", collection
+        ) == current_documents(mongomock_client, "db", collection), collection
+
+
+async def test_applied_event(mongomock_info: InfoFactory):
+    info = mongomock_info(1)
+    event = BLOCKS[1][1]
+    key = idempotency.get_event_key(block(1), starknet_event(event, log_index=1))
+
+    assert not await idempotency.is_applied(info, key)
+    await event.handle(
+        info=info, block=block(1), starknet_event=starknet_event(event, log_index=1)
+    )
+    assert await idempotency.is_applied(info, key)
+    assert idempotency.get_event_position(key) == (1 << 20) | 1
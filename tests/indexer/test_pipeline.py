@@ -0,0 +1,108 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from apibara.model import BlockHeader
+from pytest import MonkeyPatch
+
+from dao.indexer import deserializer, handler, pipeline
+from dao.indexer.base_event import BaseEvent
+from dao.indexer.deserializer import BlockNumber
+
+GATEWAY_LATENCY = 0.02
+STORAGE_LATENCY = 0.02
+
+
+@dataclass
+class FakeEvent(BaseEvent):
+    id: int
+    emittedAt: BlockNumber
+
+    async def handle(self, info, block, starknet_event):
+        # pymongo is blocking, the storage latency blocks the event loop
+        time.sleep(STORAGE_LATENCY)
+        info.context["applied"].append(self.id)
+
+
+def make_block(number: int) -> BlockHeader:
+    return BlockHeader(
+        hash=b"", parent_hash=b"", number=number, timestamp=datetime(2022, 11, 18)
+    )
+
+
+@pytest.fixture
+def fake_gateway(monkeypatch: MonkeyPatch):
+    async def decode_starknet_event(info, starknet_event):
+        id_, emitted_at = starknet_event.data
+        return SimpleNamespace(
+            tuple_value=SimpleNamespace(id=id_, emittedAt=emitted_at),
+            id=id_,
+            emittedAt=emitted_at,
+        )
+
+    async def get_block(block_number, client):
+        # Older events wait longer to make sure the order doesn't depend on
+        # the order the enrichments finish in
+        await asyncio.sleep(GATEWAY_LATENCY * (1 + 1 / (block_number + 1)))
+        return make_block(block_number)
+
+    monkeypatch.setattr(pipeline, "decode_starknet_event", decode_starknet_event)
+    monkeypatch.setattr(deserializer, "get_block", get_block)
+
+
+def make_block_events(count: int):
+    events = [SimpleNamespace(name="FakeEvent", data=[i, i]) for i in range(count)]
+    return Mock(block=make_block(count + 1), events=events)
+
+
+async def handle_block(block_events, pipeline_queue_size: int) -> tuple[list, float]:
+    info = Mock(
+        context={
+            "applied": [],
+            "starknet_client": None,
+            "pipeline_queue_size": pipeline_queue_size,
+        },
+        storage=AsyncMock(),
+    )
+
+    start = time.perf_counter()
+    await handler.default_new_events_handler(
+        info=info, block_events=block_events, event_classes={"FakeEvent": FakeEvent}
+    )
+
+    return info.context["applied"], time.perf_counter() - start
+
+
+@pytest.mark.parametrize("pipeline_queue_size", [1, 4, 32])
+async def test_pipeline_keeps_block_order(fake_gateway, pipeline_queue_size):
+    block_events = make_block_events(10)
+
+    applied, _ = await handle_block(block_events, pipeline_queue_size)
+
+    assert applied == list(range(10))
+
+
+async def test_pipeline_speedup(fake_gateway):
+    block_events = make_block_events(20)
+
+    sequential_applied, sequential_duration = await handle_block(block_events, 0)
+    pipeline_applied, pipeline_duration = await handle_block(block_events, 8)
+
+    # Gateway lookups overlap with the storage writes, so the pipeline should take
+    # roughly the storage latency per event instead of the sum of both latencies
+    assert pipeline_applied == sequential_applied
+    assert pipeline_duration < sequential_duration * 0.75
+
+
+async def test_pipeline_error(fake_gateway, monkeypatch: MonkeyPatch):
+    async def get_block(block_number, client):
+        raise ConnectionError("gateway is down")
+
+    monkeypatch.setattr(deserializer, "get_block", get_block)
+
+    with pytest.raises(ConnectionError, match="gateway is down"):
+        await handle_block(make_block_events(5), 2)
@@ -0,0 +1,123 @@
+from pymongo import MongoClient
+
+from dao import config, utils
+from dao.indexer import bank, members
+
+from ..conftest import InfoFactory
+from .test_bank import MEMBER, TOKEN, apply, block
+
+BANK = utils.int_to_bytes(config.bank_address)
+
+
+def current_rollups(client: MongoClient, collection: str, period: str) -> list:
+    return list(
+        client.db[collection].find(
+            {"_chain.valid_to": None, "period": period},
+            projection={
+                "_id": False,
+                "_chain": False,
+                "_applied": False,
+                "period": False,
+            },
+            sort=[("periodStart", 1)],
+        )
+    )
+
+
+async def test_treasury_rollups(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    await apply(mongomock_info, 1, bank.TokenWhitelisted("Fee", TOKEN))
+    await apply(mongomock_info, 1, bank.UserTokenBalanceIncreased(BANK, TOKEN, 100))
+    await apply(mongomock_info, 1, bank.UserTokenBalanceDecreased(BANK, TOKEN, 30))
+    await apply(mongomock_info, 2, bank.UserTokenBalanceIncreased(BANK, TOKEN, 10))
+    # Only the bank balances are part of the treasury
+    await apply(
+        mongomock_info, 2, members.MemberAdded(MEMBER, 1, 0, block(2).timestamp)
+    )
+    await apply(mongomock_info, 2, bank.UserTokenBalanceIncreased(MEMBER, TOKEN, 5))
+
+    assert current_rollups(mongomock_client, "treasury_rollups", "hour") == [
+        {
+            "tokenAddress": TOKEN,
+            "periodStart": block(1).timestamp,
+            "inflow": 100,
+            "outflow": 30,
+            "closingBalance": 70,
+        },
+        {
+            "tokenAddress": TOKEN,
+            "periodStart": block(2).timestamp,
+            "inflow": 10,
+            "outflow": 0,
+            "closingBalance": 80,
+        },
+    ]
+    assert current_rollups(mongomock_client, "treasury_rollups", "day") == [
+        {
+            "tokenAddress": TOKEN,
+            "periodStart": block(0).timestamp,
+            "inflow": 110,
+            "outflow": 30,
+            "closingBalance": 80,
+        },
+    ]
+
+
+async def test_membership_rollups(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    another_member = utils.int_to_bytes(0x2)
+
+    await apply(
+        mongomock_info, 1, members.MemberAdded(MEMBER, 5, 2, block(1).timestamp)
+    )
+    await apply(
+        mongomock_info,
+        1,
+        members.MemberAdded(another_member, 3, 0, block(1).timestamp),
+    )
+    # The member exits
+    await apply(
+        mongomock_info,
+        3,
+        members.MemberUpdated(MEMBER, MEMBER, 0, 2, False, 0, block(1).timestamp),
+    )
+    # The other one is jailed
+    await apply(
+        mongomock_info,
+        3,
+        members.MemberUpdated(
+            another_member, another_member, 3, 0, True, 0, block(1).timestamp
+        ),
+    )
+
+    first_hour = {
+        "periodStart": block(1).timestamp,
+        "totalShares": 8,
+        "totalLoot": 2,
+        "activeCount": 2,
+        "jailedCount": 0,
+        "exitedCount": 0,
+    }
+    assert current_rollups(mongomock_client, "membership_rollups", "hour") == [
+        first_hour,
+        {
+            **first_hour,
+            "periodStart": block(3).timestamp,
+            "totalShares": 3,
+            "activeCount": 0,
+            "jailedCount": 1,
+            "exitedCount": 1,
+        },
+    ]
+    assert current_rollups(mongomock_client, "membership_rollups", "day") == [
+        {
+            **first_hour,
+            "periodStart": block(0).timestamp,
+            "totalShares": 3,
+            "activeCount": 0,
+            "jailedCount": 1,
+            "exitedCount": 1,
+        },
+    ]
@@ -0,0 +1,235 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+import pytest
+from apibara.indexer.storage import Storage
+from apibara.model import BlockHeader, NewBlock
+from pymongo import MongoClient
+
+from dao import config, utils
+from dao.indexer import bank, members, pipeline, proposals
+from dao.indexer.scheduler import (
+    ExecutorStorage,
+    KeyedScheduler,
+    executor_block_handler,
+)
+
+from ..conftest import InfoFactory
+from .test_bank import starknet_event
+
+MEMBERS = [utils.int_to_bytes(address) for address in (0x1, 0x2, 0x3)]
+TOKEN = utils.int_to_bytes(0xFEE)
+BANK = utils.int_to_bytes(config.bank_address)
+NOW = datetime(2022, 11, 18, tzinfo=timezone.utc)
+
+
+async def test_scheduler_keeps_order_per_key():
+    scheduler = KeyedScheduler()
+    runs = []
+
+    async def run(name, delay):
+        await asyncio.sleep(delay)
+        runs.append(name)
+
+    start = time.perf_counter()
+    await scheduler.submit({"a"}, lambda: run("a1", 0.05))
+    await scheduler.submit({"b"}, lambda: run("b1", 0.05))
+    await scheduler.submit({"a"}, lambda: run("a2", 0))
+    await scheduler.submit({"a", "b"}, lambda: run("ab", 0))
+    await scheduler.submit({"c"}, lambda: run("c1", 0))
+    await scheduler.join()
+
+    # Independent keys ran concurrently
+    assert time.perf_counter() - start < 0.1
+    assert runs.index("a1") < runs.index("a2") < runs.index("ab")
+    assert runs.index("b1") < runs.index("ab")
+    assert runs[0] == "c1"
+
+
+async def test_scheduler_barrier():
+    scheduler = KeyedScheduler()
+    runs = []
+
+    async def run(name, delay):
+        await asyncio.sleep(delay)
+        runs.append(name)
+
+    await scheduler.submit({"a"}, lambda: run("a", 0.02))
+    await scheduler.submit({"b"}, lambda: run("b", 0.01))
+    await scheduler.submit(None, lambda: run("barrier", 0))
+    await scheduler.submit({"c"}, lambda: run("c", 0))
+    await scheduler.join()
+
+    assert runs == ["b", "a", "barrier", "c"]
+
+
+async def test_scheduler_error():
+    scheduler = KeyedScheduler()
+    runs = []
+
+    async def fail():
+        raise ValueError("handler failed")
+
+    async def run(name):
+        runs.append(name)
+
+    await scheduler.submit({"a"}, fail)
+    await scheduler.submit({"a"}, lambda: run("a"))
+    await scheduler.submit({"b"}, lambda: run("b"))
+
+    with pytest.raises(ValueError, match="handler failed"):
+        await scheduler.join()
+
+    # Events depending on a failed one are never applied
+    assert runs == ["b"]
+
+
+class RandomLatencyStorage(Storage):
+    """Yields to the event loop before each operation to shuffle the interleaving
+    of the concurrent handlers"""
+
+    async def insert_one(self, *args, **kwargs):
+        await asyncio.sleep(random.random() / 1000)
+        return await super().insert_one(*args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        await asyncio.sleep(random.random() / 1000)
+        return await super().find_one(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        await asyncio.sleep(random.random() / 1000)
+        return await super().find_one_and_update(*args, **kwargs)
+
+
+def make_events() -> list:
+    events = [
+        proposals.ProposalParamsUpdated("Signaling", 50, 60, 10, 10),
+        bank.TokenWhitelisted(tokenName="Fee", tokenAddress=TOKEN),
+    ]
+    events += [members.MemberAdded(address, 10, 5, NOW) for address in MEMBERS]
+    events += [
+        proposals.ProposalAdded(id_, "Title", "Signaling", "Link", NOW, MEMBERS[0])
+        for id_ in range(3)
+    ]
+    events += [
+        members.VoteSubmitted(address, id_, bool((id_ + i) % 2), address)
+        for id_ in range(3)
+        for i, address in enumerate(MEMBERS)
+    ]
+    events += [
+        bank.UserTokenBalanceIncreased(address, TOKEN, 100)
+        for address in MEMBERS + [BANK]
+    ]
+    events += [
+        members.RoleGranted(MEMBERS[1], "admin", MEMBERS[0]),
+        members.MemberUpdated(MEMBERS[2], MEMBERS[2], 20, 0, True, 2, NOW),
+        proposals.ProposalStatusUpdated(1, "approved"),
+        bank.UserTokenBalanceDecreased(MEMBERS[0], TOKEN, 40),
+        bank.UserTokenBalanceDecreased(BANK, TOKEN, 40),
+        members.RoleRevoked(MEMBERS[1], "admin", MEMBERS[0]),
+    ]
+    return events
+
+
+def current_documents(client: MongoClient, db_name: str, collection: str) -> list:
+    documents = client[db_name][collection].find({"_chain.valid_to": None})
+    documents = [
+        {key: value for key, value in document.items() if key != "_id"}
+        for document in documents
+    ]
+    return sorted(documents, key=repr)
+
+
+@pytest.mark.parametrize("seed", range(5))
+async def test_concurrent_handlers_equal_sequential(
+    seed, mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    random.seed(seed)
+    block = BlockHeader(hash=b"", parent_hash=b"", number=1, timestamp=NOW)
+
+    for db_name, concurrent in (("sequential", False), ("concurrent", True)):
+        info = mongomock_info(
+            block.number,
+            context={"concurrent_handlers": concurrent},
+            storage_class=RandomLatencyStorage,
+            db_name=db_name,
+        )
+        scheduler = pipeline.create_scheduler(info)
+        assert scheduler.concurrent is concurrent
+
+        for index, event in enumerate(make_events()):
+            await pipeline.schedule(
+                scheduler, info, block, starknet_event(event, log_index=index), event
+            )
+
+        await scheduler.join()
+
+    for collection in (
+        "proposals",
+        "proposal_params",
+        "members",
+        "bank",
+        "votes",
+        "tokens",
+    ):
+        sequential = current_documents(mongomock_client, "sequential", collection)
+        concurrent = current_documents(mongomock_client, "concurrent", collection)
+        assert sequential
+        assert sequential == concurrent
+
+
+LATENCY = 0.005
+
+
+class BlockingLatencyStorage(Storage):
+    """Blocks the thread during each operation, as the pymongo round trips do"""
+
+    async def insert_one(self, *args, **kwargs):
+        time.sleep(LATENCY)
+        return await super().insert_one(*args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        time.sleep(LATENCY)
+        return await super().find_one(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        time.sleep(LATENCY)
+        return await super().find_one_and_update(*args, **kwargs)
+
+
+async def test_executor_storage(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    block = BlockHeader(hash=b"", parent_hash=b"", number=1, timestamp=NOW)
+    durations = {}
+
+    for db_name, concurrent in (("sequential", False), ("concurrent", True)):
+        info = mongomock_info(
+            block.number,
+            context={"concurrent_handlers": concurrent},
+            storage_class=BlockingLatencyStorage,
+            db_name=db_name,
+        )
+        if concurrent:
+            await executor_block_handler(info, NewBlock(new_head=block))
+            assert isinstance(info.storage, ExecutorStorage)
+
+        start = time.perf_counter()
+        scheduler = pipeline.create_scheduler(info)
+        for index, event in enumerate(make_events()):
+            await pipeline.schedule(
+                scheduler, info, block, starknet_event(event, log_index=index), event
+            )
+        await scheduler.join()
+        durations[db_name] = time.perf_counter() - start
+
+    # The handlers of independent entities overlapped on the storage latency
+    assert durations["concurrent"] < durations["sequential"] * 0.7
+    for collection in ("proposals", "members", "bank", "votes"):
+        sequential = current_documents(mongomock_client, "sequential", collection)
+        assert sequential
+        assert sequential == current_documents(
+            mongomock_client, "concurrent", collection
+        )
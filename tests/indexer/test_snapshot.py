@@ -0,0 +1,124 @@
+import gzip
+from pathlib import Path
+from unittest.mock import Mock
+
+import bson
+import pytest
+from apibara.model import NewBlock
+from pymongo import MongoClient
+
+from dao.indexer import idempotency, snapshot
+
+from .. import data
+from ..conftest import InfoFactory
+from .test_bank import block
+
+EVENTS = [
+    {
+        "name": "MemberAdded",
+        "emittedAt": data.common.START_TIME,
+        "blockNumber": 1,
+        "transactionHash": 0x1,
+        "logIndex": 0,
+        "addresses": [data.common.ADDRESSES[0].bytes],
+    }
+]
+
+
+def populate(db):
+    for collection, documents in (
+        ("members", data.MEMBERS),
+        ("proposals", data.PROPOSALS),
+        ("bank", [data.BANK]),
+        ("proposal_params", [data.PROPOSAL_PARAMS]),
+        ("votes", data.VOTES),
+        ("tokens", data.TOKENS),
+        ("treasury_rollups", data.TREASURY_ROLLUPS),
+        ("membership_rollups", data.MEMBERSHIP_ROLLUPS),
+        ("events", EVENTS),
+    ):
+        for document in documents:
+            # The shared test data may have been given an _id by a previous insert
+            document = {key: value for key, value in document.items() if key != "_id"}
+            # An outdated version that shouldn't be part of the snapshot
+            db[collection].insert_one(
+                {**document, "_chain": {"valid_from": 1, "valid_to": 2}}
+            )
+            db[collection].insert_one(
+                {**document, "_chain": {"valid_from": 2, "valid_to": None}}
+            )
+
+
+def current_documents(db, collection: str) -> list:
+    return list(db[collection].find({}, projection={"_id": False, "_chain": False}))
+
+
+def test_write_and_restore_snapshot(mongomock_client: MongoClient, tmp_path: Path):
+    source = mongomock_client.source
+    target = mongomock_client.target
+    path = tmp_path / "snapshot.bson.gz"
+
+    populate(source)
+
+    snapshot.write_snapshot(source, path, block_number=10)
+    block_number = snapshot.restore_snapshot(target, path, batch_size=2)
+
+    assert block_number == 10
+
+    for collection in snapshot.SNAPSHOT_COLLECTIONS:
+        restored = list(target[collection].find())
+        assert restored
+        assert all(
+            document["_chain"] == {"valid_from": 10, "valid_to": None}
+            for document in restored
+        )
+        assert current_documents(target, collection) == list(
+            source[collection].find(
+                {"_chain.valid_to": None}, projection={"_id": False, "_chain": False}
+            )
+        )
+
+
+def test_read_snapshot_version(tmp_path: Path):
+    path = tmp_path / "snapshot.bson.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(bson.encode({"version": 0, "blockNumber": 1}))
+
+    with pytest.raises(ValueError, match="Unsupported snapshot version"):
+        snapshot.read_snapshot(path)
+
+
+async def test_snapshot_block_handler(mongomock_client: MongoClient, tmp_path: Path):
+    path = tmp_path / "snapshot.bson.gz"
+    populate(mongomock_client.db)
+
+    writer = snapshot.SnapshotWriter(path, interval=10)
+    handler = snapshot.snapshot_block_handler(writer)
+    info = Mock(context={"db": mongomock_client.db})
+
+    # Called for every block, with or without events
+    await handler(info, NewBlock(new_head=block(5)))
+    assert not path.exists()
+
+    # The previous block is committed
+    await handler(info, NewBlock(new_head=block(13)))
+    assert snapshot.read_snapshot(path)[0] == 12
+
+    await handler(info, NewBlock(new_head=block(16)))
+    assert snapshot.read_snapshot(path)[0] == 12
+
+
+async def test_restored_events(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient, tmp_path: Path
+):
+    path = tmp_path / "snapshot.bson.gz"
+    populate(mongomock_client.source)
+    snapshot.write_snapshot(mongomock_client.source, path, block_number=10)
+    snapshot.restore_snapshot(mongomock_client.target, path)
+
+    # The events applied before the snapshot aren't applied again
+    info = mongomock_info(11, db_name="target")
+    key = {
+        name: EVENTS[0][name] for name in ("blockNumber", "transactionHash", "logIndex")
+    }
+    assert await idempotency.is_applied(info, key)
@@ -0,0 +1,257 @@
+import pytest
+from apibara.model import NewBlock, NewEvents
+from pymongo import MongoClient
+
+from dao import config, query, utils
+from dao.indexer import bank, members, proposals, state, status
+from dao.models import ProposalStatus
+
+from ..conftest import InfoFactory
+from .test_bank import MEMBER, TOKEN, block, starknet_event
+
+BANK = utils.int_to_bytes(config.bank_address)
+OTHER_MEMBER = utils.int_to_bytes(0x2)
+
+COLLECTIONS = [
+    "members",
+    "proposals",
+    "bank",
+    "tokens",
+    "proposal_params",
+    "events",
+    "votes",
+    "treasury_rollups",
+    "membership_rollups",
+]
+
+BLOCKS = {
+    1: [
+        proposals.ProposalParamsUpdated("Signaling", 50, 50, 60, 60),
+        members.MemberAdded(MEMBER, 10, 0, block(1).timestamp),
+        members.MemberAdded(OTHER_MEMBER, 5, 0, block(1).timestamp),
+        bank.TokenWhitelisted("Fee", TOKEN),
+    ],
+    2: [
+        bank.UserTokenBalanceIncreased(MEMBER, TOKEN, 10),
+        bank.UserTokenBalanceIncreased(MEMBER, TOKEN, 5),
+        bank.UserTokenBalanceIncreased(BANK, TOKEN, 100),
+        proposals.ProposalAdded(
+            1, "Title", "Signaling", "link", block(2).timestamp, MEMBER
+        ),
+        members.VoteSubmitted(MEMBER, 1, True, MEMBER),
+        members.RoleGranted(MEMBER, "admin", MEMBER),
+    ],
+    3: [
+        bank.UserTokenBalanceDecreased(MEMBER, TOKEN, 3),
+        members.MemberUpdated(
+            OTHER_MEMBER, OTHER_MEMBER, 0, 0, False, 0, block(1).timestamp
+        ),
+        members.RoleRevoked(MEMBER, "admin", MEMBER),
+        proposals.ProposalStatusUpdated(1, "approved"),
+        bank.TokenUnWhitelisted("Fee", TOKEN),
+    ],
+}
+
+
+async def handle_events(info, block_events: NewEvents):
+    for index, event in enumerate(BLOCKS[block_events.block.number]):
+        await event.handle(
+            info=info,
+            block=block_events.block,
+            starknet_event=starknet_event(event, log_index=index),
+        )
+
+
+async def run_block(
+    info_factory: InfoFactory, client: MongoClient, handler, number: int, db_name: str
+):
+    info = info_factory(number, context={"db": client[db_name]}, db_name=db_name)
+    await handler(info, NewEvents(block=block(number), events=[]))
+
+
+def current_documents(client: MongoClient, db_name: str, collection: str) -> list:
+    docs = client[db_name][collection].find(
+        {"_chain.valid_to": None}, projection={"_id": False}
+    )
+    return sorted(docs, key=repr)
+
+
+def invalidate(client: MongoClient, db_name: str, block_number: int):
+    # As apibara's IndexerStorage.invalidate
+    for collection in COLLECTIONS:
+        client[db_name][collection].delete_many(
+            {"_chain.valid_from": {"$gte": block_number}}
+        )
+        client[db_name][collection].update_many(
+            {"_chain.valid_to": {"$gte": block_number}},
+            {"$set": {"_chain.valid_to": None}},
+        )
+
+
+async def test_state_engine(mongomock_info: InfoFactory, mongomock_client: MongoClient):
+    engine = state.StateEngine(undo_depth=10)
+    handler = state.state_handler(handle_events, engine)
+
+    for number in BLOCKS:
+        await run_block(mongomock_info, mongomock_client, handle_events, number, "db")
+        await run_block(mongomock_info, mongomock_client, handler, number, "state")
+
+        # MongoDB holds the same documents once the block is flushed
+        for collection in COLLECTIONS:
+            assert current_documents(
+                mongomock_client, "state", collection
+            ) == current_documents(mongomock_client, "db", collection), collection
+
+    member = engine.find_one("members", {"memberAddress": MEMBER})
+    assert member["balances"] == [
+        {"tokenAddress": TOKEN, "tokenName": "Fee", "amount": 12}
+    ]
+    assert member["roles"] == []
+    # Nothing is read from MongoDB
+    assert engine.find_one("proposals", {"id": 1})["rawStatus"] == "approved"
+
+
+async def test_state_engine_statuses(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    engine = state.StateEngine(undo_depth=10)
+    handlers = {
+        "db": status.status_handler(handle_events),
+        "state": status.status_handler(state.state_handler(handle_events, engine)),
+    }
+
+    for number in BLOCKS:
+        for db_name, handler in handlers.items():
+            # The statuses changed by the time are written before the events
+            await status.status_block_handler(
+                mongomock_info(
+                    number, context={"db": mongomock_client[db_name]}, db_name=db_name
+                ),
+                NewBlock(new_head=block(number)),
+            )
+            await run_block(mongomock_info, mongomock_client, handler, number, db_name)
+
+        for collection in COLLECTIONS:
+            assert current_documents(
+                mongomock_client, "state", collection
+            ) == current_documents(mongomock_client, "db", collection), collection
+
+    # The version written before the events of block 3 is closed by the flush
+    assert (
+        mongomock_client.state.proposals.count_documents({"_chain.valid_to": None}) == 1
+    )
+    assert (
+        mongomock_client.state.proposals.find_one({"_chain.valid_to": None})[
+            "derivedStatus"
+        ]
+        == ProposalStatus.APPROVED.value
+    )
+
+
+async def test_state_engine_reorg(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    engine = state.StateEngine(undo_depth=2)
+    handler = state.state_handler(handle_events, engine)
+    reorg_handler = state.reorg_handler(engine)
+
+    for number in BLOCKS:
+        await run_block(mongomock_info, mongomock_client, handler, number, "state")
+
+    async def check_reorg(block_number: int):
+        invalidate(mongomock_client, "state", block_number)
+        await reorg_handler(mongomock_info(block_number), block_number)
+
+        reloaded = state.StateEngine()
+        reloaded.load(mongomock_client.state)
+        assert engine.documents == reloaded.documents
+
+    # Rolled back with the undo logs
+    await check_reorg(3)
+    assert engine.undo_from == 2
+    assert list(engine.undo_logs) == [2]
+    assert engine.find_one("members", {"memberAddress": MEMBER})["roles"] == ["admin"]
+
+    # Reloaded, the undo logs only go back to block 2
+    await check_reorg(1)
+    assert engine.undo_from is None
+    assert engine.find_one("members", {"memberAddress": MEMBER}) is None
+
+    # Indexing resumes from the reorganization
+    for number in BLOCKS:
+        await run_block(mongomock_info, mongomock_client, handler, number, "state")
+    assert engine.find_one("proposals", {"id": 1})["rawStatus"] == "approved"
+
+
+async def test_state_engine_error(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    engine = state.StateEngine()
+
+    async def failing_handler(info, block_events: NewEvents):
+        await handle_events(info, block_events)
+        raise ValueError("Handler error")
+
+    await run_block(
+        mongomock_info,
+        mongomock_client,
+        state.state_handler(handle_events, engine),
+        1,
+        "state",
+    )
+    with pytest.raises(ValueError, match="Handler error"):
+        await run_block(
+            mongomock_info,
+            mongomock_client,
+            state.state_handler(failing_handler, engine),
+            2,
+            "state",
+        )
+
+    # Nothing of block 2 is kept or written
+    assert "balances" not in engine.find_one("members", {"memberAddress": MEMBER})
+    assert mongomock_client.state.proposals.count_documents({}) == 0
+    # The members and token of block 1
+    assert mongomock_client.state.events.count_documents({}) == 3
+
+
+def test_apply_update():
+    doc = {
+        "memberAddress": MEMBER,
+        "balances": [
+            {"tokenAddress": b"\x01", "amount": 1},
+            {"tokenAddress": TOKEN},
+        ],
+        "roles": ["admin", "member"],
+    }
+    filter = {"memberAddress": MEMBER, "balances.tokenAddress": TOKEN}
+    assert query.matches(doc, filter)
+    assert not query.matches(doc, {"balances.tokenAddress": b"\x02"})
+    assert query.matches(doc, {"roles": "admin", "jailedAt": None})
+
+    updated = state.apply_update(
+        doc,
+        {
+            "$inc": {"balances.$.amount": 10},
+            "$push": {"transactions": (TOKEN, 10)},
+            "$pull": {"roles": "admin"},
+            "$set": {"shares": 1},
+        },
+        filter,
+    )
+    assert updated == {
+        "memberAddress": MEMBER,
+        "balances": [
+            {"tokenAddress": b"\x01", "amount": 1},
+            {"tokenAddress": TOKEN, "amount": 10},
+        ],
+        "roles": ["member"],
+        "transactions": [[TOKEN, 10]],
+        "shares": 1,
+    }
+    # The document isn't modified
+    assert doc["balances"][1] == {"tokenAddress": TOKEN}
+    assert doc["roles"] == ["admin", "member"]
+
+    with pytest.raises(NotImplementedError):
+        state.apply_update(doc, {"$addToSet": {"roles": "admin"}}, filter)
@@ -0,0 +1,119 @@
+from apibara.model import NewBlock
+from pymongo import MongoClient
+
+from dao.indexer import members, proposals, status
+from dao.models import ProposalRawStatus, ProposalStatus
+
+from ..conftest import InfoFactory
+from .test_bank import MEMBER, apply, block
+
+
+async def apply_block(info_factory: InfoFactory, number: int, *events):
+    for event in events:
+        await apply(info_factory, number, event)
+    await status.refresh_statuses(info_factory(number), block(number))
+
+
+def current_statuses(client: MongoClient) -> dict:
+    return {
+        proposal["id"]: (
+            proposal["derivedStatus"],
+            proposal["derivedStatusUntil"] and proposal["derivedStatusUntil"].hour,
+        )
+        for proposal in client.db.proposals.find({"_chain.valid_to": None})
+    }
+
+
+def proposal_added(id: int):
+    return proposals.ProposalAdded(
+        id, "Title", "Signaling", "link", block(1).timestamp, MEMBER
+    )
+
+
+async def test_derived_status(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    # The voting and grace periods last one block
+    await apply_block(
+        mongomock_info,
+        1,
+        proposals.ProposalParamsUpdated("Signaling", 50, 50, 60, 60),
+        members.MemberAdded(MEMBER, 10, 0, block(1).timestamp),
+        proposal_added(1),
+        proposal_added(2),
+        members.VoteSubmitted(MEMBER, 1, True, MEMBER),
+    )
+    assert current_statuses(mongomock_client) == {
+        1: (ProposalStatus.VOTING_PERIOD.value, 2),
+        2: (ProposalStatus.VOTING_PERIOD.value, 2),
+    }
+
+    # Without any event, the voting period ends
+    await apply_block(mongomock_info, 2)
+    assert current_statuses(mongomock_client) == {
+        1: (ProposalStatus.GRACE_PERIOD.value, 3),
+        2: (ProposalStatus.REJECTED_READY.value, None),
+    }
+
+    await apply_block(mongomock_info, 3)
+    assert current_statuses(mongomock_client) == {
+        1: (ProposalStatus.APPROVED_READY.value, None),
+        2: (ProposalStatus.REJECTED_READY.value, None),
+    }
+    # Only the due proposals get a new version
+    assert mongomock_client.db.proposals.count_documents({"id": 2}) == 3
+
+    await apply_block(
+        mongomock_info,
+        4,
+        proposals.ProposalStatusUpdated(1, ProposalRawStatus.APPROVED.value),
+    )
+    assert current_statuses(mongomock_client)[1] == (
+        ProposalStatus.APPROVED.value,
+        None,
+    )
+
+
+async def test_derived_status_votes(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    await apply_block(
+        mongomock_info,
+        1,
+        proposals.ProposalParamsUpdated("Signaling", 50, 50, 60, 60),
+        members.MemberAdded(MEMBER, 10, 0, block(1).timestamp),
+        proposal_added(1),
+    )
+    await apply_block(mongomock_info, 2)
+    assert current_statuses(mongomock_client)[1] == (
+        ProposalStatus.REJECTED_READY.value,
+        None,
+    )
+
+    # The status of a voted proposal is derived again, even when it isn't due
+    await apply_block(mongomock_info, 3, members.VoteSubmitted(MEMBER, 1, True, MEMBER))
+    assert current_statuses(mongomock_client)[1] == (
+        ProposalStatus.APPROVED_READY.value,
+        None,
+    )
+
+
+async def test_status_block_handler(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    await apply_block(
+        mongomock_info,
+        1,
+        proposals.ProposalParamsUpdated("Signaling", 50, 50, 60, 60),
+        members.MemberAdded(MEMBER, 10, 0, block(1).timestamp),
+        proposal_added(1),
+    )
+    assert current_statuses(mongomock_client) == {
+        1: (ProposalStatus.VOTING_PERIOD.value, 2)
+    }
+
+    # apibara only calls the block handler for a block without events
+    await status.status_block_handler(mongomock_info(2), NewBlock(new_head=block(2)))
+    assert current_statuses(mongomock_client) == {
+        1: (ProposalStatus.REJECTED_READY.value, None)
+    }
@@ -65,6 +65,21 @@ async def test_token_whitelisted(
         "whitelistedAt": block_datetime,
     }
 
+    tokens = list(
+        mongo_db["tokens"].find(
+            current_block_filter, projection={"_id": False, "_chain": False}
+        )
+    )
+    assert tokens == [
+        {
+            "tokenName": token_name,
+            "tokenAddress": utils.int_to_bytes(token_address),
+            "whitelistedAt": block_datetime,
+            "unWhitelistedAt": None,
+            "active": True,
+        }
+    ]
+
 
 async def test_token_unwhitelisted(
     run_indexer_process: IndexerProcessRunner,
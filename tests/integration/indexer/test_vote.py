@@ -72,12 +72,19 @@ async def test_vote_submitted(
     assert proposal["type"] == "Signaling"
     assert proposal["submittedBy"] == utils.int_to_bytes(client.address)
     assert proposal["rawStatus"] == ProposalRawStatus.SUBMITTED.value
-    if vote:
-        assert proposal["yesVoters"] == [utils.int_to_bytes(client.address)]
-    else:
-        assert proposal["noVoters"] == [utils.int_to_bytes(client.address)]
-
     assert proposal["submittedAt"] == proposal_block_datetime
     assert proposal["rawStatusHistory"] == [
         [ProposalRawStatus.SUBMITTED.value, proposal_block_datetime]
     ]
+
+    votes = list(mongo_db["votes"].find({"_chain.valid_to": None}))
+    assert len(votes) == 1
+
+    vote_block = await client.get_block(transaction_receipt.block_hash)
+
+    assert votes[0]["proposalId"] == 0
+    assert votes[0]["voterAddress"] == utils.int_to_bytes(client.address)
+    assert votes[0]["callerAddress"] == utils.int_to_bytes(client.address)
+    assert votes[0]["vote"] is bool(vote)
+    assert votes[0]["votedAt"] == utils.get_block_datetime_utc(vote_block)
+    assert votes[0]["blockNumber"] == transaction_receipt.block_number
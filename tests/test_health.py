@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+from apibara.model import NewBlock, NewEvents
+from pymongo import MongoClient
+
+from dao import config, health
+from dao.indexer.health import HealthRecorder, health_block_handler, health_handler
+
+from .conftest import InfoFactory
+from .indexer.test_bank import block
+
+NOW = datetime(2022, 11, 18, 12, tzinfo=timezone.utc)
+
+
+def test_events_rate():
+    rate = health.EventsRate(window=10)
+    assert rate.get(now=0) == 0
+
+    rate.record(5, at=0)
+    rate.record(10, at=1)
+    rate.record(10, at=2)
+    assert rate.get(now=4) == 20 / 4
+
+    # The blocks older than the window are forgotten
+    rate.record(5, at=12)
+    assert rate.get(now=12) == 5 / 10
+    rate.record(0, at=30)
+    assert rate.get(now=40) == 0
+
+
+def test_get_health():
+    doc = {
+        "indexedBlock": 100,
+        "indexedBlockTimestamp": datetime(2022, 11, 18, 11),
+        "chainHeadBlock": 105,
+        "chainHeadTimestamp": datetime(2022, 11, 18, 11, 1),
+        "eventsPerSecond": 2.5,
+        "committedAt": NOW - timedelta(seconds=30),
+        "updatedAt": NOW - timedelta(seconds=5),
+    }
+
+    report = health.get_health(doc, now=NOW)
+    assert report == {
+        "indexedBlock": 100,
+        "indexedBlockTimestamp": datetime(2022, 11, 18, 11, tzinfo=timezone.utc),
+        "chainHeadBlock": 105,
+        "chainHeadTimestamp": datetime(2022, 11, 18, 11, 1, tzinfo=timezone.utc),
+        "lagBlocks": 5,
+        "lagSeconds": 60,
+        "eventsPerSecond": 2.5,
+        "lastCommitAt": NOW - timedelta(seconds=30),
+        "secondsSinceCommit": 30,
+        "healthy": True,
+    }
+
+    # Too far behind
+    lagging = {**doc, "chainHeadBlock": 101 + config.health_max_lag_blocks}
+    assert not health.get_health(lagging, now=NOW)["healthy"]
+
+    # The indexer stopped reporting
+    stopped = {**doc, "updatedAt": NOW - timedelta(seconds=config.health_max_age + 1)}
+    assert not health.get_health(stopped, now=NOW)["healthy"]
+
+    # Nothing is indexed yet
+    assert not health.get_health(None, now=NOW)["healthy"]
+
+
+async def test_health_handler(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    db = mongomock_client.db
+    recorder = HealthRecorder("dao-indexer")
+    recorder.db = db
+    handler = health_handler(AsyncMock(), recorder)
+    block_handler = health_block_handler(recorder)
+
+    recorder.record_chain_head(3, block(3).timestamp)
+    for number in (1, 2):
+        await block_handler(mongomock_info(number), NewBlock(new_head=block(number)))
+        await handler(
+            mongomock_info(number),
+            NewEvents(block=block(number), events=[None] * number),
+        )
+        # The block isn't committed until the next one begins
+        assert health.read_health(db).get("indexedBlock") == (
+            None if number == 1 else number - 1
+        )
+
+    await block_handler(mongomock_info(3), NewBlock(new_head=block(3)))
+
+    report = health.read_health(db)
+    assert report == recorder.get()
+    assert report["indexedBlock"] == 2
+    assert report["indexedBlockTimestamp"] == block(2).timestamp
+    assert report["lagBlocks"] == 1
+    assert report["lagSeconds"] == 3600
+    assert report["healthy"]
+    assert health.to_json(report)["indexedBlockTimestamp"] == (
+        block(2).timestamp.isoformat()
+    )
+    # The events of the blocks 1 and 2 are counted once they are committed
+    assert report["eventsPerSecond"] > 0
+
+
+async def test_health_block_handler(
+    mongomock_info: InfoFactory, mongomock_client: MongoClient
+):
+    db = mongomock_client.db
+    recorder = HealthRecorder("dao-indexer")
+    recorder.db = db
+    handler = health_handler(AsyncMock(), recorder)
+    block_handler = health_block_handler(recorder)
+
+    async def run_block(number: int, with_events: bool):
+        # As apibara, the new events handler is only called for the blocks with
+        # events, after the block handler
+        await block_handler(mongomock_info(number), NewBlock(new_head=block(number)))
+        if with_events:
+            await handler(
+                mongomock_info(number), NewEvents(block=block(number), events=[])
+            )
+
+    await run_block(1, with_events=True)
+    # The chain head moves past blocks without events of the DAO
+    last = 2 + config.health_max_lag_blocks
+    for number in range(2, last + 1):
+        recorder.record_chain_head(number, block(number).timestamp)
+        await run_block(number, with_events=False)
+
+    # The blocks are recorded once committed, at the start of the next one
+    report = health.read_health(db)
+    assert report["indexedBlock"] == last - 1
+    assert report["indexedBlockTimestamp"] == block(last - 1).timestamp
+    assert report["lagBlocks"] == 1
+    assert report["healthy"]
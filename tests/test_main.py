@@ -1,13 +1,23 @@
+import subprocess
+import sys
+from pathlib import Path
 from unittest.mock import AsyncMock, Mock
 
+import mongomock
+import pytest
 from apibara.model import EventFilter
 from click.testing import CliRunner
 from pytest import LogCaptureFixture, MonkeyPatch
+from starknet_py.contract import Contract
 
-from dao import config, utils
+from dao import config
+from dao import main as dao_main
+from dao import utils
 from dao.graphql import main as graphql_main
+from dao.indexer import compaction, export
 from dao.indexer import main as indexer_main
 from dao.main import cli
+from dao.models import Dao
 
 
 def test_start_indexer_error(caplog: LogCaptureFixture):
@@ -58,6 +68,21 @@ def test_start_indexer(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
             config.starknet_network_url,
             "--restart",
             "--ssl",
+            "--metrics-port",
+            "9090",
+            "--pipeline-queue-size",
+            "8",
+            "--concurrent-handlers",
+            "--snapshot-path",
+            "snapshot.bson.gz",
+            "--snapshot-interval",
+            "500",
+            "--compaction-interval",
+            "10",
+            "--archive-versions",
+            "--in-memory-state",
+            "--backfill-threshold",
+            "1000",
         ],
     )
 
@@ -68,13 +93,114 @@ def test_start_indexer(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
         mongo_url=config.mongo_url,
         starknet_network_url=config.starknet_network_url,
         filters=filters,
+        daos=[Dao.parse(contract_address)],
         restart=True,
         ssl=True,
+        abi=None,
+        abi_cache_dir=config.abi_cache_dir,
+        metrics_host="localhost",
+        metrics_port=9090,
+        pipeline_queue_size=8,
+        concurrent_handlers=True,
+        snapshot_path="snapshot.bson.gz",
+        snapshot_interval=500,
+        from_snapshot=None,
+        compaction_interval=10,
+        finality_depth=config.finality_depth,
+        archive_versions=True,
+        in_memory_state=True,
+        backfill_threshold=1000,
     )
 
     assert result.exit_code == 0
 
 
+def test_start_indexer_abi_file(
+    monkeypatch: MonkeyPatch, caplog: LogCaptureFixture, sample_contract_abi_file
+):
+    # Workaround a Click testing bug
+    # See https://github.com/pallets/click/issues/824#issuecomment-562581313
+    caplog.set_level(10000)
+
+    runner = CliRunner()
+
+    run_indexer_mock = AsyncMock()
+    from_address_mock = AsyncMock()
+    monkeypatch.setattr(indexer_main, "run_indexer", run_indexer_mock)
+    monkeypatch.setattr(Contract, "from_address", from_address_mock)
+
+    result = runner.invoke(
+        cli,
+        [
+            "start-indexer",
+            "--contract-address",
+            "0x0123",
+            "--abi-file",
+            str(sample_contract_abi_file),
+        ],
+    )
+
+    assert result.exit_code == 0
+    # The contract isn't fetched from the gateway
+    from_address_mock.assert_not_called()
+
+    kwargs = run_indexer_mock.call_args.kwargs
+    assert kwargs["abi"] == utils.load_abi(sample_contract_abi_file)
+    assert kwargs["filters"] == [
+        EventFilter.from_event_name("increase_balance_called", "0x0123")
+    ]
+
+
+def test_start_indexer_several_daos(
+    monkeypatch: MonkeyPatch, caplog: LogCaptureFixture, sample_contract_abi_file
+):
+    # Workaround a Click testing bug
+    # See https://github.com/pallets/click/issues/824#issuecomment-562581313
+    caplog.set_level(10000)
+
+    runner = CliRunner()
+
+    run_indexer_mock = AsyncMock()
+    monkeypatch.setattr(indexer_main, "run_indexer", run_indexer_mock)
+
+    result = runner.invoke(
+        cli,
+        [
+            "start-indexer",
+            "--contract-address",
+            "0x0123",
+            "--contract-address",
+            "0x0456:0x01",
+            "--abi-file",
+            str(sample_contract_abi_file),
+        ],
+    )
+
+    assert result.exit_code == 0
+
+    kwargs = run_indexer_mock.call_args.kwargs
+    assert kwargs["filters"] == [
+        EventFilter.from_event_name("increase_balance_called", "0x0123"),
+        EventFilter.from_event_name("increase_balance_called", "0x0456"),
+    ]
+    assert kwargs["daos"] == [
+        Dao(
+            address=b"\x01\x23",
+            bank_address=utils.int_to_bytes(config.bank_address),
+        ),
+        Dao(
+            address=b"\x04\x56",
+            bank_address=b"\x01",
+        ),
+    ]
+
+    result = runner.invoke(
+        cli, ["start-indexer", "--contract-address", "0x0123:0x01:0x02:0x03"]
+    )
+    assert result.exit_code == 2
+    assert "Invalid DAO" in result.output
+
+
 def test_start_graphql_error(caplog: LogCaptureFixture):
     # Workaround a Click testing bug
     # See https://github.com/pallets/click/issues/824#issuecomment-562581313
@@ -111,10 +237,155 @@ def test_start_graphql(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
             host,
             "--port",
             port,
+            "--read-model",
         ],
     )
 
     run_graphql_mock.assert_called_once_with(
-        mongo_url=config.mongo_url, db_name=db_name, host=host, port=int(port)
+        mongo_url=config.mongo_url,
+        db_name=db_name,
+        host=host,
+        port=int(port),
+        read_model=True,
     )
     assert result.exit_code == 0
+
+
+def test_compact(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture):
+    # Workaround a Click testing bug
+    # See https://github.com/pallets/click/issues/824#issuecomment-562581313
+    caplog.set_level(10000)
+
+    runner = CliRunner()
+
+    get_indexed_block_mock = Mock(return_value=500)
+    compact_mock = Mock(return_value={"members": 3, "bank": 0})
+    monkeypatch.setattr(dao_main, "MongoClient", mongomock.MongoClient)
+    monkeypatch.setattr(compaction, "get_indexed_block", get_indexed_block_mock)
+    monkeypatch.setattr(compaction, "compact", compact_mock)
+
+    result = runner.invoke(
+        cli,
+        ["compact", "--finality-depth", "100", "--batch-size", "10", "--archive"],
+    )
+
+    assert result.exit_code == 0
+    assert "members: 3 versions compacted" in result.output
+    get_indexed_block_mock.assert_called_once()
+    compact_mock.assert_called_once()
+    assert compact_mock.call_args.kwargs == {
+        "finalized_block": 400,
+        "batch_size": 10,
+        "archive": True,
+    }
+
+    get_indexed_block_mock.return_value = None
+    result = runner.invoke(cli, ["compact"])
+    assert result.exit_code == 1
+    assert "has not indexed any block" in result.output
+
+
+def test_export(monkeypatch: MonkeyPatch, caplog: LogCaptureFixture, tmp_path: Path):
+    # Workaround a Click testing bug
+    # See https://github.com/pallets/click/issues/824#issuecomment-562581313
+    caplog.set_level(10000)
+
+    runner = CliRunner()
+
+    get_indexed_block_mock = Mock(return_value=500)
+    export_mock = Mock(return_value={"events": 3})
+    monkeypatch.setattr(dao_main, "MongoClient", mongomock.MongoClient)
+    monkeypatch.setattr(compaction, "get_indexed_block", get_indexed_block_mock)
+    monkeypatch.setattr(export, "export", export_mock)
+
+    args = ["export", "--output-dir", str(tmp_path), "--finality-depth", "100"]
+
+    result = runner.invoke(cli, args + ["--datasets", "events,members"])
+    assert result.exit_code == 0
+    assert "events: 3 rows exported" in result.output
+    assert export_mock.call_args.kwargs == {
+        "from_block": 0,
+        "to_block": 400,
+        "datasets": ["events", "members"],
+        "partition_size": config.export_partition_size,
+        "batch_size": config.export_batch_size,
+    }
+    assert export.read_watermark(tmp_path) == 400
+
+    # Resumes from the watermark
+    get_indexed_block_mock.return_value = 600
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    assert export_mock.call_args.kwargs["from_block"] == 401
+    assert export_mock.call_args.kwargs["to_block"] == 500
+
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    assert "Nothing to export" in result.output
+    assert export_mock.call_count == 2
+
+    result = runner.invoke(cli, args + ["--datasets", "votes"])
+    assert result.exit_code == 2
+
+
+# The stack of one command must not be imported by another, starting a GraphQL
+# replica only pays for strawberry. The budgets are the number of modules imported
+# and the import time in seconds.
+STARTUP_BUDGETS = {
+    "start-graphql": (
+        ("dao.main", "dao.graphql.main"),
+        {"apibara", "starknet_py"},
+        1200,
+        3,
+    ),
+    "start-indexer": (("dao.main", "dao.indexer.main"), {"strawberry"}, 2500, 6),
+    "compact": (("dao.main", "dao.indexer.compaction"), {"strawberry"}, 2500, 6),
+}
+
+
+def profile_imports(modules) -> tuple[float, int, set[str]]:
+    """Imports modules in a fresh interpreter, returns the import time in seconds,
+    the number of modules imported and the top-level packages imported"""
+    code = "; ".join(
+        [f"import {module}" for module in modules]
+        + [
+            "import sys",
+            "print(len(sys.modules))",
+            "print(' '.join({m.split('.')[0] for m in sys.modules}))",
+        ]
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        text=True,
+    )
+    # Each line is "import time: <self us> | <cumulative us> | <module>"
+    total = sum(
+        int(line.split("|")[0].split(":")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "self [us]" not in line
+    )
+    count, packages = result.stdout.splitlines()
+    return total / 1e6, int(count), set(packages.split())
+
+
+@pytest.mark.parametrize("command", STARTUP_BUDGETS)
+def test_startup_imports(command: str):
+    # The number of modules doesn't depend on the machine or the bytecode cache
+    modules, excluded, max_modules, _ = STARTUP_BUDGETS[command]
+
+    _, count, packages = profile_imports(modules)
+    assert packages & excluded == set()
+    assert count <= max_modules, f"{command} imported {count} modules"
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("command", STARTUP_BUDGETS)
+def test_startup_time(command: str):
+    # Generous, the import time depends on the machine and the bytecode cache
+    modules, _, _, budget = STARTUP_BUDGETS[command]
+
+    duration, _, _ = profile_imports(modules)
+    assert duration < budget, f"{command} imports took {duration:.3f}s"
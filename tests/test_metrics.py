@@ -0,0 +1,85 @@
+from unittest.mock import AsyncMock, Mock
+
+from cachetools import LRUCache
+
+from dao import metrics, utils
+from dao.indexer.metrics import InstrumentedStorage, instrument_handler
+
+
+def test_counter_and_gauge_render():
+    counter = metrics.Counter("test_counter_total", "A counter.", ["event"])
+    gauge = metrics.Gauge("test_gauge", "A gauge.")
+
+    counter.inc(event="E1")
+    counter.inc(2, event="E1")
+    counter.inc(event="E2")
+    gauge.set(7)
+
+    rendered = metrics.render()
+
+    assert "# TYPE test_counter_total counter" in rendered
+    assert 'test_counter_total{event="E1"} 3' in rendered
+    assert 'test_counter_total{event="E2"} 1' in rendered
+    assert "# TYPE test_gauge gauge" in rendered
+    assert "test_gauge 7" in rendered
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram(
+        "test_histogram_seconds", "A histogram.", buckets=(0.1, 1)
+    )
+
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    rendered = histogram.render()
+
+    assert 'test_histogram_seconds_bucket{le="0.1"} 1' in rendered
+    assert 'test_histogram_seconds_bucket{le="1"} 2' in rendered
+    assert 'test_histogram_seconds_bucket{le="+Inf"} 3' in rendered
+    assert "test_histogram_seconds_sum 5.55" in rendered
+    assert "test_histogram_seconds_count 3" in rendered
+    assert histogram.count() == 3
+
+
+async def test_async_cached_records_hit_ratio():
+    @utils.async_cached(cache=LRUCache(maxsize=2))
+    async def cached_lookup(key):
+        return key
+
+    await cached_lookup(1)
+    await cached_lookup(1)
+    await cached_lookup(1)
+    await cached_lookup(2)
+
+    assert metrics.GATEWAY_CACHE_LOOKUPS.get(method="cached_lookup", result="hit") == 2
+    assert metrics.GATEWAY_CACHE_LOOKUPS.get(method="cached_lookup", result="miss") == 2
+    assert metrics.GATEWAY_CACHE_HIT_RATIO.get(method="cached_lookup") == 0.5
+
+
+async def test_instrument_handler():
+    storage = Mock(find_one=AsyncMock(return_value={"id": 1}), _session="session")
+    info = Mock(storage=storage)
+    block_events = Mock(block=Mock(number=42))
+
+    blocks_processed = metrics.BLOCKS_PROCESSED.get()
+    operations = metrics.MONGO_OPERATIONS.get(
+        collection="proposals", operation="find_one"
+    )
+
+    async def handler(info, block_events):
+        assert isinstance(info.storage, InstrumentedStorage)
+        # Non storage operations are forwarded untouched
+        assert info.storage._session == "session"
+        assert await info.storage.find_one("proposals", {"id": 1}) == {"id": 1}
+
+    await instrument_handler(handler)(info, block_events)
+
+    storage.find_one.assert_awaited_once_with("proposals", {"id": 1})
+    assert metrics.BLOCKS_PROCESSED.get() == blocks_processed + 1
+    assert metrics.INDEXED_BLOCK.get() == 42
+    assert (
+        metrics.MONGO_OPERATIONS.get(collection="proposals", operation="find_one")
+        == operations + 1
+    )
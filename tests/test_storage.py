@@ -9,6 +9,10 @@ from dao.graphql import storage
 from . import data
 
 
+def chain(valid_from, valid_to) -> dict:
+    return {"valid_from": valid_from, "valid_to": valid_to}
+
+
 def test_list_members(mongomock_client: MongoClient):
     info = Mock(context={"db": mongomock_client.db})
 
@@ -28,6 +32,68 @@ def test_list_members(mongomock_client: MongoClient):
     assert list(members) == new_members
 
 
+def test_list_members_as_of_block(mongomock_client: MongoClient):
+    info = Mock(context={"db": mongomock_client.db})
+
+    mongomock_client.db.members.insert_many(
+        [
+            {"memberAddress": "0x1", "shares": 1, "_chain": chain(1, 5)},
+            {"memberAddress": "0x1", "shares": 2, "_chain": chain(5, None)},
+            {"memberAddress": "0x2", "shares": 3, "_chain": chain(7, None)},
+        ]
+    )
+
+    def shares(as_of_block):
+        members = storage.list_members(info, as_of_block=as_of_block)
+        return [(member["memberAddress"], member["shares"]) for member in members]
+
+    assert shares(0) == []
+    assert shares(1) == shares(4) == [("0x1", 1)]
+    assert shares(5) == [("0x1", 2)]
+    assert shares(7) == shares(None) == [("0x1", 2), ("0x2", 3)]
+
+
+def test_create_indexes(mongomock_client: MongoClient):
+    db = mongomock_client.db
+    db.members.create_index("memberAddress", unique=True)
+
+    storage.create_indexes(db)
+
+    indexes = db.members.index_information()
+    assert "memberAddress_1" not in indexes
+    assert [
+        ("memberAddress", 1),
+        ("_chain.valid_from", 1),
+        ("_chain.valid_to", 1),
+    ] in [index["key"] for index in indexes.values()]
+
+    # Each update keeps the superseded version
+    db.members.insert_one({"memberAddress": "0x1", "_chain": chain(1, 2)})
+    db.members.insert_one({"memberAddress": "0x1", "_chain": chain(2, None)})
+
+
+def test_events_retention(mongomock_client: MongoClient):
+    db = mongomock_client.db
+
+    def expire_after():
+        indexes = db.events.index_information()
+        index = indexes.get(storage.EVENTS_RETENTION_INDEX)
+        return index and index["expireAfterSeconds"]
+
+    storage.create_indexes(db)
+    assert expire_after() is None
+    assert [("addresses", 1), ("emittedAt", -1), ("_id", -1)] in [
+        index["key"] for index in db.events.index_information().values()
+    ]
+
+    storage.set_events_retention(db, 30)
+    assert expire_after() == 30 * 24 * 3600
+    storage.set_events_retention(db, 7)
+    assert expire_after() == 7 * 24 * 3600
+    storage.set_events_retention(db, 0)
+    assert expire_after() is None
+
+
 def test_list_members_query(mongomock_client: MongoClient):
     info = Mock(context={"db": mongomock_client.db})
 
@@ -319,6 +385,7 @@ def test_list_proposals(mongomock_client: MongoClient):
     info = Mock(context={"db": mongomock_client.db})
 
     mongomock_client.db.proposals.insert_many(data.PROPOSALS)
+    mongomock_client.db.votes.insert_many(data.VOTES)
     mongomock_client.db.members.insert_many(data.MEMBERS)
 
     proposals = storage.list_proposals(info)
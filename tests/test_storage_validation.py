@@ -136,3 +136,30 @@ def test_bank_validation_required(bank, mongo_db: Database):
     storage.init_db(mongo_db)
     with pytest.raises(WriteError, match=".*required.*"):
         mongo_db.bank.insert_one(bank)
+
+
+def test_votes_validation_pass(mongo_db: Database):
+    storage.init_db(mongo_db)
+    mongo_db.votes.insert_one(data.VOTES[0])
+    assert len(list(mongo_db.votes.find())) == 1
+
+
+@pytest.mark.parametrize("vote", data.mongo_validation.VOTE_TYPE_MISMATCH)
+def test_votes_validation_type(vote, mongo_db: Database):
+    storage.init_db(mongo_db)
+    with pytest.raises(WriteError, match=".*type did not match.*"):
+        mongo_db.votes.insert_one(vote)
+
+
+@pytest.mark.parametrize("vote", data.mongo_validation.VOTE_WRONG_VALUES)
+def test_votes_validation_wrong(vote, mongo_db: Database):
+    storage.init_db(mongo_db)
+    with pytest.raises(WriteError, match=".*minimum|maximum|duplicate.*"):
+        mongo_db.votes.insert_one(vote)
+
+
+@pytest.mark.parametrize("vote", data.mongo_validation.VOTE_MISSING_REQUIRED)
+def test_votes_validation_required(vote, mongo_db: Database):
+    storage.init_db(mongo_db)
+    with pytest.raises(WriteError, match=".*required.*"):
+        mongo_db.votes.insert_one(vote)
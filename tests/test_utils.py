@@ -0,0 +1,58 @@
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+from pytest import MonkeyPatch
+from starknet_py.contract import Contract
+
+from dao import utils
+
+ADDRESS = "0x0123"
+CLASS_HASH = 0xC1A55
+
+
+def create_client() -> Mock:
+    client = Mock()
+    client.get_class_hash_at = AsyncMock(return_value=CLASS_HASH)
+    return client
+
+
+async def test_get_contract_abi(monkeypatch: MonkeyPatch, sample_contract_abi_file):
+    from_address_mock = AsyncMock()
+    monkeypatch.setattr(Contract, "from_address", from_address_mock)
+    client = create_client()
+
+    abi = utils.load_abi(sample_contract_abi_file)
+    contract = await utils.get_contract(ADDRESS, client, abi=abi, cache_dir="unused")
+
+    assert contract.data.abi == abi
+    assert "increase_balance_called" in utils.get_contract_events(contract)
+    from_address_mock.assert_not_called()
+    client.get_class_hash_at.assert_not_called()
+
+
+async def test_get_contract_abi_cache(
+    monkeypatch: MonkeyPatch, sample_contract_abi_file, tmp_path: Path
+):
+    abi = utils.load_abi(sample_contract_abi_file)
+    from_address_mock = AsyncMock(return_value=Mock(data=Mock(abi=abi)))
+    monkeypatch.setattr(Contract, "from_address", from_address_mock)
+
+    # Fetches the contract and caches its ABI
+    await utils.get_contract(ADDRESS, create_client(), cache_dir=tmp_path)
+    assert from_address_mock.await_count == 1
+
+    cache_path = utils.get_abi_cache_path(ADDRESS, CLASS_HASH, tmp_path)
+    assert utils.load_abi(cache_path) == abi
+
+    # A new client to bypass the in-memory cache, the ABI is read from the disk
+    client = create_client()
+    contract = await utils.get_contract(ADDRESS, client, cache_dir=tmp_path)
+    assert contract.data.abi == abi
+    assert from_address_mock.await_count == 1
+    client.get_class_hash_at.assert_awaited_once_with(ADDRESS)
+
+    # The contract was upgraded to another class
+    client = create_client()
+    client.get_class_hash_at.return_value = CLASS_HASH + 1
+    await utils.get_contract(ADDRESS, client, cache_dir=tmp_path)
+    assert from_address_mock.await_count == 2